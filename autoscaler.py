@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+[CLOUD] RAULI Autoscaler - Escalado por grupo (tier, región) con histéresis
+Decide con tasa de solicitudes y profundidad de cola; se prueba con tiempo simulado reproduciendo trazas
+"""
+
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional
+
+@dataclass
+class ScalingTarget:
+    """Objetivos de un grupo; la banda [scale_down_at, scale_up_at] evita oscilar"""
+    min_nodes: int = 1
+    max_nodes: int = 10
+    rps_per_node: float = 50.0        # solicitudes/s que un nodo atiende cómodo
+    in_flight_per_node: float = 32.0  # solicitudes en curso por nodo
+    scale_up_at: float = 0.75
+    scale_down_at: float = 0.35
+    up_cooldown: float = 30.0
+    down_cooldown: float = 180.0
+    down_stable_for: float = 120.0    # segundos seguidos bajo la banda antes de quitar un nodo
+    warmup: float = 45.0              # segundos hasta que un nodo nuevo recibe tráfico
+    max_step: int = 4                 # nodos como máximo por subida
+
+    @property
+    def setpoint(self) -> float:
+        return (self.scale_up_at + self.scale_down_at) / 2
+
+@dataclass
+class GroupSignal:
+    requests: float     # contador acumulado de solicitudes (atendidas y rechazadas)
+    in_flight: float    # solicitudes en curso o en cola
+    ready_nodes: int
+
+@dataclass
+class ScalingAction:
+    action: str  # add | activate | remove
+    group: Hashable
+    node_id: Optional[str] = None
+    reason: str = ""
+
+@dataclass
+class GroupState:
+    last_requests: Optional[float] = None
+    last_time: Optional[float] = None
+    rate: float = 0.0
+    raw_rate: float = 0.0
+    in_flight: float = 0.0
+    raw_in_flight: float = 0.0
+    last_up: float = -math.inf
+    last_down: float = -math.inf
+    below_since: Optional[float] = None
+    warming: Dict[str, float] = field(default_factory=dict)  # node_id -> listo en
+
+def group_label(group: Hashable) -> str:
+    parts = group if isinstance(group, tuple) else (group,)
+    return "/".join(str(getattr(part, "value", part)) for part in parts)
+
+class Autoscaler:
+    """Sube rápido (señal instantánea), baja despacio (media suavizada y estable), con enfriamientos"""
+
+    def __init__(self, targets: Optional[Dict[Hashable, ScalingTarget]] = None,
+                 default_target: Optional[ScalingTarget] = None, smoothing: float = 30.0):
+        self.targets = targets or {}
+        self.default_target = default_target or ScalingTarget()
+        self.smoothing = smoothing
+        self.groups: Dict[Hashable, GroupState] = {}
+        self.counter = 0
+        self.stats = {"scale_ups": 0, "scale_downs": 0, "nodes_added": 0, "nodes_removed": 0}
+
+    def target_for(self, group: Hashable) -> ScalingTarget:
+        return self.targets.get(group, self.default_target)
+
+    @staticmethod
+    def utilization(target: ScalingTarget, nodes: int, rate: float, in_flight: float) -> float:
+        if nodes <= 0:
+            return math.inf if rate > 0 or in_flight > 0 else 0.0
+        return max(rate / (nodes * target.rps_per_node), in_flight / (nodes * target.in_flight_per_node))
+
+    def observe(self, state: GroupState, now: float, signal: GroupSignal):
+        """Tasa a partir del contador acumulado y medias con peso por tiempo transcurrido"""
+        if state.last_time is not None and now > state.last_time:
+            state.raw_rate = max(0.0, signal.requests - state.last_requests) / (now - state.last_time)
+            weight = 1.0 - math.exp(-(now - state.last_time) / self.smoothing)
+            state.rate += weight * (state.raw_rate - state.rate)
+            state.in_flight += weight * (signal.in_flight - state.in_flight)
+        elif state.last_time is None:
+            state.in_flight = signal.in_flight
+        state.raw_in_flight = signal.in_flight
+        state.last_requests, state.last_time = signal.requests, now
+
+    def new_node_id(self, group: Hashable) -> str:
+        self.counter += 1
+        return f"auto-{group_label(group).replace('/', '-')}-{self.counter}"
+
+    def evaluate(self, now: float, signals: Dict[Hashable, GroupSignal]) -> List[ScalingAction]:
+        actions: List[ScalingAction] = []
+        for group in set(signals) | set(self.targets):
+            signal = signals.get(group, GroupSignal(0, 0, 0))
+            state = self.groups.setdefault(group, GroupState())
+            target = self.target_for(group)
+            self.observe(state, now, signal)
+
+            # Calentamiento terminado: el nodo ya puede recibir tráfico
+            for node_id, ready_at in list(state.warming.items()):
+                if ready_at <= now:
+                    del state.warming[node_id]
+                    actions.append(ScalingAction("activate", group, node_id, "calentamiento completo"))
+
+            ready = signal.ready_nodes + sum(1 for a in actions if a.group == group and a.action == "activate")
+            # Los nodos calentando cuentan como capacidad para no volver a subir por la misma carga
+            capacity = ready + len(state.warming)
+
+            up_util = self.utilization(target, capacity, max(state.rate, state.raw_rate),
+                                       max(state.in_flight, state.raw_in_flight))
+            down_util = self.utilization(target, ready, state.rate, state.in_flight)
+
+            wanted = 0
+            if capacity < target.min_nodes:
+                wanted, reason = target.min_nodes - capacity, "mínimo de nodos"
+            elif up_util > target.scale_up_at and now - state.last_up >= target.up_cooldown:
+                desired = math.ceil(capacity * up_util / target.setpoint) if math.isfinite(up_util) else capacity + 1
+                wanted, reason = min(desired - capacity, target.max_step), f"utilización {up_util:.2f}"
+            wanted = max(0, min(wanted, target.max_nodes - capacity))
+
+            if wanted:
+                for _ in range(wanted):
+                    node_id = self.new_node_id(group)
+                    state.warming[node_id] = now + target.warmup
+                    actions.append(ScalingAction("add", group, node_id, reason))
+                state.last_up = now
+                state.below_since = None
+                self.stats["scale_ups"] += 1
+                self.stats["nodes_added"] += wanted
+                continue
+
+            if down_util < target.scale_down_at and not state.warming and ready > target.min_nodes:
+                if state.below_since is None:
+                    state.below_since = now
+                # Bajar un nodo solo si el resto queda por debajo del punto medio de la banda
+                if (now - state.below_since >= target.down_stable_for
+                        and now - state.last_down >= target.down_cooldown
+                        and now - state.last_up >= target.down_cooldown
+                        and self.utilization(target, ready - 1, state.rate, state.in_flight) <= target.setpoint):
+                    # Enfriamiento y estadísticas solo cuando el nodo se retira (confirm_removal)
+                    actions.append(ScalingAction("remove", group, None, f"utilización {down_util:.2f}"))
+            else:
+                state.below_since = None
+        return actions
+
+    def cancel_warming(self, group: Hashable, node_id: str):
+        """El nodo no llegó a crearse"""
+        self.groups.get(group, GroupState()).warming.pop(node_id, None)
+
+    def confirm_removal(self, group: Hashable, now: float):
+        """Se retiró un nodo; si no había ninguno libre, la bajada se reintenta en el próximo tick"""
+        state = self.groups.setdefault(group, GroupState())
+        state.last_down = now
+        state.below_since = now
+        self.stats["scale_downs"] += 1
+        self.stats["nodes_removed"] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            **self.stats,
+            "groups": {
+                group_label(group): {
+                    "rate": round(state.rate, 2),
+                    "in_flight": round(state.in_flight, 2),
+                    "warming": len(state.warming)
+                }
+                for group, state in self.groups.items()
+            }
+        }
+
+class TraceRecorder:
+    """Graba las señales observadas (JSONL) para reproducirlas luego en simulate()"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.start = time.monotonic()
+
+    def record(self, now: float, signals: Dict[Hashable, GroupSignal], autoscaler: Autoscaler):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for group, signal in signals.items():
+                state = autoscaler.groups.get(group)
+                f.write(json.dumps({
+                    "t": round(now - self.start, 3),
+                    "group": group_label(group),
+                    "rps": round(state.raw_rate, 3) if state else 0.0,
+                    "in_flight": signal.in_flight,
+                    "nodes": signal.ready_nodes
+                }) + "\n")
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def synthetic_trace(duration: float = 1800, step: float = 5) -> List[Dict[str, Any]]:
+    """Rampa, pico corto, meseta con ruido y bajada, en dos grupos"""
+    trace = []
+    t = 0.0
+    while t <= duration:
+        base = 40 + 260 * min(1.0, t / 600)
+        spike = 300 if 700 <= t < 760 else 0
+        decay = max(0.0, (t - 1200) / 600) * 250
+        noise = 25 * math.sin(t / 17) + 15 * math.sin(t / 5)
+        trace.append({"t": t, "group": "professional/us-east-1", "rps": max(0.0, base + spike - decay + noise)})
+        trace.append({"t": t, "group": "enterprise/eu-west-1", "rps": 60 + 20 * math.sin(t / 90)})
+        t += step
+    return trace
+
+def simulate(trace: List[Dict[str, Any]], autoscaler: Optional[Autoscaler] = None, tick: float = 5.0,
+             service_time: float = 0.25, overload_factor: float = 1.25,
+             initial_nodes: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Reproduce una traza en tiempo simulado; un nodo atiende hasta rps_per_node * overload_factor.
+    Si la traza trae in_flight y nodes grabados se usan esos; si no, se estiman con la ley de Little"""
+    autoscaler = autoscaler or Autoscaler()
+    points = sorted(trace, key=lambda point: point["t"])
+    # La traza guarda etiquetas "tier/región": se recuperan las claves originales de los objetivos
+    keys = {group_label(group): group for group in autoscaler.targets}
+    labels = sorted({point["group"] for point in points})
+    groups = [keys.get(label, label) for label in labels]
+    first = {}
+    for point in points:
+        first.setdefault(point["group"], point)
+    ready = {
+        group: (initial_nodes or {}).get(label, first[label].get("nodes", 1))
+        for label, group in zip(labels, groups)
+    }
+    current_rps = {group: 0.0 for group in groups}
+    recorded_in_flight: Dict[Hashable, Optional[float]] = {group: None for group in groups}
+    totals = {group: 0.0 for group in groups}
+    rejected = {group: 0.0 for group in groups}
+    node_seconds = 0.0
+    direction = {group: 0 for group in groups}
+    reversals = 0
+    timeline = []
+
+    end = points[-1]["t"] if points else 0.0
+    index = 0
+    now = 0.0
+    while now <= end:
+        while index < len(points) and points[index]["t"] <= now:
+            point = points[index]
+            group = keys.get(point["group"], point["group"])
+            current_rps[group] = point["rps"]
+            recorded_in_flight[group] = point.get("in_flight")
+            index += 1
+
+        signals = {}
+        for group in groups:
+            target = autoscaler.target_for(group)
+            rate = current_rps[group]
+            capacity = ready[group] * target.rps_per_node * overload_factor
+            served = min(rate, capacity)
+            rejected[group] += (rate - served) * tick
+            totals[group] += rate * tick
+            # Little: en curso = servidas * tiempo de servicio, con cola acotada (x4) cerca de la saturación
+            if recorded_in_flight[group] is not None:
+                in_flight = recorded_in_flight[group]
+            else:
+                rho = served / capacity if capacity else 1.0
+                in_flight = served * service_time / max(0.25, 1.0 - rho) if served else 0.0
+            signals[group] = GroupSignal(totals[group], in_flight, ready[group])
+            node_seconds += ready[group] * tick
+
+        for action in autoscaler.evaluate(now, signals):
+            if action.action == "activate":
+                ready[action.group] += 1
+            elif action.action == "remove":
+                ready[action.group] -= 1
+                autoscaler.confirm_removal(action.group, now)
+            if action.action in ("add", "remove"):
+                move = 1 if action.action == "add" else -1
+                if direction[action.group] and move != direction[action.group]:
+                    reversals += 1
+                direction[action.group] = move
+
+        timeline.append({"t": now, **{f"{group_label(group)}.nodes": ready[group] for group in groups},
+                         **{f"{group_label(group)}.rps": round(current_rps[group], 1) for group in groups}})
+        now += tick
+
+    return {
+        "duration_s": end,
+        "node_seconds": round(node_seconds, 1),
+        "requests": round(sum(totals.values())),
+        "rejected": round(sum(rejected.values())),
+        "rejected_ratio": round(sum(rejected.values()) / max(1.0, sum(totals.values())), 4),
+        "reversals": reversals,
+        "final_nodes": {group_label(group): nodes for group, nodes in ready.items()},
+        "peak_nodes": {label: max(point[f"{label}.nodes"] for point in timeline) for label in labels},
+        **autoscaler.stats,
+        "timeline": timeline
+    }
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RAULI autoscaler - simulación con trazas")
+    parser.add_argument("--trace", help="Traza JSONL grabada (por defecto, traza sintética)")
+    parser.add_argument("--tick", type=float, default=5.0, help="Segundos simulados por evaluación")
+    parser.add_argument("--warmup", type=float, default=45.0)
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace()
+    result = simulate(trace, Autoscaler(default_target=ScalingTarget(warmup=args.warmup)), tick=args.tick)
+
+    for point in result.pop("timeline")[::12]:
+        print("  ".join(f"{key}={value}" for key, value in point.items()))
+    print(f"[METRICS] {json.dumps(result, ensure_ascii=False)}")
+
+if __name__ == "__main__":
+    main()
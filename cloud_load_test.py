@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+[CLOUD] RAULI Cloud Load Test - Banco de carga de la API cloud
+Arranca la API en proceso (sesiones en memoria) y mide RPS, latencias y retraso del event loop
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+import uvicorn
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int
+    errors: int
+    duration_s: float
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    loop_lag_p99_ms: float
+    loop_lag_max_ms: float
+    status_counts: Dict[str, int] = field(default_factory=dict)
+
+class EventLoopLagMonitor:
+    """Mide cuánto tarda el loop en despertar un sleep corto (retraso por código bloqueante)"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def reset(self) -> List[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+class InProcessServer:
+    """API cloud con uvicorn en un hilo propio, para que el cliente no falsee el retraso del loop"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765):
+        # Sin servidor Redis: el almacén en proceso de session_store
+        os.environ.setdefault('SESSION_STORE', 'memory')
+        from rauli_cloud_architecture import RAULICloudArchitecture
+
+        self.cloud = RAULICloudArchitecture()
+        self.monitor = EventLoopLagMonitor()
+        self.server_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        @self.cloud.app.on_event("startup")
+        async def start_monitor():
+            self.server_loop = asyncio.get_running_loop()
+            self.monitor.start()
+
+        self.base_url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(self.cloud.app, host=host, port=port,
+                                                    log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    async def start(self, timeout: float = 15.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("La API cloud no arrancó")
+            await asyncio.sleep(0.05)
+
+    def loop_lag(self) -> List[float]:
+        """Muestras de retraso tomadas desde la última llamada (en el loop del servidor)"""
+        if self.server_loop is None:
+            return []
+        future = asyncio.run_coroutine_threadsafe(self.collect_lag(), self.server_loop)
+        return future.result(timeout=5)
+
+    async def collect_lag(self) -> List[float]:
+        return self.monitor.reset()
+
+    async def stop(self):
+        self.server.should_exit = True
+        await asyncio.to_thread(self.thread.join, 10)
+
+class CloudLoadTest:
+    """Escenarios /health, /login, /nodes y /process con concurrencia configurable"""
+
+    def __init__(self, server: InProcessServer, concurrency: int = 50, requests: int = 2000):
+        self.server = server
+        self.concurrency = concurrency
+        self.requests = requests
+        self.token: Optional[str] = None
+
+    def scenarios(self) -> Dict[str, Callable[[], Dict]]:
+        auth = {"Authorization": f"Bearer {self.token}"}
+        return {
+            "health": lambda: {"method": "GET", "path": "/health"},
+            "login": lambda: {"method": "POST", "path": "/api/v1/auth/login",
+                              "json": {"username": "admin", "password": "rauli2024"}},
+            "nodes": lambda: {"method": "GET", "path": "/api/v1/nodes", "headers": auth},
+            "process": lambda: {"method": "POST", "path": "/api/v1/request", "headers": auth,
+                                "json": {"endpoint": "/api/v1/ai/process", "body": {"query": "hola"}}},
+        }
+
+    async def login(self, session: aiohttp.ClientSession):
+        async with session.post(f"{self.server.base_url}/api/v1/auth/login",
+                                json={"username": "admin", "password": "rauli2024"}) as resp:
+            resp.raise_for_status()
+            self.token = (await resp.json())["token"]
+
+    async def run_scenario(self, session: aiohttp.ClientSession, name: str,
+                           build: Callable[[], Dict]) -> ScenarioResult:
+        latencies: List[float] = []
+        status_counts: Dict[str, int] = {}
+        errors = 0
+        remaining = self.requests
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                spec = build()
+                start = time.perf_counter()
+                try:
+                    async with session.request(spec["method"], self.server.base_url + spec["path"],
+                                               json=spec.get("json"), headers=spec.get("headers")) as resp:
+                        await resp.read()
+                        status = str(resp.status)
+                except Exception as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                status_counts[status] = status_counts.get(status, 0) + 1
+                if not status.startswith("2"):
+                    errors += 1
+
+        self.server.loop_lag()  # descartar el retraso acumulado entre escenarios
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        duration = time.perf_counter() - start
+        lag = sorted(self.server.loop_lag())
+
+        latencies.sort()
+        return ScenarioResult(
+            scenario=name,
+            requests=len(latencies),
+            errors=errors,
+            duration_s=round(duration, 3),
+            rps=round(len(latencies) / duration, 1) if duration else 0.0,
+            p50_ms=round(percentile(latencies, 50) * 1000, 2),
+            p95_ms=round(percentile(latencies, 95) * 1000, 2),
+            p99_ms=round(percentile(latencies, 99) * 1000, 2),
+            max_ms=round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            loop_lag_p99_ms=round(percentile(lag, 99) * 1000, 2),
+            loop_lag_max_ms=round(lag[-1] * 1000, 2) if lag else 0.0,
+            status_counts=status_counts
+        )
+
+    async def run(self, only: Optional[List[str]] = None) -> List[ScenarioResult]:
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await self.login(session)
+            results = []
+            for name, build in self.scenarios().items():
+                if only and name not in only:
+                    continue
+                result = await self.run_scenario(session, name, build)
+                print(f"⏱️ {name:8} {result.rps:8.1f} rps  p50 {result.p50_ms:7.2f} ms  "
+                      f"p95 {result.p95_ms:7.2f} ms  p99 {result.p99_ms:7.2f} ms  "
+                      f"lag p99 {result.loop_lag_p99_ms:6.2f} ms  errores {result.errors}")
+                results.append(result)
+            return results
+
+def compare_with_baseline(results: List[ScenarioResult], baseline_path: Path,
+                          max_regression: float) -> List[str]:
+    """Regresiones frente a un resultado anterior: menos RPS, más p95 o nuevos errores"""
+    baseline = {item["scenario"]: item for item in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.scenario)
+        if previous is None:
+            continue
+        if result.rps < previous["rps"] * (1 - max_regression):
+            regressions.append(f"{result.scenario}: rps {previous['rps']} -> {result.rps}")
+        if result.p95_ms > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{result.scenario}: p95 {previous['p95_ms']} ms -> {result.p95_ms} ms")
+        if result.errors > previous["errors"]:
+            regressions.append(f"{result.scenario}: errores {previous['errors']} -> {result.errors}")
+    return regressions
+
+async def run_load_test(concurrency: int = 50, requests: int = 2000, port: int = 8765,
+                        only: Optional[List[str]] = None) -> Dict:
+    server = InProcessServer(port=port)
+    await server.start()
+    try:
+        results = await CloudLoadTest(server, concurrency, requests).run(only)
+    finally:
+        await server.stop()
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "concurrency": concurrency,
+        "requests_per_scenario": requests,
+        "python": sys.version.split()[0],
+        "results": [asdict(result) for result in results]
+    }
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RAULI Cloud API load test")
+    parser.add_argument("--concurrency", type=int, default=50, help="Clientes simultáneos")
+    parser.add_argument("--requests", type=int, default=2000, help="Solicitudes por escenario")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenario", action="append", help="Solo estos escenarios (repetible)")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", help="Resultado anterior para detectar regresiones")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Tolerancia relativa en RPS y p95 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args.concurrency, args.requests, args.port, args.scenario))
+
+    output = Path(args.output or f"logs/benchmarks/cloud_load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[METRICS] Resultados en {output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(
+            [ScenarioResult(**item) for item in report["results"]], Path(args.baseline), args.max_regression
+        )
+        for regression in regressions:
+            print(f"[ERROR] Regresión: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("[OK] Sin regresiones frente a la línea base")
+
+if __name__ == "__main__":
+    main()
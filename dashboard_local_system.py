@@ -10,7 +10,7 @@ import asyncio
 import webbrowser
 from datetime import datetime
 from typing import Dict, List
-import subprocess
+from ollama_inventory import get_model_inventory
 
 class RAULIDashboardLocal:
     def __init__(self):
@@ -62,18 +62,9 @@ class RAULIDashboardLocal:
     
     def get_ollama_models(self) -> List[str]:
         """Obtener modelos Ollama disponibles"""
-        try:
-            result = subprocess.run(
-                ["ollama", "list"], 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]
-                return [line.split()[0] for line in lines if line.strip()]
-        except:
-            pass
+        snapshot = get_model_inventory().snapshot()
+        if snapshot.available and snapshot.models:
+            return snapshot.models
         return ["llama2", "codellama", "qwen3:4b", "deepseek-r1"]
     
     def get_cpu_usage(self) -> float:
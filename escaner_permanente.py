@@ -15,6 +15,8 @@ from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 
+from intenciones_rapidas import MatcherIntenciones
+
 # Cargar credenciales RAULI
 load_dotenv(r"C:\RAULI_CORE\credenciales.env")
 
@@ -36,6 +38,22 @@ class EscanerPermanente:
         self.mensajes_pendientes = {}
         self.respuestas_enviadas = 0
         
+        # Respuestas predefinidas por intención para máxima velocidad
+        self.respuestas_rapidas = {
+            'saludo': "¡Hola! Estoy aquí para ayudarte inmediatamente.",
+            'estado': "Estoy perfecto y escuchándote siempre.",
+            'ayuda': "Puedo ayudarte con programación, código y sistemas técnicos.",
+            'agradecimiento': "De nada siempre es un placer ayudarte.",
+        }
+        
+        # Orden de comprobación propio: "gracias por la ayuda" responde como ayuda
+        self.matcher_rapido = MatcherIntenciones([
+            ('saludo', [r'hola']),
+            ('estado', [r'cómo estás']),
+            ('ayuda', [r'ayuda']),
+            ('agradecimiento', [r'gracias']),
+        ], palabras_completas=False)
+        
         # Configurar logging
         self.setup_logging()
         
@@ -238,19 +256,8 @@ class EscanerPermanente:
     
     def generar_respuesta_rapida(self, contenido):
         """Genera respuesta ultra-rápida"""
-        contenido_lower = contenido.lower()
-        
-        # Respuestas predefinidas para máxima velocidad
-        if 'hola' in contenido_lower:
-            return "¡Hola! Estoy aquí para ayudarte inmediatamente."
-        elif 'cómo estás' in contenido_lower:
-            return "Estoy perfecto y escuchándote siempre."
-        elif 'ayuda' in contenido_lower:
-            return "Puedo ayudarte con programación, código y sistemas técnicos."
-        elif 'gracias' in contenido_lower:
-            return "De nada siempre es un placer ayudarte."
-        else:
-            return "Entiendo tu mensaje. Estoy procesando tu solicitud."
+        intencion = self.matcher_rapido.detectar(contenido)
+        return self.respuestas_rapidas.get(intencion, "Entiendo tu mensaje. Estoy procesando tu solicitud.")
     
     def bucle_escaneo_principal(self):
         """Bucle principal de escaneo"""
@@ -10,9 +10,166 @@ import time
 import json
 import hashlib
 import threading
+import atexit
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from intenciones_rapidas import detectar_frase_rapida, detectar_intencion
+
+class CacheRespuestas:
+    """Caché LRU con TTL por entrada, límites de tamaño y snapshot en segundo plano"""
+    
+    def __init__(self, archivo, ttl=3600, max_entradas=1000, max_bytes=2 * 1024 * 1024,
+                 intervalo_snapshot=30):
+        self.archivo = Path(archivo)
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.intervalo_snapshot = intervalo_snapshot
+        
+        # clave -> (respuesta, creada, expira); el orden es el de uso (LRU al principio)
+        self.entradas = OrderedDict()
+        self.bytes_usados = 0
+        self.lock = threading.Lock()
+        self.sucio = False
+        
+        # Contadores reales
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expiraciones = 0
+        
+        self.cargar()
+        
+        self.activo = True
+        self.evento_parada = threading.Event()
+        self.hilo_snapshot = threading.Thread(target=self.bucle_snapshot, daemon=True)
+        self.hilo_snapshot.start()
+        atexit.register(self.cerrar)
+    
+    @staticmethod
+    def tamano_entrada(clave, respuesta):
+        """Tamaño aproximado en bytes de una entrada"""
+        return len(clave) + len(respuesta.encode('utf-8')) + 64
+    
+    def __len__(self):
+        return len(self.entradas)
+    
+    def __contains__(self, clave):
+        return self.obtener(clave, contar=False) is not None
+    
+    def obtener(self, clave, contar=True):
+        """Devuelve la respuesta si existe y no ha expirado (expiración perezosa)"""
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                if contar:
+                    self.fallos += 1
+                return None
+            
+            respuesta, _, expira = entrada
+            if time.time() >= expira:
+                self.quitar(clave)
+                self.expiraciones += 1
+                if contar:
+                    self.fallos += 1
+                return None
+            
+            self.entradas.move_to_end(clave)
+            if contar:
+                self.aciertos += 1
+            return respuesta
+    
+    def guardar(self, clave, respuesta, ttl=None):
+        """Inserta o renueva una entrada y desaloja por LRU si se superan los límites"""
+        ahora = time.time()
+        with self.lock:
+            if clave in self.entradas:
+                self.quitar(clave)
+            self.entradas[clave] = (respuesta, ahora, ahora + (ttl or self.ttl))
+            self.bytes_usados += self.tamano_entrada(clave, respuesta)
+            
+            while self.entradas and (len(self.entradas) > self.max_entradas or
+                                     self.bytes_usados > self.max_bytes):
+                clave_antigua = next(iter(self.entradas))
+                self.quitar(clave_antigua)
+                self.desalojos += 1
+            
+            self.sucio = True
+    
+    def quitar(self, clave):
+        """Elimina una entrada (llamar con el lock tomado)"""
+        respuesta, _, _ = self.entradas.pop(clave)
+        self.bytes_usados -= self.tamano_entrada(clave, respuesta)
+    
+    def cargar(self):
+        """Carga el snapshot descartando entradas ya expiradas"""
+        try:
+            if not self.archivo.exists():
+                return
+            with open(self.archivo, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except Exception:
+            return
+        
+        ahora = time.time()
+        # Orden por creación para reconstruir el LRU aproximado
+        for clave, datos_entrada in sorted(datos.items(), key=lambda item: item[1].get('timestamp', 0)):
+            creada = datos_entrada.get('timestamp', 0)
+            expira = datos_entrada.get('expira', creada + self.ttl)
+            if expira > ahora:
+                self.guardar(clave, datos_entrada['respuesta'], expira - ahora)
+        self.sucio = False
+    
+    def snapshot(self):
+        """Escribe el contenido actual si cambió (temporal + rename)"""
+        with self.lock:
+            if not self.sucio:
+                return False
+            datos = {
+                clave: {'respuesta': respuesta, 'timestamp': creada, 'expira': expira}
+                for clave, (respuesta, creada, expira) in self.entradas.items()
+            }
+            self.sucio = False
+        
+        try:
+            temporal = self.archivo.with_name(self.archivo.name + '.tmp')
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temporal, self.archivo)
+            return True
+        except Exception:
+            self.sucio = True
+            return False
+    
+    def bucle_snapshot(self):
+        """Persistencia periódica en segundo plano"""
+        while not self.evento_parada.wait(self.intervalo_snapshot):
+            self.snapshot()
+    
+    def cerrar(self):
+        """Detiene el hilo y escribe el último snapshot"""
+        if self.activo:
+            self.activo = False
+            self.evento_parada.set()
+            self.snapshot()
+    
+    def estadisticas(self):
+        """Contadores de la caché"""
+        with self.lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self.entradas),
+                'bytes': self.bytes_usados,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'expiraciones': self.expiraciones,
+                'hit_rate': self.aciertos / consultas if consultas else 0.0
+            }
+
 class RespuestaInmediata:
     def __init__(self):
         self.cache_dir = Path(r"C:\RAULI_CORE\cache")
@@ -21,76 +178,57 @@ class RespuestaInmediata:
         self.cache_file = self.cache_dir / "respuestas_cache.json"
         self.cache_timeout = 3600  # 1 hora
         
-        self.cargar_cache()
+        self.cache = CacheRespuestas(self.cache_file, ttl=self.cache_timeout)
         
-        # Respuestas predefinidas para acceso instantáneo
+        # Respuestas predefinidas por intención (acceso instantáneo, sin caché)
         self.respuestas_rapidas = {
-            "hola": "¡Hola! Soy Rauli. ¿En qué te ayudo ahora?",
-            "buenos días": "¡Buenos días! Estoy listo para ayudarte.",
-            "buenas tardes": "¡Buenas tardes! ¿Qué necesitas?",
-            "cómo estás": "Estoy perfecto y listo para asistirte.",
-            "adiós": "¡Hasta luego! Estaré aquí cuando me necesites.",
-            "gracias": "De nada siempre es un placer ayudarte.",
+            "saludo": "¡Hola! Soy Rauli. ¿En qué te ayudo ahora?",
+            "saludo_dia": "¡Buenos días! Estoy listo para ayudarte.",
+            "saludo_tarde": "¡Buenas tardes! ¿Qué necesitas?",
+            "estado": "Estoy perfecto y listo para asistirte.",
+            "despedida": "¡Hasta luego! Estaré aquí cuando me necesites.",
+            "agradecimiento": "De nada siempre es un placer ayudarte.",
             "ayuda": "Puedo ayudarte con programación, código, errores y sistemas técnicos.",
-            "qué puedes hacer": "Soy especialista en desarrollo, debugging, arquitectura y automatización.",
+            "capacidades": "Soy especialista en desarrollo, debugging, arquitectura y automatización.",
+        }
+        
+        # Respuestas generadas por intención (se guardan en caché)
+        self.respuestas_inteligentes = {
+            "saludo": "¡Hola! Estoy listo para ayudarte inmediatamente.",
+            "estado": "Estoy perfecto y listo para asistirte al momento.",
+            "despedida": "¡Hasta luego! Estaré aquí cuando me necesites.",
+            "agradecimiento": "De nada siempre es un placer ayudarte. ¿Hay algo más?",
+            "ayuda": "Entiendo que necesitas ayuda. Puedo asistirte con programación, código, errores y sistemas. ¿Cuál es tu problema?",
+            "capacidades": "Soy especialista en desarrollo, debugging, arquitectura y automatización. Dime tu necesidad y te ayudo ahora.",
+            "problema": "Detecto un problema técnico. Describe el error y te ayudaré a solucionarlo inmediatamente.",
+            "programacion": "Necesitas ayuda con programación. ¿Qué lenguaje y qué problema específico?",
+            "api": "Trabajo con APIs es mi especialidad. ¿Necesitas crear, consumir o depurar?",
+            "base_datos": "Puedo ayudarte con bases de datos. ¿Qué necesitas específicamente?",
+            "vision": "👁️ Activando sistema de visión. Analizando entorno ahora...",
+            "control": "🤲 Sistema de control activado. ¿Qué necesito hacer?",
+            "voz": "🗣️ Sistema de voz activado. ¿Qué quieres que diga?",
         }
         
         print("⚡ Sistema de Respuesta Inmediata cargado")
     
-    def cargar_cache(self):
-        """Carga caché de respuestas"""
-        try:
-            if self.cache_file.exists():
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.cache = json.load(f)
-            else:
-                self.cache = {}
-        except:
-            self.cache = {}
-    
-    def guardar_cache(self):
-        """Guarda caché de respuestas"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=2, ensure_ascii=False)
-        except:
-            pass
-    
     def generar_hash_texto(self, texto):
         """Genera hash único para texto"""
         return hashlib.md5(texto.lower().strip().encode()).hexdigest()
     
-    def limpiar_cache_expirado(self):
-        """Limpia caché expirado"""
-        ahora = time.time()
-        expirados = []
-        
-        for hash_key, datos in self.cache.items():
-            if ahora - datos['timestamp'] > self.cache_timeout:
-                expirados.append(hash_key)
-        
-        for hash_key in expirados:
-            del self.cache[hash_key]
-        
-        if expirados:
-            self.guardar_cache()
-    
     def obtener_respuesta_inmediata(self, texto, contexto_usuario=None):
         """Obtiene respuesta ultra-rápida"""
         texto_limpio = texto.lower().strip()
         hash_texto = self.generar_hash_texto(texto)
         
-        # 1. Respuestas predefinidas (instantáneo)
-        for clave, respuesta in self.respuestas_rapidas.items():
-            if clave in texto_limpio:
-                self.guardar_en_cache(hash_texto, respuesta)
-                return respuesta
+        # 1. Respuestas predefinidas (instantáneo, no pasan por la caché)
+        intencion = detectar_frase_rapida(texto_limpio)
+        if intencion is not None:
+            return self.respuestas_rapidas[intencion]
         
         # 2. Cache de respuestas anteriores (muy rápido)
-        if hash_texto in self.cache:
-            cache_entry = self.cache[hash_texto]
-            if time.time() - cache_entry['timestamp'] < self.cache_timeout:
-                return cache_entry['respuesta']
+        respuesta = self.cache.obtener(hash_texto)
+        if respuesta is not None:
+            return respuesta
         
         # 3. Generación inteligente rápida
         respuesta = self.generar_respuesta_inteligente(texto_limpio, contexto_usuario)
@@ -101,66 +239,15 @@ class RespuestaInmediata:
         return respuesta
     
     def guardar_en_cache(self, hash_key, respuesta):
-        """Guarda respuesta en cache"""
-        self.cache[hash_key] = {
-            'respuesta': respuesta,
-            'timestamp': time.time()
-        }
-        
-        # Limpiar cache expirado periódicamente
-        if len(self.cache) > 100:
-            self.limpiar_cache_expirado()
-        
-        self.guardar_cache()
+        """Guarda respuesta en cache (la persistencia es en segundo plano)"""
+        self.cache.guardar(hash_key, respuesta)
     
     def generar_respuesta_inteligente(self, texto, contexto_usuario):
         """Generación inteligente de respuesta"""
-        # Detección de patrones comunes
-        patrones = {
-            # Saludos
-            r'\b(hola|hey|buenos|buenas)\b': lambda: "¡Hola! Estoy listo para ayudarte inmediatamente.",
-            
-            # Estado
-            r'\b(cómo estás|qué tal|cómo te va)\b': lambda: "Estoy perfecto y listo para asistirte al momento.",
-            
-            # Despedidas
-            r'\b(adiós|chao|bye|hasta luego)\b': lambda: "¡Hasta luego! Estaré aquí cuando me necesites.",
-            
-            # Agradecimientos
-            r'\b(gracias|thank|mil gracias)\b': lambda: "De nada siempre es un placer ayudarte. ¿Hay algo más?",
-            
-            # Ayuda
-            r'\b(ayuda|ayúdame|necesito ayuda|socorro)\b': lambda: "Entiendo que necesitas ayuda. Puedo asistirte con programación, código, errores y sistemas. ¿Cuál es tu problema?",
-            
-            # Capacidades
-            r'\b(qué puedes hacer|capacidades|habilidades)\b': lambda: "Soy especialista en desarrollo, debugging, arquitectura y automatización. Dime tu necesidad y te ayudo ahora.",
-            
-            # Problemas técnicos
-            r'\b(error|bug|problema|fallo|no funciona)\b': lambda: "Detecto un problema técnico. Describe el error y te ayudaré a solucionarlo inmediatamente.",
-            
-            # Programación
-            r'\b(código|programar|desarrollo|programación)\b': lambda: "Necesitas ayuda con programación. ¿Qué lenguaje y qué problema específico?",
-            
-            # APIs
-            r'\b(api|endpoint|servicio|rest)\b': lambda: "Trabajo con APIs es mi especialidad. ¿Necesitas crear, consumir o depurar?",
-            
-            # Bases de datos
-            r'\b(base de datos|database|sql|mysql)\b': lambda: "Puedo ayudarte con bases de datos. ¿Qué necesitas específicamente?",
-            
-            # Sistema RAULI
-            r'\b(mira|ve|ojos|visión)\b': lambda: "👁️ Activando sistema de visión. Analizando entorno ahora...",
-            
-            r'\b(mueve|manos|mouse|control)\b': lambda: "🤲 Sistema de control activado. ¿Qué necesito hacer?",
-            
-            r'\b(habla|di|voz)\b': lambda: "🗣️ Sistema de voz activado. ¿Qué quieres que diga?",
-        }
-        
-        import re
+        intencion = detectar_intencion(texto)
         
-        # Buscar patrón coincidente
-        for patron, generador in patrones.items():
-            if re.search(patron, texto):
-                return generador()
+        if intencion in self.respuestas_inteligentes:
+            return self.respuestas_inteligentes[intencion]
         
         # Respuesta contextual por defecto
         if contexto_usuario and 'name' in contexto_usuario:
@@ -171,15 +258,17 @@ class RespuestaInmediata:
     
     def obtener_estadisticas(self):
         """Estadísticas del sistema"""
-        total_cache = len(self.cache)
-        cache_reciente = sum(1 for entry in self.cache.values() 
-                           if time.time() - entry['timestamp'] < 300)  # Últimos 5 min
+        stats_cache = self.cache.estadisticas()
         
         return {
-            'total_respuestas_cache': total_cache,
-            'respuestas_recientes': cache_reciente,
+            'total_respuestas_cache': stats_cache['entradas'],
+            'bytes_cache': stats_cache['bytes'],
+            'aciertos': stats_cache['aciertos'],
+            'fallos': stats_cache['fallos'],
+            'desalojos': stats_cache['desalojos'],
+            'expiraciones': stats_cache['expiraciones'],
             'respuestas_predefinidas': len(self.respuestas_rapidas),
-            'cache_hit_rate': f"{(cache_reciente / max(total_cache, 1)) * 100:.1f}%" if total_cache > 0 else "0%"
+            'cache_hit_rate': f"{stats_cache['hit_rate'] * 100:.1f}%"
         }
 
 # Instancia global del sistema
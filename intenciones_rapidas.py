@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+⚡ INTENCIONES RÁPIDAS RAULI - Detección de intención en una sola pasada
+Matcher compartido por los caminos de respuesta inmediata
+"""
+
+import re
+import time
+
+# Intenciones en orden de prioridad (palabras completas): si el texto contiene varias, gana la primera.
+# Mismos patrones y orden que la generación inteligente de respuesta_inmediata
+INTENCIONES = [
+    ('saludo', [r'hola', r'hey', r'buenos', r'buenas']),
+    ('estado', [r'cómo estás', r'qué tal', r'cómo te va']),
+    ('despedida', [r'adiós', r'chao', r'bye', r'hasta luego']),
+    ('agradecimiento', [r'gracias', r'thank', r'mil gracias']),
+    ('ayuda', [r'ayuda', r'ayúdame', r'necesito ayuda', r'socorro']),
+    ('capacidades', [r'qué puedes hacer', r'capacidades', r'habilidades']),
+    ('problema', [r'error', r'bug', r'problema', r'fallo', r'no funciona']),
+    ('programacion', [r'código', r'programar', r'desarrollo', r'programación']),
+    ('api', [r'api', r'endpoint', r'servicio', r'rest']),
+    ('base_datos', [r'base de datos', r'database', r'sql', r'mysql']),
+    ('vision', [r'mira', r've', r'ojos', r'visión']),
+    ('control', [r'mueve', r'manos', r'mouse', r'control']),
+    ('voz', [r'habla', r'di', r'voz']),
+]
+
+# Frases de las respuestas predefinidas (subcadenas), en el orden en que se comprobaban
+FRASES_RAPIDAS = [
+    ('saludo', [r'hola']),
+    ('saludo_dia', [r'buenos días']),
+    ('saludo_tarde', [r'buenas tardes']),
+    ('estado', [r'cómo estás']),
+    ('despedida', [r'adiós']),
+    ('agradecimiento', [r'gracias']),
+    ('ayuda', [r'ayuda']),
+    ('capacidades', [r'qué puedes hacer']),
+]
+
+class MatcherIntenciones:
+    """Alternancia única con grupos nombrados, compilada una sola vez.
+    Equivale a probar las intenciones una a una en orden y quedarse con la primera que aparece"""
+
+    def __init__(self, intenciones, palabras_completas=True):
+        self.prioridad = {nombre: i for i, (nombre, _) in enumerate(intenciones)}
+        grupos = '|'.join(
+            f"(?P<{nombre}>{'|'.join(patrones)})" for nombre, patrones in intenciones
+        )
+        limite = r'\b' if palabras_completas else ''
+        # Lookahead: se prueban todas las posiciones, también las solapadas con otra coincidencia
+        self.patron = re.compile(rf'(?={limite}(?:{grupos}){limite})')
+
+    def detectar(self, texto):
+        """Devuelve la intención de mayor prioridad presente en el texto, o None"""
+        mejor = None
+        mejor_prioridad = len(self.prioridad)
+
+        for coincidencia in self.patron.finditer(texto.lower()):
+            prioridad = self.prioridad[coincidencia.lastgroup]
+            if prioridad < mejor_prioridad:
+                mejor, mejor_prioridad = coincidencia.lastgroup, prioridad
+                if prioridad == 0:
+                    break
+
+        return mejor
+
+# Matchers globales construidos al importar
+matcher = MatcherIntenciones(INTENCIONES)
+matcher_frases = MatcherIntenciones(FRASES_RAPIDAS, palabras_completas=False)
+
+def detectar_intencion(texto):
+    """Función global para detectar la intención de un mensaje"""
+    return matcher.detectar(texto)
+
+def detectar_frase_rapida(texto):
+    """Intención de las respuestas predefinidas (frase contenida en el texto)"""
+    return matcher_frases.detectar(texto)
+
+def main():
+    """Micro-benchmark: latencia por mensaje con 10k mensajes"""
+    mensajes_base = [
+        "hola",
+        "buenas tardes rauli",
+        "necesito ayuda con programación",
+        "tengo un error en mi código de python",
+        "cómo conecto una api rest con mi base de datos",
+        "mueve el mouse a la esquina",
+        "esto es un mensaje largo sin ninguna palabra clave que coincida con las intenciones conocidas del sistema",
+        "gracias por todo",
+    ]
+    mensajes = [mensajes_base[i % len(mensajes_base)] for i in range(10000)]
+
+    def detectar_anterior(texto):
+        # Enfoque previo: diccionario de regex reconstruido y probado uno a uno
+        patrones = {
+            r'\b(' + '|'.join(patrones) + r')\b': nombre for nombre, patrones in INTENCIONES
+        }
+        import re
+        for patron, nombre in patrones.items():
+            if re.search(patron, texto):
+                return nombre
+        return None
+
+    for nombre, funcion in [('anterior', detectar_anterior), ('compilado', detectar_intencion)]:
+        inicio = time.perf_counter()
+        for mensaje in mensajes:
+            funcion(mensaje.lower())
+        total = time.perf_counter() - inicio
+        print(f"⏱️ {nombre}: {total * 1000:.1f} ms total, {total / len(mensajes) * 1e6:.2f} µs/mensaje")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+[CLOUD] RAULI Node Registry - Registro indexado de nodos cloud
+Índices por (tier, región) con montículos indexados para seleccionar nodo en O(log n)
+"""
+
+import math
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+class IndexedMinHeap:
+    """Montículo binario con posición por clave: push, update y remove en O(log n)"""
+
+    def __init__(self):
+        self.items: List[Any] = []     # elementos en orden de montículo
+        self.keys: List[Tuple] = []    # prioridad de cada posición
+        self.position: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, ident: Hashable) -> bool:
+        return ident in self.position
+
+    def peek(self) -> Any:
+        return self.items[0] if self.items else None
+
+    def push(self, ident: Hashable, item: Any, key: Tuple):
+        if ident in self.position:
+            self.update(ident, key)
+            return
+        self.items.append(item)
+        self.keys.append(key)
+        self.position[ident] = len(self.items) - 1
+        self.sift_up(len(self.items) - 1)
+
+    def update(self, ident: Hashable, key: Tuple):
+        index = self.position[ident]
+        previous, self.keys[index] = self.keys[index], key
+        if key < previous:
+            self.sift_up(index)
+        else:
+            self.sift_down(index)
+
+    def remove(self, ident: Hashable):
+        index = self.position.pop(ident)
+        last = len(self.items) - 1
+        if index != last:
+            self.move(last, index)
+        self.items.pop()
+        self.keys.pop()
+        if index < len(self.items):
+            self.sift_up(index)
+            self.sift_down(index)
+
+    def random_pair(self, rng: random.Random) -> Tuple[Any, Any]:
+        """Dos elementos distintos al azar (o el mismo dos veces si solo hay uno)"""
+        if len(self.items) == 1:
+            return self.items[0], self.items[0]
+        first, second = rng.sample(range(len(self.items)), 2)
+        return self.items[first], self.items[second]
+
+    def move(self, source: int, target: int):
+        self.items[target] = self.items[source]
+        self.keys[target] = self.keys[source]
+        self.position[self.items[target].id] = target
+
+    def swap(self, a: int, b: int):
+        self.items[a], self.items[b] = self.items[b], self.items[a]
+        self.keys[a], self.keys[b] = self.keys[b], self.keys[a]
+        self.position[self.items[a].id] = a
+        self.position[self.items[b].id] = b
+
+    def sift_up(self, index: int):
+        while index > 0:
+            parent = (index - 1) // 2
+            if self.keys[index] >= self.keys[parent]:
+                break
+            self.swap(index, parent)
+            index = parent
+
+    def sift_down(self, index: int):
+        size = len(self.items)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self.keys[child] < self.keys[smallest]:
+                    smallest = child
+            if smallest == index:
+                return
+            self.swap(index, smallest)
+            index = smallest
+
+class NodesSaturated(Exception):
+    """Todos los nodos elegibles están en su límite de solicitudes en curso"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Nodos saturados, reintentar en {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class NodeRegistry:
+    """Nodos indexados por (tier, región) y por tier, ordenados por carga y por solicitudes en curso"""
+
+    POLICIES = ("least_loaded", "power_of_two", "least_outstanding")
+
+    def __init__(self, nodes: Optional[List[Any]] = None, policy: str = "least_loaded",
+                 rng: Optional[random.Random] = None, max_in_flight: int = 64, alpha: float = 0.2,
+                 concurrency_window: float = 10.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política de selección desconocida: {policy}")
+        self.policy = policy
+        self.rng = rng or random.Random()
+        self.max_in_flight = max_in_flight
+        self.alpha = alpha
+        self.concurrency_window = concurrency_window
+
+        self.nodes: Dict[str, Any] = {}  # id -> nodo, en orden de alta
+        self.order: Dict[str, int] = {}  # desempate estable como el min() lineal
+        self.outstanding: Dict[str, int] = {}
+        self.counter = 0
+
+        # Medidas por nodo: concurrencia media en el tiempo, EWMA de latencia y latencia base (mínima)
+        self.ewma_concurrency: Dict[str, Tuple[float, float]] = {}  # id -> (media, instante)
+        self.ewma_latency: Dict[str, float] = {}
+        self.baseline_latency: Dict[str, float] = {}
+        self.stats = {"dispatched": 0, "errors": 0, "saturated": 0}
+        # Contadores acumulados por (tier, región) para el autoescalado
+        self.group_requests: Dict[Tuple, int] = {}
+
+        # índice -> montículo; los índices son (tier, región) y (tier, None)
+        self.by_load: Dict[Tuple, IndexedMinHeap] = {}
+        self.by_outstanding: Dict[Tuple, IndexedMinHeap] = {}
+
+        for node in nodes or []:
+            self.add(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(list(self.nodes.values()))
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.nodes
+
+    def get(self, node_id: str) -> Optional[Any]:
+        return self.nodes.get(node_id)
+
+    def all(self) -> List[Any]:
+        return list(self.nodes.values())
+
+    @staticmethod
+    def indexes(node) -> Tuple[Tuple, Tuple]:
+        return (node.tier, node.region), (node.tier, None)
+
+    def is_saturated(self, node_id: str) -> bool:
+        return self.outstanding[node_id] >= self.max_in_flight
+
+    # Los nodos saturados quedan al fondo: si la cima está saturada, lo están todos
+    def load_key(self, node) -> Tuple:
+        return (self.is_saturated(node.id), node.load_percentage, self.order[node.id])
+
+    def outstanding_key(self, node) -> Tuple:
+        return (self.outstanding[node.id], node.load_percentage, self.order[node.id])
+
+    def add(self, node):
+        """Alta (o reemplazo) de un nodo"""
+        if node.id in self.nodes:
+            self.remove(node.id)
+        self.nodes[node.id] = node
+        self.order[node.id] = self.counter
+        self.counter += 1
+        self.outstanding[node.id] = 0
+        self.ewma_concurrency[node.id] = (0.0, time.monotonic())
+
+        for index in self.indexes(node):
+            self.by_load.setdefault(index, IndexedMinHeap()).push(node.id, node, self.load_key(node))
+            self.by_outstanding.setdefault(index, IndexedMinHeap()).push(node.id, node, self.outstanding_key(node))
+
+    def remove(self, node_id: str) -> Optional[Any]:
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return None
+        for index in self.indexes(node):
+            for heaps in (self.by_load, self.by_outstanding):
+                heaps[index].remove(node_id)
+                if not heaps[index]:
+                    del heaps[index]
+        del self.order[node_id]
+        del self.outstanding[node_id]
+        del self.ewma_concurrency[node_id]
+        self.ewma_latency.pop(node_id, None)
+        self.baseline_latency.pop(node_id, None)
+        return node
+
+    def reindex(self, node):
+        for index in self.indexes(node):
+            self.by_load[index].update(node.id, self.load_key(node))
+            self.by_outstanding[index].update(node.id, self.outstanding_key(node))
+
+    def update(self, node_id: str, load_percentage: Optional[float] = None,
+               active_connections: Optional[int] = None):
+        """Actualiza métricas del nodo y su posición en los índices en O(log n)"""
+        node = self.nodes[node_id]
+        if active_connections is not None:
+            node.active_connections = active_connections
+        if load_percentage is not None and load_percentage != node.load_percentage:
+            node.load_percentage = load_percentage
+            self.reindex(node)
+
+    def begin(self, node_id: str):
+        """Una solicitud más en curso en el nodo"""
+        self.outstanding[node_id] += 1
+        self.stats["dispatched"] += 1
+        node = self.nodes[node_id]
+        group = (node.tier, node.region)
+        self.group_requests[group] = self.group_requests.get(group, 0) + 1
+        self.refresh_load(node_id, self.outstanding[node_id] - 1)
+
+    def finish(self, node_id: str, latency: Optional[float] = None):
+        """Solicitud terminada; la latencia solo se mide si terminó bien"""
+        if node_id not in self.outstanding:
+            return  # el nodo se retiró mientras tanto
+        previous_level = self.outstanding[node_id]
+        self.outstanding[node_id] = max(0, previous_level - 1)
+        if latency is not None:
+            previous = self.ewma_latency.get(node_id)
+            self.ewma_latency[node_id] = latency if previous is None else previous + self.alpha * (latency - previous)
+            self.baseline_latency[node_id] = min(self.baseline_latency.get(node_id, latency), latency)
+        self.refresh_load(node_id, previous_level)
+
+    @contextmanager
+    def in_flight(self, node_id: str):
+        """Cuenta la solicitud mientras dura, también si falla"""
+        self.begin(node_id)
+        start = time.perf_counter()
+        latency = None
+        try:
+            yield self.nodes[node_id]
+            latency = time.perf_counter() - start
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.finish(node_id, latency)
+
+    def refresh_load(self, node_id: str, previous_level: Optional[int] = None):
+        """Carga = concurrencia media sobre el límite, inflada si la latencia se degrada
+
+        La media pondera por el tiempo que duró cada nivel, así decae sola con el nodo inactivo.
+        """
+        node = self.nodes[node_id]
+        current = self.outstanding[node_id]
+        level = current if previous_level is None else previous_level
+        average, since = self.ewma_concurrency[node_id]
+        now = time.monotonic()
+        weight = 1.0 - math.exp(-(now - since) / self.concurrency_window)
+        concurrency = average + weight * (level - average)
+        self.ewma_concurrency[node_id] = (concurrency, now)
+
+        degradation = 1.0
+        if node_id in self.ewma_latency and self.baseline_latency[node_id] > 0:
+            degradation = max(1.0, self.ewma_latency[node_id] / self.baseline_latency[node_id])
+
+        node.load_percentage = round(min(100.0, 100.0 * max(concurrency, current) / self.max_in_flight * degradation), 2)
+        node.active_connections = current
+        self.reindex(node)
+
+    def refresh_loads(self):
+        """Recalcula la carga de todos los nodos (llamar periódicamente)"""
+        for node_id in list(self.nodes):
+            self.refresh_load(node_id)
+
+    def retry_after(self, index: Tuple) -> float:
+        """Tiempo estimado hasta que quede libre una plaza en el índice"""
+        latencies = [self.ewma_latency.get(node.id, 1.0) for node in self.by_load[index].items]
+        return min(latencies) if latencies else 1.0
+
+    def candidates(self, tier, region) -> Optional[Tuple]:
+        """Índice a usar: misma región si tiene nodos, si no todo el tier"""
+        if (tier, region) in self.by_load:
+            return (tier, region)
+        if (tier, None) in self.by_load:
+            return (tier, None)
+        return None
+
+    def select(self, tier, region, policy: Optional[str] = None) -> Optional[Any]:
+        """Nodo elegido para (tier, región) según la política, saltando nodos saturados
+
+        None si no hay nodos del tier; NodesSaturated si todos los elegibles están al límite.
+        """
+        index = self.candidates(tier, region)
+        if index is None:
+            return None
+
+        if self.is_saturated(self.by_load[index].peek().id) and index[1] is not None \
+                and (tier, None) in self.by_load:
+            # Región llena: probar el resto de regiones del tier
+            index = (tier, None)
+        if self.is_saturated(self.by_load[index].peek().id):
+            self.stats["saturated"] += 1
+            # La demanda rechazada también cuenta para escalar
+            if (tier, region) in self.by_load:
+                self.group_requests[(tier, region)] = self.group_requests.get((tier, region), 0) + 1
+            raise NodesSaturated(self.retry_after(index))
+
+        policy = policy or self.policy
+        if policy == "least_loaded":
+            return self.by_load[index].peek()
+        if policy == "least_outstanding":
+            return self.by_outstanding[index].peek()
+        if policy == "power_of_two":
+            first, second = self.by_load[index].random_pair(self.rng)
+            choice = min(first, second, key=self.outstanding_key)
+            return self.by_load[index].peek() if self.is_saturated(choice.id) else choice
+        raise ValueError(f"Política de selección desconocida: {policy}")
+
+    def group_signals(self) -> Dict[Tuple, Dict[str, int]]:
+        """(tier, región) -> nodos, solicitudes en curso y solicitudes acumuladas"""
+        signals = {}
+        for (tier, region), heap in self.by_load.items():
+            if region is None:
+                continue
+            signals[(tier, region)] = {
+                "nodes": len(heap),
+                "in_flight": sum(self.outstanding[node.id] for node in heap.items),
+                "requests": self.group_requests.get((tier, region), 0)
+            }
+        return signals
+
+    def get_stats(self) -> Dict:
+        return {
+            "nodes": len(self.nodes),
+            "policy": self.policy,
+            "indexes": len(self.by_load),
+            "outstanding": sum(self.outstanding.values()),
+            "max_in_flight": self.max_in_flight,
+            "saturated_nodes": sum(1 for node_id in self.nodes if self.is_saturated(node_id)),
+            **self.stats
+        }
+
+def benchmark_node_selection(node_count: int = 10000, selections: int = 20000, seed: int = 7):
+    """Selección con 10k nodos: escaneo lineal frente al registro indexado"""
+    from rauli_cloud_architecture import CloudNode, Region, ServiceTier
+
+    rng = random.Random(seed)
+    regions, tiers = list(Region), list(ServiceTier)
+    nodes = [
+        CloudNode(f"node-{i}", rng.choice(regions), rng.choice(tiers), 8, 32, 500, 500,
+                  "active", rng.uniform(0, 95), 0, f"https://node-{i}.rauli.ai")
+        for i in range(node_count)
+    ]
+    queries = [(rng.choice(tiers), rng.choice(regions)) for _ in range(selections)]
+
+    def linear_scan(tier, region):
+        # Enfoque previo de select_optimal_node
+        eligible = [node for node in nodes if node.tier == tier]
+        same_region = [node for node in eligible if node.region == region]
+        return min(same_region or eligible, key=lambda n: n.load_percentage)
+
+    registry = NodeRegistry(nodes, rng=random.Random(seed))
+
+    def run(name: str, select: Callable, count: int):
+        start = time.perf_counter()
+        for tier, region in queries[:count]:
+            node = select(tier, region)
+            # Cada selección cambia la carga del nodo elegido
+            registry.update(node.id, load_percentage=min(95.0, node.load_percentage + 0.01))
+        total = time.perf_counter() - start
+        print(f"⏱️ {name}: {total / count * 1e6:.1f} µs/selección ({count} selecciones, {node_count} nodos)")
+
+    # El lineal es lento: basta con una muestra
+    run("escaneo lineal", linear_scan, min(selections, 500))
+    for policy in NodeRegistry.POLICIES:
+        run(f"registro {policy}", lambda tier, region, policy=policy: registry.select(tier, region, policy), selections)
+
+if __name__ == "__main__":
+    benchmark_node_selection()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+[AI] RAULI Ollama Inventory - Inventario compartido de modelos
+Sondea la API HTTP de Ollama una vez, cachea con TTL y refresca en segundo plano
+"""
+
+import os
+import json
+import time
+import threading
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+@dataclass
+class InventorySnapshot:
+    available: bool
+    models: List[str] = field(default_factory=list)
+    loaded: List[str] = field(default_factory=list)
+    version: Optional[str] = None
+    probed_at: float = 0.0
+    error: Optional[str] = None
+
+    def model_names(self) -> List[str]:
+        """Nombres sin etiqueta (codellama:latest -> codellama)"""
+        return [model.split(":")[0] for model in self.models]
+
+    def to_dict(self) -> Dict:
+        return {
+            "available": self.available,
+            "models": self.models,
+            "loaded": self.loaded,
+            "version": self.version,
+            "age_seconds": round(time.time() - self.probed_at, 1) if self.probed_at else None,
+            "error": self.error
+        }
+
+class ModelInventory:
+    """Inventario de modelos Ollama con caché TTL, refresco en segundo plano y eventos de cambio"""
+
+    def __init__(self, base_url: Optional[str] = None, ttl: float = 30.0, probe_timeout: float = 2.0):
+        self.base_url = (base_url or os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")).rstrip("/")
+        if not self.base_url.startswith("http"):
+            self.base_url = f"http://{self.base_url}"
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+
+        self.current: Optional[InventorySnapshot] = None
+        self.lock = threading.Lock()
+        self.probe_lock = threading.Lock()
+        self.subscribers: List[Callable[[Optional[InventorySnapshot], InventorySnapshot], None]] = []
+        self.stats = {"probes": 0, "changes": 0, "errors": 0}
+
+        self.refresher: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+
+    def get_json(self, path: str) -> Dict:
+        with urllib.request.urlopen(f"{self.base_url}{path}", timeout=self.probe_timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def probe(self) -> InventorySnapshot:
+        """Una sola sonda HTTP por refresco (sin lanzar procesos)"""
+        self.stats["probes"] += 1
+        try:
+            version = self.get_json("/api/version").get("version")
+            models = [m["name"] for m in self.get_json("/api/tags").get("models", [])]
+            try:
+                loaded = [m["name"] for m in self.get_json("/api/ps").get("models", [])]
+            except Exception:
+                loaded = []  # versiones antiguas sin /api/ps
+            return InventorySnapshot(True, models, loaded, version, time.time())
+        except Exception as e:
+            self.stats["errors"] += 1
+            return InventorySnapshot(False, probed_at=time.time(), error=str(e))
+
+    def refresh(self) -> InventorySnapshot:
+        """Sondea ahora y publica el cambio si lo hubo"""
+        with self.probe_lock:
+            snapshot = self.probe()
+            with self.lock:
+                previous, self.current = self.current, snapshot
+
+        if previous is None or (previous.available, previous.models, previous.loaded) != \
+                (snapshot.available, snapshot.models, snapshot.loaded):
+            self.stats["changes"] += 1
+            for callback in list(self.subscribers):
+                try:
+                    callback(previous, snapshot)
+                except Exception as e:
+                    print(f"[WARN] Suscriptor de inventario falló: {e}")
+        return snapshot
+
+    def snapshot(self) -> InventorySnapshot:
+        """Último inventario; solo sondea en línea la primera vez"""
+        self.start()
+        with self.lock:
+            current = self.current
+        if current is None:
+            return self.refresh()
+        return current
+
+    def is_available(self) -> bool:
+        return self.snapshot().available
+
+    def models(self) -> List[str]:
+        return self.snapshot().models
+
+    def subscribe(self, callback: Callable[[Optional[InventorySnapshot], InventorySnapshot], None]):
+        """callback(anterior, nuevo) en cada cambio de modelos o disponibilidad"""
+        self.subscribers.append(callback)
+
+    def start(self):
+        """Arranca el refresco en segundo plano (idempotente)"""
+        if self.refresher is not None:
+            return
+        with self.lock:
+            if self.refresher is not None:
+                return
+            self.refresher = threading.Thread(target=self.refresh_loop, daemon=True)
+            self.refresher.start()
+
+    def refresh_loop(self):
+        while not self.stop_event.wait(self.ttl):
+            self.refresh()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, ttl=self.ttl, base_url=self.base_url)
+
+_inventory = None
+_inventory_lock = threading.Lock()
+
+def get_model_inventory() -> ModelInventory:
+    """Inventario compartido por todo el proceso"""
+    global _inventory
+    if _inventory is None:
+        with _inventory_lock:
+            if _inventory is None:
+                _inventory = ModelInventory(ttl=float(os.getenv("OLLAMA_INVENTORY_TTL", 30)))
+    return _inventory
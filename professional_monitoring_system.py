@@ -14,13 +14,53 @@ import psutil
 import requests
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
 import sqlite3
 import hashlib
 import webbrowser
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from functools import partial
+import heapq
+import http.server
+import socketserver
+import urllib.parse
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Campos numéricos de cada serie temporal en memoria
+SYSTEM_FIELDS = ['cpu_percent', 'memory_percent', 'disk_usage', 'bytes_sent', 'bytes_recv',
+                 'packets_sent', 'packets_recv', 'process_count', 'uptime']
+DEVELOPMENT_FIELDS = ['files_changed', 'lines_added', 'lines_removed', 'commits_today',
+                      'build_time', 'code_coverage']
+PERFORMANCE_FIELDS = ['response_time', 'throughput', 'error_rate', 'availability']
+
+# Límite de muestras por serie en memoria; el histórico completo queda en SQLite
+MAX_HISTORY_POINTS = 500000
+
+# Agregados por tabla: campos resumidos y resoluciones (segundos por bucket)
+ROLLUP_FIELDS = {
+    'system_metrics': ['cpu_percent', 'memory_percent', 'disk_usage', 'process_count'],
+    'performance_metrics': ['response_time', 'throughput', 'error_rate', 'availability']
+}
+ROLLUP_RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Ventanas hasta este tamaño se calculan con el buffer en memoria; las mayores, con los agregados
+RING_WINDOW_SECONDS = 3600
+# Tendencia larga del dashboard: ventana, resolución y cada cuánto se vuelve a consultar
+TREND_WINDOW_SECONDS = 86400
+TREND_RESOLUTION = 3600
+TREND_REFRESH_SECONDS = 60
+
+# Cada cuánto se purgan filas expiradas y se compacta la base de datos (segundos)
+DB_RETENTION_INTERVAL = 3600
 
 class MonitorLevel(Enum):
     """Niveles de monitoreo"""
@@ -80,6 +120,870 @@ class Alert:
     resolved: bool = False
     resolution_time: Optional[str] = None
 
+class MetricsWriter:
+    """Escritor de métricas en lote sobre una conexión SQLite persistente (WAL)"""
+
+    def __init__(self, db_path: Path, batch_size: int = 200, max_age: float = 5.0,
+                 max_queue: int = 10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.max_queue = max_queue
+
+        # Cola acotada compartida entre el bucle de muestreo y el hilo escritor
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.oldest_pending = None
+
+        # Conexión única de larga duración
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.db_lock = threading.Lock()
+
+        self.is_running = False
+        self.writer_thread = None
+
+        # Estadísticas del escritor
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0
+        }
+
+    def enqueue(self, table: str, row: Tuple):
+        """Encolar una fila sin bloquear al llamador"""
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                # Cola llena: se descarta la muestra más antigua y se contabiliza
+                self.queue.popleft()
+                self.stats['dropped'] += 1
+            if not self.queue:
+                self.oldest_pending = time.monotonic()
+            self.queue.append((table, row))
+            self.stats['enqueued'] += 1
+            if len(self.queue) >= self.batch_size:
+                self.condition.notify()
+
+    def enqueue_system(self, metrics: SystemMetrics):
+        """Encolar métricas del sistema"""
+        self.enqueue('system_metrics', (
+            metrics.timestamp, metrics.cpu_percent, metrics.memory_percent,
+            metrics.disk_usage, json.dumps(metrics.network_io),
+            metrics.process_count, metrics.uptime
+        ))
+
+    def enqueue_development(self, metrics: DevelopmentMetrics):
+        """Encolar métricas de desarrollo"""
+        self.enqueue('development_metrics', (
+            metrics.timestamp, metrics.files_changed, metrics.lines_added,
+            metrics.lines_removed, metrics.commits_today, metrics.build_time,
+            json.dumps(metrics.test_results), metrics.code_coverage
+        ))
+
+    def enqueue_performance(self, metrics: PerformanceMetrics):
+        """Encolar métricas de rendimiento"""
+        self.enqueue('performance_metrics', (
+            metrics.timestamp, metrics.response_time, metrics.throughput,
+            metrics.error_rate, metrics.availability
+        ))
+
+    def enqueue_alert(self, alert: Alert):
+        """Encolar alerta nueva o modificada"""
+        self.enqueue('alerts', (
+            alert.id, alert.level.value, alert.title, alert.message,
+            alert.source, alert.timestamp, alert.resolved, alert.resolution_time
+        ))
+
+    INSERT_SQL = {
+        'system_metrics': '''
+            INSERT INTO system_metrics
+            (timestamp, cpu_percent, memory_percent, disk_usage, network_io, process_count, uptime)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''',
+        'development_metrics': '''
+            INSERT INTO development_metrics
+            (timestamp, files_changed, lines_added, lines_removed, commits_today, build_time, test_results, code_coverage)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        'performance_metrics': '''
+            INSERT INTO performance_metrics
+            (timestamp, response_time, throughput, error_rate, availability)
+            VALUES (?, ?, ?, ?, ?)
+        ''',
+        'alerts': '''
+            INSERT OR REPLACE INTO alerts
+            (id, level, title, message, source, timestamp, resolved, resolution_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+    }
+
+    INSERT_COLUMNS = {
+        'system_metrics': ['timestamp', 'cpu_percent', 'memory_percent', 'disk_usage',
+                           'network_io', 'process_count', 'uptime'],
+        'performance_metrics': ['timestamp', 'response_time', 'throughput', 'error_rate',
+                                'availability']
+    }
+
+    def flush(self) -> int:
+        """Escribir en una sola transacción todo lo pendiente"""
+        with self.condition:
+            if not self.queue:
+                return 0
+            pending = list(self.queue)
+            self.queue.clear()
+            self.oldest_pending = None
+
+        # Agrupar por tabla para usar executemany
+        batches = defaultdict(list)
+        for table, row in pending:
+            batches[table].append(row)
+
+        start_time = time.perf_counter()
+        with self.db_lock:
+            try:
+                with self.connection:
+                    for table, rows in batches.items():
+                        self.connection.executemany(self.INSERT_SQL[table], rows)
+                        if table in ROLLUP_FIELDS:
+                            self.update_rollups(table, rows)
+            except Exception as e:
+                print(f"Error flushing metrics: {e}")
+                # Devolver las filas a la cola para el siguiente intento, sin pasar de max_queue:
+                # igual que en enqueue, se descartan las más antiguas y se contabilizan
+                with self.condition:
+                    overflow = len(pending) + len(self.queue) - self.max_queue
+                    if overflow > 0:
+                        pending = pending[overflow:]
+                        self.stats['dropped'] += overflow
+                    self.queue.extendleft(reversed(pending))
+                    self.oldest_pending = time.monotonic()
+                return 0
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.stats['written'] += len(pending)
+        self.stats['flushes'] += 1
+        self.stats['last_flush_ms'] = elapsed_ms
+        self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], elapsed_ms)
+        return len(pending)
+
+    def update_rollups(self, table: str, rows: List[Tuple]):
+        """Actualizar incrementalmente los agregados con las filas recién escritas"""
+        fields = ROLLUP_FIELDS[table]
+        # Posición de cada campo en la tupla de INSERT (el timestamp es la primera)
+        insert_columns = self.INSERT_COLUMNS[table]
+        positions = [insert_columns.index(field) for field in fields]
+
+        for suffix, resolution in ROLLUP_RESOLUTIONS.items():
+            # Agregar primero en memoria para hacer un solo UPSERT por bucket
+            buckets = {}
+            for row in rows:
+                epoch = datetime.fromisoformat(row[0]).timestamp()
+                bucket = int(epoch // resolution * resolution)
+                values = [float(row[pos] or 0) for pos in positions]
+                current = buckets.get(bucket)
+                if current is None:
+                    buckets[bucket] = [1] + [v for value in values for v in (value, value, value)]
+                else:
+                    current[0] += 1
+                    for i, value in enumerate(values):
+                        current[1 + i * 3] += value
+                        current[2 + i * 3] = min(current[2 + i * 3], value)
+                        current[3 + i * 3] = max(current[3 + i * 3], value)
+
+            self.connection.executemany(
+                self.rollup_upsert_sql(table, suffix),
+                [(bucket, *aggregates) for bucket, aggregates in buckets.items()]
+            )
+
+    def rollup_upsert_sql(self, table: str, suffix: str) -> str:
+        """Sentencia UPSERT para una tabla de agregados"""
+        fields = ROLLUP_FIELDS[table]
+        columns = ['bucket', 'samples'] + [
+            f'{field}_{kind}' for field in fields for kind in ('sum', 'min', 'max')
+        ]
+        updates = ['samples = samples + excluded.samples']
+        for field in fields:
+            updates.append(f'{field}_sum = {field}_sum + excluded.{field}_sum')
+            updates.append(f'{field}_min = MIN({field}_min, excluded.{field}_min)')
+            updates.append(f'{field}_max = MAX({field}_max, excluded.{field}_max)')
+        return f'''
+            INSERT INTO {table}_{suffix} ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+            ON CONFLICT(bucket) DO UPDATE SET {', '.join(updates)}
+        '''
+
+    def apply_retention(self, retention_days: int, batch_size: int = 1000,
+                        vacuum_pages: int = 1000) -> Dict[str, int]:
+        """Borrar filas crudas expiradas por lotes acotados y liberar páginas"""
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        cutoff_iso = cutoff.isoformat()
+        deleted = defaultdict(int)
+
+        targets = [(table, 'timestamp', cutoff_iso) for table in
+                   ('system_metrics', 'development_metrics', 'performance_metrics')]
+        # Los agregados por minuto siguen la retención cruda; los de hora y día se conservan
+        targets += [(f'{table}_1m', 'bucket', cutoff.timestamp()) for table in ROLLUP_FIELDS]
+
+        for table, column, limit_value in targets:
+            key = 'rowid' if column == 'bucket' else 'id'
+            while True:
+                # Cada lote en su propia transacción para no retener el lock del escritor
+                with self.db_lock:
+                    with self.connection:
+                        cursor = self.connection.execute(f'''
+                            DELETE FROM {table} WHERE {key} IN (
+                                SELECT {key} FROM {table} WHERE {column} < ?
+                                ORDER BY {column} LIMIT ?
+                            )
+                        ''', (limit_value, batch_size))
+                deleted[table] += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+
+        with self.db_lock:
+            self.connection.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+        self.stats['retention_deleted'] = self.stats.get('retention_deleted', 0) + sum(deleted.values())
+        return dict(deleted)
+
+    def writer_loop(self):
+        """Bucle del hilo escritor: vacía por tamaño o por antigüedad"""
+        while self.is_running:
+            with self.condition:
+                if self.oldest_pending is None:
+                    timeout = self.max_age
+                else:
+                    timeout = max(0.0, self.max_age - (time.monotonic() - self.oldest_pending))
+                if len(self.queue) < self.batch_size and timeout > 0:
+                    self.condition.wait(timeout)
+                due = self.queue and (
+                    len(self.queue) >= self.batch_size or
+                    time.monotonic() - self.oldest_pending >= self.max_age
+                )
+            if due:
+                self.flush()
+
+    def start(self):
+        """Iniciar hilo escritor"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def stop(self):
+        """Detener hilo escritor y vaciar la cola"""
+        self.is_running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.writer_thread:
+            self.writer_thread.join(timeout=5)
+        self.flush()
+
+    def close(self):
+        """Cerrar la conexión"""
+        self.stop()
+        with self.db_lock:
+            self.connection.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener estadísticas del escritor"""
+        with self.condition:
+            pending = len(self.queue)
+        return {**self.stats, 'pending': pending}
+
+class MetricRingBuffer:
+    """Serie temporal columnar en buffer circular con marcas de tiempo epoch"""
+
+    MIN_CHUNK = 256
+
+    def __init__(self, fields: List[str], capacity: int):
+        self.fields = list(fields)
+        self.capacity = max(1, int(capacity))
+        # Las columnas crecen por duplicación hasta capacity; solo rotan cuando están llenas
+        self.size = 0  # longitud física actual de cada columna
+        self.timestamps = array('d')
+        self.columns = {field: array('d') for field in self.fields}
+        self.head = 0  # índice físico de la muestra más antigua
+        self.count = 0
+        self.total_appended = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: float, values: Dict[str, float]):
+        """Añadir una muestra; si el buffer está lleno sobrescribe la más antigua"""
+        with self.lock:
+            if self.count == self.size and self.size < self.capacity:
+                self._grow()
+            index = (self.head + self.count) % self.size
+            self.timestamps[index] = timestamp
+            for field in self.fields:
+                self.columns[field][index] = float(values.get(field, 0) or 0)
+            if self.count < self.size:
+                self.count += 1
+            else:
+                self.head = (self.head + 1) % self.size
+            self.total_appended += 1
+
+    def _grow(self):
+        """Duplicar las columnas (sin pasar de capacity) dejando la muestra más antigua en 0"""
+        new_size = min(self.capacity, max(self.MIN_CHUNK, self.size * 2))
+        padding = array('d', bytes(8 * (new_size - self.size)))
+        for column in [self.timestamps] + list(self.columns.values()):
+            rotated = column[self.head:] + column[:self.head]
+            column[:] = rotated + padding
+        self.head = 0
+        self.size = new_size
+
+    def _find_first(self, timestamp: float) -> int:
+        """Primera posición lógica con marca >= timestamp (búsqueda binaria)"""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.timestamps[(self.head + mid) % self.size] < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def evict_before(self, cutoff: float) -> int:
+        """Descartar muestras anteriores a cutoff en O(log n)"""
+        with self.lock:
+            evicted = self._find_first(cutoff)
+            if self.size:
+                self.head = (self.head + evicted) % self.size
+            self.count -= evicted
+            return evicted
+
+    def _slice(self, column: array, start: int, end: int):
+        """Copiar el rango lógico [start, end) de una columna"""
+        length = end - start
+        if not length:
+            chunk = array('d')
+        else:
+            first = (self.head + start) % self.size
+            if first + length <= self.size:
+                chunk = column[first:first + length]
+            else:
+                chunk = column[first:] + column[:first + length - self.size]
+        if NUMPY_AVAILABLE:
+            return np.frombuffer(chunk, dtype=np.float64)
+        return chunk
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """Última muestra como diccionario"""
+        with self.lock:
+            if not self.count:
+                return None
+            index = (self.head + self.count - 1) % self.size
+            sample = {field: self.columns[field][index] for field in self.fields}
+            sample['timestamp'] = self.timestamps[index]
+            return sample
+
+    def tail(self, n: int, fields: Optional[List[str]] = None) -> Dict[str, List[float]]:
+        """Últimas n muestras por columna (para gráficas)"""
+        fields = fields or self.fields
+        with self.lock:
+            start = max(0, self.count - n)
+            result = {'timestamp': list(self._slice(self.timestamps, start, self.count))}
+            for field in fields:
+                result[field] = list(self._slice(self.columns[field], start, self.count))
+        return result
+
+    def window(self, field: str, seconds: float, now: Optional[float] = None):
+        """Valores de un campo en los últimos `seconds` segundos"""
+        now = now if now is not None else time.time()
+        with self.lock:
+            start = self._find_first(now - seconds)
+            return self._slice(self.columns[field], start, self.count)
+
+    def window_stats(self, seconds: float, fields: Optional[List[str]] = None,
+                     now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """min/max/mean/p95 de cada campo en la ventana indicada"""
+        now = now if now is not None else time.time()
+        stats = {}
+        for field in fields or self.fields:
+            values = self.window(field, seconds, now)
+            count = len(values)
+            if not count:
+                stats[field] = {'count': 0, 'min': 0.0, 'max': 0.0, 'mean': 0.0, 'p95': 0.0}
+                continue
+            if NUMPY_AVAILABLE:
+                stats[field] = {
+                    'count': count,
+                    'min': float(values.min()),
+                    'max': float(values.max()),
+                    'mean': float(values.mean()),
+                    'p95': float(np.percentile(values, 95))
+                }
+            else:
+                ordered = sorted(values)
+                stats[field] = {
+                    'count': count,
+                    'min': ordered[0],
+                    'max': ordered[-1],
+                    'mean': sum(ordered) / count,
+                    'p95': ordered[min(count - 1, int(round(0.95 * (count - 1))))]
+                }
+        return stats
+
+@dataclass
+class CollectorJob:
+    """Recolector registrado en el planificador"""
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    callback: Optional[Callable[[Any], None]] = None
+    running: bool = False
+    runs: int = 0
+    errors: int = 0
+    overruns: int = 0
+    last_duration_ms: float = 0.0
+    max_duration_ms: float = 0.0
+    total_duration_ms: float = 0.0
+    last_run: Optional[str] = None
+
+class CollectorScheduler:
+    """Planificador de recolectores con intervalos independientes sobre un pool de hilos"""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.jobs: Dict[str, CollectorJob] = {}
+        self.schedule = []  # heap de (próxima ejecución, nombre)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.executor = None
+        self.scheduler_thread = None
+
+    def register(self, name: str, func: Callable[[], Any], interval: float,
+                 callback: Optional[Callable[[Any], None]] = None, run_immediately: bool = True):
+        """Registrar un recolector con su propio intervalo"""
+        job = CollectorJob(name=name, func=func, interval=interval, callback=callback)
+        first_run = time.monotonic() + (0 if run_immediately else interval)
+        with self.lock:
+            self.jobs[name] = job
+            heapq.heappush(self.schedule, (first_run, name))
+
+    def start(self):
+        """Iniciar planificador"""
+        if self.scheduler_thread and self.scheduler_thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix='collector')
+        self.scheduler_thread = threading.Thread(target=self.scheduler_loop, daemon=True)
+        self.scheduler_thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Detener planificador y esperar a los recolectores en curso"""
+        self.stop_event.set()
+        if self.scheduler_thread:
+            self.scheduler_thread.join(timeout=timeout)
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def scheduler_loop(self):
+        """Despachar cada recolector cuando vence su intervalo"""
+        while not self.stop_event.is_set():
+            with self.lock:
+                if not self.schedule:
+                    wait_time = 1.0
+                else:
+                    wait_time = self.schedule[0][0] - time.monotonic()
+            if wait_time > 0:
+                self.stop_event.wait(min(wait_time, 1.0))
+                continue
+
+            with self.lock:
+                due_time, name = heapq.heappop(self.schedule)
+                job = self.jobs[name]
+                now = time.monotonic()
+
+                # Programación a ritmo fijo; si nos quedamos atrás no se acumulan ejecuciones
+                next_run = due_time + job.interval
+                if next_run <= now:
+                    next_run = now + job.interval
+                heapq.heappush(self.schedule, (next_run, name))
+
+                if job.running:
+                    # La ejecución anterior sigue en curso: se salta este turno
+                    job.overruns += 1
+                    continue
+                job.running = True
+
+            try:
+                self.executor.submit(self.run_job, job)
+            except RuntimeError:
+                # Executor cerrado durante la parada
+                job.running = False
+                break
+
+    def run_job(self, job: CollectorJob):
+        """Ejecutar un recolector y registrar su tiempo"""
+        start_time = time.perf_counter()
+        try:
+            result = job.func()
+            if job.callback:
+                job.callback(result)
+        except Exception as e:
+            job.errors += 1
+            print(f"Error in collector {job.name}: {e}")
+        finally:
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            with self.lock:
+                job.running = False
+                job.runs += 1
+                job.last_duration_ms = elapsed_ms
+                job.max_duration_ms = max(job.max_duration_ms, elapsed_ms)
+                job.total_duration_ms += elapsed_ms
+                job.last_run = datetime.now().isoformat()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estadísticas de tiempo y desbordes por recolector"""
+        with self.lock:
+            return {
+                name: {
+                    'interval': job.interval,
+                    'runs': job.runs,
+                    'errors': job.errors,
+                    'overruns': job.overruns,
+                    'running': job.running,
+                    'last_duration_ms': job.last_duration_ms,
+                    'max_duration_ms': job.max_duration_ms,
+                    'avg_duration_ms': job.total_duration_ms / job.runs if job.runs else 0.0,
+                    'last_run': job.last_run
+                }
+                for name, job in self.jobs.items()
+            }
+
+class DashboardRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Servidor estático del dashboard sin caché y sin log por petición
+
+    Solo sirve los archivos de allowed_files (dashboard y snapshot); el resto responde 404.
+    """
+
+    def __init__(self, *args, allowed_files=(), **kwargs):
+        self.allowed_files = frozenset(allowed_files)
+        super().__init__(*args, **kwargs)
+
+    def send_head(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip('/')
+        if path not in self.allowed_files:
+            self.send_error(404, "File not found")
+            return None
+        return super().send_head()
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+# Plantilla estática del dashboard: se escribe una vez y consulta el snapshot JSON
+DASHBOARD_TEMPLATE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>RAULI Professional Monitoring Dashboard</title>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }
+        .dashboard {
+            max-width: 1400px;
+            margin: 0 auto;
+        }
+        .header {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 20px;
+            border-radius: 10px;
+            margin-bottom: 20px;
+            text-align: center;
+        }
+        .metrics-grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+            gap: 20px;
+            margin-bottom: 20px;
+        }
+        .metric-card {
+            background: white;
+            padding: 20px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        .metric-title {
+            font-size: 18px;
+            font-weight: bold;
+            margin-bottom: 10px;
+            color: #333;
+        }
+        .metric-value {
+            font-size: 24px;
+            font-weight: bold;
+            color: #667eea;
+        }
+        .chart-container {
+            background: white;
+            padding: 20px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            margin-bottom: 20px;
+        }
+        .alert {
+            padding: 10px;
+            border-radius: 5px;
+            margin: 5px 0;
+        }
+        .alert-critical { background-color: #ffebee; border-left: 4px solid #f44336; }
+        .alert-warning { background-color: #fff3e0; border-left: 4px solid #ff9800; }
+        .alert-info { background-color: #e3f2fd; border-left: 4px solid #2196f3; }
+        .status-indicator {
+            display: inline-block;
+            width: 12px;
+            height: 12px;
+            border-radius: 50%;
+            margin-right: 8px;
+        }
+        .status-good { background-color: #4caf50; }
+        .status-warning { background-color: #ff9800; }
+        .status-critical { background-color: #f44336; }
+    </style>
+</head>
+<body>
+    <div class="dashboard">
+        <div class="header">
+            <h1>🔍 RAULI Professional Monitoring Dashboard</h1>
+            <p>Nivel: __MONITOR_LEVEL__ | Última actualización: <span id="updatedAt">-</span></p>
+        </div>
+        
+        <div class="metrics-grid">
+            <div class="metric-card">
+                <div class="metric-title">💻 CPU Usage</div>
+                <div class="metric-value" id="cpuValue">-</div>
+                <div class="status-indicator" id="cpuStatus"></div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">🧠 Memory Usage</div>
+                <div class="metric-value" id="memoryValue">-</div>
+                <div class="status-indicator" id="memoryStatus"></div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">💾 Disk Usage</div>
+                <div class="metric-value" id="diskValue">-</div>
+                <div class="status-indicator" id="diskStatus"></div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">📁 Files Changed</div>
+                <div class="metric-value" id="filesChanged">-</div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">📝 Lines Added</div>
+                <div class="metric-value" id="linesAdded">-</div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">🗑️ Lines Removed</div>
+                <div class="metric-value" id="linesRemoved">-</div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">🔄 Commits Today</div>
+                <div class="metric-value" id="commitsToday">-</div>
+            </div>
+            
+            <div class="metric-card">
+                <div class="metric-title">⚡ Response Time</div>
+                <div class="metric-value" id="responseTime">-</div>
+            </div>
+        </div>
+        
+        <div class="chart-container">
+            <h3>📊 System Metrics History</h3>
+            <canvas id="systemChart" width="400" height="200"></canvas>
+        </div>
+        
+        <div class="chart-container">
+            <h3>🕒 System Trend (24h)</h3>
+            <canvas id="trendChart" width="400" height="200"></canvas>
+        </div>
+        
+        <div class="chart-container">
+            <h3>📈 Development Activity</h3>
+            <canvas id="developmentChart" width="400" height="200"></canvas>
+        </div>
+        
+        <div class="chart-container">
+            <h3>⚡ Performance Metrics</h3>
+            <canvas id="performanceChart" width="400" height="200"></canvas>
+        </div>
+        
+        <div class="chart-container">
+            <h3>🚨 Recent Alerts</h3>
+            <div id="alertsContainer"><p>No alerts</p></div>
+        </div>
+    </div>
+    
+    <script>
+        const SNAPSHOT_URL = '__SNAPSHOT_FILE__';
+        const POLL_INTERVAL = __POLL_INTERVAL__;
+        
+        function makeChart(id, type, datasets, options) {
+            return new Chart(document.getElementById(id).getContext('2d'), {
+                type: type,
+                data: { labels: [], datasets: datasets },
+                options: Object.assign({ responsive: true, animation: false }, options)
+            });
+        }
+        
+        const systemChart = makeChart('systemChart', 'line', [
+            { label: 'CPU %', data: [], borderColor: 'rgb(255, 99, 132)', tension: 0.1 },
+            { label: 'Memory %', data: [], borderColor: 'rgb(54, 162, 235)', tension: 0.1 }
+        ], { scales: { y: { beginAtZero: true, max: 100 } } });
+        
+        const trendChart = makeChart('trendChart', 'line', [
+            { label: 'CPU % (avg)', data: [], borderColor: 'rgb(255, 99, 132)', tension: 0.1 },
+            { label: 'Memory % (avg)', data: [], borderColor: 'rgb(54, 162, 235)', tension: 0.1 }
+        ], { scales: { y: { beginAtZero: true, max: 100 } } });
+        
+        const devChart = makeChart('developmentChart', 'bar', [
+            { label: 'Files Changed', data: [], backgroundColor: 'rgba(75, 192, 192, 0.6)' }
+        ], { scales: { y: { beginAtZero: true } } });
+        
+        const perfChart = makeChart('performanceChart', 'line', [
+            { label: 'Response Time (ms)', data: [], borderColor: 'rgb(255, 205, 86)', tension: 0.1 }
+        ], { scales: { y: { beginAtZero: true } } });
+        
+        // Estado del cliente: solo se aplica lo posterior a lo ya dibujado
+        const lastPoint = { system: 0, development: 0, performance: 0 };
+        let lastSeq = -1;
+        let lastAlertsVersion = -1;
+        
+        function label(ts) {
+            return new Date(ts * 1000).toTimeString().slice(0, 8);
+        }
+        
+        function appendPoints(chart, key, series, limit) {
+            if (!series) return;
+            let changed = false;
+            series.t.forEach((ts, i) => {
+                if (ts <= lastPoint[key]) return;
+                chart.data.labels.push(label(ts));
+                chart.data.datasets.forEach((dataset, d) => dataset.data.push(series.v[d][i]));
+                lastPoint[key] = ts;
+                changed = true;
+            });
+            if (!changed) return;
+            while (chart.data.labels.length > limit) {
+                chart.data.labels.shift();
+                chart.data.datasets.forEach(dataset => dataset.data.shift());
+            }
+            chart.update('none');
+        }
+        
+        function replacePoints(chart, series) {
+            if (!series) return;
+            chart.data.labels = series.t.map(ts => new Date(ts * 1000).toLocaleString().slice(0, -3));
+            chart.data.datasets.forEach((dataset, d) => { dataset.data = series.v[d]; });
+            chart.update('none');
+        }
+        
+        function setStatus(id, value, warning, critical) {
+            const status = value < warning ? 'status-good' : value < critical ? 'status-warning' : 'status-critical';
+            document.getElementById(id).className = 'status-indicator ' + status;
+        }
+        
+        function renderAlerts(alerts) {
+            const container = document.getElementById('alertsContainer');
+            container.replaceChildren();
+            if (!alerts.length) {
+                container.innerHTML = '<p>No alerts</p>';
+                return;
+            }
+            alerts.forEach(alert => {
+                const div = document.createElement('div');
+                div.className = 'alert alert-' + alert.level;
+                const title = document.createElement('strong');
+                title.textContent = alert.title;
+                const small = document.createElement('small');
+                small.textContent = alert.timestamp;
+                div.append(title, document.createElement('br'), alert.message,
+                           document.createElement('br'), small);
+                container.appendChild(div);
+            });
+        }
+        
+        function apply(snapshot) {
+            document.getElementById('updatedAt').textContent = snapshot.updated;
+            const s = snapshot.latest.system;
+            if (s) {
+                document.getElementById('cpuValue').textContent = s.cpu.toFixed(1) + '%';
+                document.getElementById('memoryValue').textContent = s.memory.toFixed(1) + '%';
+                document.getElementById('diskValue').textContent = s.disk.toFixed(1) + '%';
+                setStatus('cpuStatus', s.cpu, 70, 90);
+                setStatus('memoryStatus', s.memory, 80, 95);
+                setStatus('diskStatus', s.disk, 85, 95);
+            }
+            const d = snapshot.latest.development;
+            if (d) {
+                document.getElementById('filesChanged').textContent = d.files_changed;
+                document.getElementById('linesAdded').textContent = '+' + d.lines_added;
+                document.getElementById('linesRemoved').textContent = '-' + d.lines_removed;
+                document.getElementById('commitsToday').textContent = d.commits_today;
+            }
+            const p = snapshot.latest.performance;
+            if (p) {
+                document.getElementById('responseTime').textContent = p.response_time.toFixed(0) + 'ms';
+            }
+            appendPoints(systemChart, 'system', snapshot.series.system, 20);
+            appendPoints(devChart, 'development', snapshot.series.development, 10);
+            replacePoints(trendChart, snapshot.series.trend);
+            appendPoints(perfChart, 'performance', snapshot.series.performance, 20);
+            if (snapshot.alerts_version !== lastAlertsVersion) {
+                renderAlerts(snapshot.alerts);
+                lastAlertsVersion = snapshot.alerts_version;
+            }
+        }
+        
+        async function poll() {
+            try {
+                const response = await fetch(SNAPSHOT_URL + '?t=' + Date.now(), { cache: 'no-store' });
+                if (response.ok) {
+                    const snapshot = await response.json();
+                    if (snapshot.seq !== lastSeq) {
+                        apply(snapshot);
+                        lastSeq = snapshot.seq;
+                    }
+                }
+            } catch (e) {
+                console.warn('Snapshot not available', e);
+            }
+            setTimeout(poll, POLL_INTERVAL);
+        }
+        
+        poll();
+    </script>
+</body>
+</html>
+"""
+
 class ProfessionalMonitoringSystem:
     def __init__(self, monitor_level: MonitorLevel = MonitorLevel.STANDARD):
         self.base_dir = Path(r'C:\RAULI_CORE')
@@ -88,22 +992,37 @@ class ProfessionalMonitoringSystem:
         self.config_file = self.base_dir / 'monitoring_config.json'
         self.dashboard_file = self.base_dir / 'monitoring_dashboard.html'
         self.alerts_file = self.base_dir / 'alerts_log.json'
+        self.snapshot_file = self.base_dir / 'monitoring_snapshot.json'
+        self.dashboard_hash = None
+        self.snapshot_seq = None
+        self.trend_cache = (0.0, None)  # (consultado en, series)
+        self.dashboard_server = None
         
         # Configuración según nivel
         self.config = self.get_monitoring_config(monitor_level)
         
         # Base de datos
         self.init_database()
+        self.writer = MetricsWriter(self.db_path)
+        self.read_connection = None
+        self.read_lock = threading.Lock()
         
         # Estado del sistema
         self.is_running = False
         self.monitoring_thread = None
+        self.scheduler = None
         self.alerts = []
+        self.persisted_alerts = {}
+        
+        # Métricas históricas (buffers circulares columnar)
+        self.system_history = MetricRingBuffer(SYSTEM_FIELDS, self.history_capacity('system_check_interval'))
+        self.development_history = MetricRingBuffer(DEVELOPMENT_FIELDS, self.history_capacity('development_check_interval'))
+        self.performance_history = MetricRingBuffer(PERFORMANCE_FIELDS, self.history_capacity('performance_check_interval'))
         
-        # Métricas históricas
-        self.system_history = []
-        self.development_history = []
-        self.performance_history = []
+        # Últimas muestras completas (incluyen campos no numéricos)
+        self.latest_system = None
+        self.latest_development = None
+        self.latest_performance = None
         
     def get_monitoring_config(self, level: MonitorLevel) -> Dict[str, Any]:
         """Obtener configuración según nivel de monitoreo"""
@@ -181,11 +1100,24 @@ class ProfessionalMonitoringSystem:
         
         return configs[level]
     
+    def history_capacity(self, interval_key: str) -> int:
+        """Muestras necesarias para cubrir la retención con el intervalo dado"""
+        retention_seconds = self.config['retention_days'] * 86400
+        return min(retention_seconds // self.config[interval_key] + 1, MAX_HISTORY_POINTS)
+    
     def init_database(self):
         """Inicializar base de datos SQLite"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Vacuum incremental: debe fijarse antes de crear tablas (o seguido de VACUUM)
+        if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            cursor.execute('VACUUM')
+        
+        # WAL: los lectores no bloquean al escritor y se evitan fsync por commit
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Tabla de métricas del sistema
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS system_metrics (
@@ -241,14 +1173,32 @@ class ProfessionalMonitoringSystem:
             )
         ''')
         
+        # Índices por timestamp para consultas por rango y retención
+        for table in ('system_metrics', 'development_metrics', 'performance_metrics'):
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp)')
+        
+        # Tablas de agregados (1 minuto / 1 hora / 1 día)
+        for table, fields in ROLLUP_FIELDS.items():
+            aggregate_columns = ', '.join(
+                f'{field}_sum REAL, {field}_min REAL, {field}_max REAL' for field in fields
+            )
+            for suffix in ROLLUP_RESOLUTIONS:
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table}_{suffix} (
+                        bucket INTEGER PRIMARY KEY,
+                        samples INTEGER NOT NULL,
+                        {aggregate_columns}
+                    )
+                ''')
+        
         conn.commit()
         conn.close()
     
     def collect_system_metrics(self) -> SystemMetrics:
         """Recoger métricas del sistema"""
         try:
-            # CPU
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU: lectura por diferencia desde la muestra anterior, sin bloquear
+            cpu_percent = psutil.cpu_percent(interval=None)
             
             # Memoria
             memory = psutil.virtual_memory()
@@ -527,319 +1477,89 @@ class ProfessionalMonitoringSystem:
     
     def save_metrics(self):
         """Guardar métricas en base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Guardar métricas del sistema
-        if self.system_history:
-            latest = self.system_history[-1]
-            cursor.execute('''
-                INSERT INTO system_metrics 
-                (timestamp, cpu_percent, memory_percent, disk_usage, network_io, process_count, uptime)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                latest.timestamp, latest.cpu_percent, latest.memory_percent,
-                latest.disk_usage, json.dumps(latest.network_io),
-                latest.process_count, latest.uptime
-            ))
-        
-        # Guardar métricas de desarrollo
-        if self.development_history:
-            latest = self.development_history[-1]
-            cursor.execute('''
-                INSERT INTO development_metrics 
-                (timestamp, files_changed, lines_added, lines_removed, commits_today, build_time, test_results, code_coverage)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                latest.timestamp, latest.files_changed, latest.lines_added,
-                latest.lines_removed, latest.commits_today, latest.build_time,
-                json.dumps(latest.test_results), latest.code_coverage
-            ))
-        
-        # Guardar métricas de rendimiento
-        if self.performance_history:
-            latest = self.performance_history[-1]
-            cursor.execute('''
-                INSERT INTO performance_metrics 
-                (timestamp, response_time, throughput, error_rate, availability)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                latest.timestamp, latest.response_time, latest.throughput,
-                latest.error_rate, latest.availability
-            ))
-        
-        # Guardar alertas
+        # Las muestras se encolan al recogerse; aquí solo se encolan
+        # las alertas nuevas o modificadas desde la última escritura
         for alert in self.alerts:
-            cursor.execute('''
-                INSERT OR REPLACE INTO alerts 
-                (id, level, title, message, source, timestamp, resolved, resolution_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                alert.id, alert.level.value, alert.title, alert.message,
-                alert.source, alert.timestamp, alert.resolved, alert.resolution_time
-            ))
-        
-        conn.commit()
-        conn.close()
+            state = (alert.resolved, alert.resolution_time)
+            if self.persisted_alerts.get(alert.id) != state:
+                self.writer.enqueue_alert(alert)
+                self.persisted_alerts[alert.id] = state
     
     def generate_dashboard(self) -> str:
         """Generar dashboard HTML"""
-        html_content = f"""
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>RAULI Professional Monitoring Dashboard</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            margin: 0;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }}
-        .dashboard {{
-            max-width: 1400px;
-            margin: 0 auto;
-        }}
-        .header {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 20px;
-            border-radius: 10px;
-            margin-bottom: 20px;
-            text-align: center;
-        }}
-        .metrics-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            margin-bottom: 20px;
-        }}
-        .metric-card {{
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        .metric-title {{
-            font-size: 18px;
-            font-weight: bold;
-            margin-bottom: 10px;
-            color: #333;
-        }}
-        .metric-value {{
-            font-size: 24px;
-            font-weight: bold;
-            color: #667eea;
-        }}
-        .chart-container {{
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            margin-bottom: 20px;
-        }}
-        .alert {{
-            padding: 10px;
-            border-radius: 5px;
-            margin: 5px 0;
-        }}
-        .alert-critical {{ background-color: #ffebee; border-left: 4px solid #f44336; }}
-        .alert-warning {{ background-color: #fff3e0; border-left: 4px solid #ff9800; }}
-        .alert-info {{ background-color: #e3f2fd; border-left: 4px solid #2196f3; }}
-        .status-indicator {{
-            display: inline-block;
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            margin-right: 8px;
-        }}
-        .status-good {{ background-color: #4caf50; }}
-        .status-warning {{ background-color: #ff9800; }}
-        .status-critical {{ background-color: #f44336; }}
-    </style>
-</head>
-<body>
-    <div class="dashboard">
-        <div class="header">
-            <h1>🔍 RAULI Professional Monitoring Dashboard</h1>
-            <p>Nivel: {self.monitor_level.value.upper()} | Última actualización: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        </div>
-        
-        <div class="metrics-grid">
-            <div class="metric-card">
-                <div class="metric-title">💻 CPU Usage</div>
-                <div class="metric-value">{self.system_history[-1].cpu_percent:.1f}%</div>
-                <div class="status-indicator {'status-good' if self.system_history[-1].cpu_percent < 70 else 'status-warning' if self.system_history[-1].cpu_percent < 90 else 'status-critical'}"></div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">🧠 Memory Usage</div>
-                <div class="metric-value">{self.system_history[-1].memory_percent:.1f}%</div>
-                <div class="status-indicator {'status-good' if self.system_history[-1].memory_percent < 80 else 'status-warning' if self.system_history[-1].memory_percent < 95 else 'status-critical'}"></div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">💾 Disk Usage</div>
-                <div class="metric-value">{self.system_history[-1].disk_usage:.1f}%</div>
-                <div class="status-indicator {'status-good' if self.system_history[-1].disk_usage < 85 else 'status-warning' if self.system_history[-1].disk_usage < 95 else 'status-critical'}"></div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">📁 Files Changed</div>
-                <div class="metric-value">{self.development_history[-1].files_changed}</div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">📝 Lines Added</div>
-                <div class="metric-value">+{self.development_history[-1].lines_added}</div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">🗑️ Lines Removed</div>
-                <div class="metric-value">-{self.development_history[-1].lines_removed}</div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">🔄 Commits Today</div>
-                <div class="metric-value">{self.development_history[-1].commits_today}</div>
-            </div>
-            
-            <div class="metric-card">
-                <div class="metric-title">⚡ Response Time</div>
-                <div class="metric-value">{self.performance_history[-1].response_time:.0f}ms</div>
-            </div>
-        </div>
-        
-        <div class="chart-container">
-            <h3>📊 System Metrics History</h3>
-            <canvas id="systemChart" width="400" height="200"></canvas>
-        </div>
-        
-        <div class="chart-container">
-            <h3>📈 Development Activity</h3>
-            <canvas id="developmentChart" width="400" height="200"></canvas>
-        </div>
+        # La página es estática: solo se escribe si no existe o cambió la plantilla
+        shell = (DASHBOARD_TEMPLATE
+                 .replace('__MONITOR_LEVEL__', self.monitor_level.value.upper())
+                 .replace('__SNAPSHOT_FILE__', self.snapshot_file.name)
+                 .replace('__POLL_INTERVAL__', str(self.config['system_check_interval'] * 1000)))
+        shell_hash = hashlib.sha256(shell.encode('utf-8')).hexdigest()
+        if shell_hash != self.dashboard_hash or not self.dashboard_file.exists():
+            self.write_atomic(self.dashboard_file, shell)
+            self.dashboard_hash = shell_hash
         
-        <div class="chart-container">
-            <h3>⚡ Performance Metrics</h3>
-            <canvas id="performanceChart" width="400" height="200"></canvas>
-        </div>
+        # Datos en vivo: snapshot JSON pequeño junto a la página
+        self.write_dashboard_snapshot()
         
-        <div class="chart-container">
-            <h3>🚨 Recent Alerts</h3>
-            <div id="alertsContainer">
-                {self.generate_alerts_html()}
-            </div>
-        </div>
-    </div>
+        return str(self.dashboard_file)
     
-    <script>
-        // System Metrics Chart
-        const systemCtx = document.getElementById('systemChart').getContext('2d');
-        new Chart(systemCtx, {{
-            type: 'line',
-            data: {{
-                labels: {json.dumps([m.timestamp.split('T')[1][:8] for m in self.system_history[-20:]])},
-                datasets: [{{
-                    label: 'CPU %',
-                    data: {json.dumps([m.cpu_percent for m in self.system_history[-20:]])},
-                    borderColor: 'rgb(255, 99, 132)',
-                    tension: 0.1
-                }}, {{
-                    label: 'Memory %',
-                    data: {json.dumps([m.memory_percent for m in self.system_history[-20:]])},
-                    borderColor: 'rgb(54, 162, 235)',
-                    tension: 0.1
-                }}]
-            }},
-            options: {{
-                responsive: true,
-                scales: {{
-                    y: {{
-                        beginAtZero: true,
-                        max: 100
-                    }}
-                }}
-            }}
-        }});
-        
-        // Development Chart
-        const devCtx = document.getElementById('developmentChart').getContext('2d');
-        new Chart(devCtx, {{
-            type: 'bar',
-            data: {{
-                labels: {json.dumps([m.timestamp.split('T')[1][:8] for m in self.development_history[-10:]])},
-                datasets: [{{
-                    label: 'Files Changed',
-                    data: {json.dumps([m.files_changed for m in self.development_history[-10:]])},
-                    backgroundColor: 'rgba(75, 192, 192, 0.6)'
-                }}]
-            }},
-            options: {{
-                responsive: true,
-                scales: {{
-                    y: {{
-                        beginAtZero: true
-                    }}
-                }}
-            }}
-        }});
-        
-        // Performance Chart
-        const perfCtx = document.getElementById('performanceChart').getContext('2d');
-        new Chart(perfCtx, {{
-            type: 'line',
-            data: {{
-                labels: {json.dumps([m.timestamp.split('T')[1][:8] for m in self.performance_history[-20:]])},
-                datasets: [{{
-                    label: 'Response Time (ms)',
-                    data: {json.dumps([m.response_time for m in self.performance_history[-20:]])},
-                    borderColor: 'rgb(255, 205, 86)',
-                    tension: 0.1
-                }}]
-            }},
-            options: {{
-                responsive: true,
-                scales: {{
-                    y: {{
-                        beginAtZero: true
-                    }}
-                }}
-            }}
-        }});
-        
-        // Auto-refresh
-        setTimeout(() => location.reload(), 30000);
-    </script>
-</body>
-</html>
-        """
+    def write_atomic(self, path: Path, content: str):
+        """Escribir un archivo de forma atómica (temporal + rename)"""
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    
+    def write_dashboard_snapshot(self) -> bool:
+        """Escribir el snapshot JSON del dashboard si hay datos nuevos"""
+        seq = (self.system_history.total_appended, self.development_history.total_appended,
+               self.performance_history.total_appended, len(self.alerts))
+        if seq == self.snapshot_seq:
+            return False
         
-        with open(self.dashboard_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        system_tail = self.system_history.tail(20, ['cpu_percent', 'memory_percent'])
+        dev_tail = self.development_history.tail(10, ['files_changed'])
+        perf_tail = self.performance_history.tail(20, ['response_time'])
         
-        return str(self.dashboard_file)
-    
-    def generate_alerts_html(self) -> str:
-        """Generar HTML para alertas"""
-        if not self.alerts:
-            return "<p>No alerts</p>"
-        
-        alerts_html = ""
-        for alert in self.alerts[-10:]:  # Últimas 10 alertas
-            alert_class = f"alert-{alert.level.value}"
-            alerts_html += f"""
-            <div class="alert {alert_class}">
-                <strong>{alert.title}</strong><br>
-                {alert.message}<br>
-                <small>{alert.timestamp}</small>
-            </div>
-            """
+        snapshot = {
+            'seq': sum(seq),
+            'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'latest': {
+                'system': {
+                    'cpu': self.latest_system.cpu_percent,
+                    'memory': self.latest_system.memory_percent,
+                    'disk': round(self.latest_system.disk_usage, 2)
+                } if self.latest_system else None,
+                'development': {
+                    'files_changed': self.latest_development.files_changed,
+                    'lines_added': self.latest_development.lines_added,
+                    'lines_removed': self.latest_development.lines_removed,
+                    'commits_today': self.latest_development.commits_today
+                } if self.latest_development else None,
+                'performance': {
+                    'response_time': self.latest_performance.response_time
+                } if self.latest_performance else None
+            },
+            # Series compactas: t = marcas epoch, v = una lista por dataset
+            'series': {
+                'system': {'t': [round(ts, 1) for ts in system_tail['timestamp']],
+                           'v': [system_tail['cpu_percent'], system_tail['memory_percent']]},
+                'development': {'t': [round(ts, 1) for ts in dev_tail['timestamp']],
+                                'v': [dev_tail['files_changed']]},
+                'performance': {'t': [round(ts, 1) for ts in perf_tail['timestamp']],
+                                'v': [perf_tail['response_time']]},
+                'trend': self.get_trend_series()
+            },
+            'alerts_version': len(self.alerts),
+            'alerts': [
+                {'level': alert.level.value, 'title': alert.title,
+                 'message': alert.message, 'timestamp': alert.timestamp}
+                for alert in self.alerts[-10:]
+            ]
+        }
         
-        return alerts_html
+        self.write_atomic(self.snapshot_file, json.dumps(snapshot, separators=(',', ':')))
+        self.snapshot_seq = seq
+        return True
     
     def start_monitoring(self):
         """Iniciar monitoreo"""
@@ -848,107 +1568,226 @@ class ProfessionalMonitoringSystem:
             return
         
         self.is_running = True
-        self.monitoring_thread = threading.Thread(target=self.monitoring_loop)
-        self.monitoring_thread.daemon = True
-        self.monitoring_thread.start()
+        self.writer.start()
+        
+        # Primera lectura de CPU: fija la referencia para las lecturas por diferencia
+        psutil.cpu_percent(interval=None)
+        
+        # Cada recolector corre con su propio intervalo en el pool
+        self.scheduler = CollectorScheduler()
+        self.scheduler.register('system', self.collect_system_metrics,
+                                self.config['system_check_interval'], self.on_system_metrics)
+        self.scheduler.register('development', self.collect_development_metrics,
+                                self.config['development_check_interval'], self.on_development_metrics)
+        self.scheduler.register('performance', self.collect_performance_metrics,
+                                self.config['performance_check_interval'], self.on_performance_metrics)
+        self.scheduler.register('maintenance', self.run_maintenance,
+                                self.config['system_check_interval'], run_immediately=False)
+        self.scheduler.register('db_retention', self.run_database_retention,
+                                DB_RETENTION_INTERVAL, run_immediately=False)
+        self.scheduler.start()
+        self.monitoring_thread = self.scheduler.scheduler_thread
         
         print(f"🔍 Professional monitoring started at {self.monitor_level.value} level")
     
-    def monitoring_loop(self):
-        """Bucle principal de monitoreo"""
-        system_counter = 0
-        dev_counter = 0
-        perf_counter = 0
+    def on_system_metrics(self, system_metrics: SystemMetrics):
+        """Registrar métricas del sistema recogidas"""
+        values = asdict(system_metrics)
+        values.update(system_metrics.network_io)
+        self.system_history.append(datetime.fromisoformat(system_metrics.timestamp).timestamp(), values)
+        self.latest_system = system_metrics
+        self.writer.enqueue_system(system_metrics)
         
-        while self.is_running:
-            try:
-                # System metrics
-                if system_counter >= self.config['system_check_interval']:
-                    system_metrics = self.collect_system_metrics()
-                    self.system_history.append(system_metrics)
-                    
-                    # Verificar umbrales
-                    new_alerts = self.check_thresholds(system_metrics)
-                    self.alerts.extend(new_alerts)
-                    
-                    system_counter = 0
-                
-                # Development metrics
-                if dev_counter >= self.config['development_check_interval']:
-                    dev_metrics = self.collect_development_metrics()
-                    self.development_history.append(dev_metrics)
-                    dev_counter = 0
-                
-                # Performance metrics
-                if perf_counter >= self.config['performance_check_interval']:
-                    perf_metrics = self.collect_performance_metrics()
-                    self.performance_history.append(perf_metrics)
-                    perf_counter = 0
-                
-                # Guardar métricas periódicamente
-                if len(self.system_history) % 10 == 0:
-                    self.save_metrics()
-                    self.generate_dashboard()
-                
-                # Limpiar historial según retención
-                self.cleanup_old_data()
-                
-                time.sleep(1)
-                system_counter += 1
-                dev_counter += 1
-                perf_counter += 1
-                
-            except Exception as e:
-                print(f"Error in monitoring loop: {e}")
-                time.sleep(5)
+        # Verificar umbrales
+        new_alerts = self.check_thresholds(system_metrics)
+        self.alerts.extend(new_alerts)
+    
+    def on_development_metrics(self, dev_metrics: DevelopmentMetrics):
+        """Registrar métricas de desarrollo recogidas"""
+        self.development_history.append(datetime.fromisoformat(dev_metrics.timestamp).timestamp(),
+                                        asdict(dev_metrics))
+        self.latest_development = dev_metrics
+        self.writer.enqueue_development(dev_metrics)
+    
+    def on_performance_metrics(self, perf_metrics: PerformanceMetrics):
+        """Registrar métricas de rendimiento recogidas"""
+        self.performance_history.append(datetime.fromisoformat(perf_metrics.timestamp).timestamp(),
+                                        asdict(perf_metrics))
+        self.latest_performance = perf_metrics
+        self.writer.enqueue_performance(perf_metrics)
+    
+    def run_maintenance(self):
+        """Guardar alertas, refrescar dashboard y aplicar retención"""
+        self.save_metrics()
+        self.generate_dashboard()
+        
+        # Limpiar historial según retención
+        self.cleanup_old_data()
+    
+    def run_database_retention(self) -> Dict[str, int]:
+        """Borrar filas expiradas de la base de datos y compactarla"""
+        return self.writer.apply_retention(self.config['retention_days'])
+    
+    def query_metrics(self, table: str, start: datetime, end: datetime,
+                      resolution: int = 60) -> List[Dict[str, Any]]:
+        """Consultar un rango usando el agregado más grueso que cumpla la resolución"""
+        if table not in ROLLUP_FIELDS:
+            raise ValueError(f"No rollups for table: {table}")
+        
+        fields = ROLLUP_FIELDS[table]
+        suitable = [(size, suffix) for suffix, size in ROLLUP_RESOLUTIONS.items() if size <= resolution]
+        
+        with self.read_lock:
+            if self.read_connection is None:
+                self.read_connection = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                self.read_connection.row_factory = sqlite3.Row
+            
+            if not suitable:
+                # Resolución más fina que un minuto: filas crudas
+                rows = self.read_connection.execute(f'''
+                    SELECT timestamp, {', '.join(fields)} FROM {table}
+                    WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp
+                ''', (start.isoformat(), end.isoformat())).fetchall()
+                return [dict(row) for row in rows]
+            
+            size, suffix = max(suitable)
+            rows = self.read_connection.execute(f'''
+                SELECT * FROM {table}_{suffix}
+                WHERE bucket >= ? AND bucket < ? ORDER BY bucket
+            ''', (int(start.timestamp() // size * size), end.timestamp())).fetchall()
+        
+        results = []
+        for row in rows:
+            point = {'timestamp': datetime.fromtimestamp(row['bucket']).isoformat(),
+                     'samples': row['samples'], 'resolution': suffix}
+            for field in fields:
+                point[field] = row[f'{field}_sum'] / row['samples']
+                point[f'{field}_min'] = row[f'{field}_min']
+                point[f'{field}_max'] = row[f'{field}_max']
+            results.append(point)
+        return results
+    
+    @staticmethod
+    def resolution_for_window(seconds: float) -> int:
+        """Resolución a consultar para una ventana: 0 = buffer en memoria, si no el agregado adecuado"""
+        if seconds <= RING_WINDOW_SECONDS:
+            return 0
+        if seconds <= 2 * 86400:
+            return ROLLUP_RESOLUTIONS['1m']
+        if seconds <= 60 * 86400:
+            return ROLLUP_RESOLUTIONS['1h']
+        return ROLLUP_RESOLUTIONS['1d']
+    
+    def window_stats(self, table: str, seconds: float, fields: List[str]) -> Dict[str, Dict[str, float]]:
+        """min/max/mean/p95 de una ventana; las largas salen de los agregados vía query_metrics"""
+        resolution = self.resolution_for_window(seconds)
+        if not resolution:
+            history = self.system_history if table == 'system_metrics' else self.performance_history
+            return history.window_stats(seconds, fields)
+        
+        end = datetime.now()
+        try:
+            points = self.query_metrics(table, end - timedelta(seconds=seconds), end, resolution)
+        except sqlite3.Error:
+            points = []
+        stats = {}
+        for field in fields:
+            samples = sum(point['samples'] for point in points)
+            if not samples:
+                stats[field] = {'count': 0, 'min': 0.0, 'max': 0.0, 'mean': 0.0, 'p95': 0.0}
+                continue
+            means = sorted(point[field] for point in points)
+            stats[field] = {
+                'count': samples,
+                'min': min(point[f'{field}_min'] for point in points),
+                'max': max(point[f'{field}_max'] for point in points),
+                'mean': sum(point[field] * point['samples'] for point in points) / samples,
+                # Los agregados no guardan percentiles: p95 de las medias por intervalo
+                'p95': means[min(len(means) - 1, int(round(0.95 * (len(means) - 1))))]
+            }
+        return stats
+    
+    def get_trend_series(self) -> Optional[Dict[str, List]]:
+        """CPU/memoria de las últimas 24 h desde los agregados horarios (cacheado)"""
+        queried_at, series = self.trend_cache
+        if series is not None and time.time() - queried_at < TREND_REFRESH_SECONDS:
+            return series
+        
+        end = datetime.now()
+        try:
+            points = self.query_metrics('system_metrics', end - timedelta(seconds=TREND_WINDOW_SECONDS),
+                                        end, TREND_RESOLUTION)
+        except sqlite3.Error:
+            return series
+        series = {
+            't': [datetime.fromisoformat(point['timestamp']).timestamp() for point in points],
+            'v': [[round(point['cpu_percent'], 1) for point in points],
+                  [round(point['memory_percent'], 1) for point in points]]
+        }
+        self.trend_cache = (time.time(), series)
+        return series
+    
+    def get_collector_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Obtener tiempos y desbordes de cada recolector"""
+        return self.scheduler.get_stats() if self.scheduler else {}
     
     def stop_monitoring(self):
         """Detener monitoreo"""
         self.is_running = False
-        if self.monitoring_thread:
-            self.monitoring_thread.join(timeout=5)
+        if self.scheduler:
+            self.scheduler.stop(timeout=5)
         
         # Guardar datos finales
         self.save_metrics()
+        self.writer.stop()
         self.generate_dashboard()
         
+        if self.dashboard_server:
+            self.dashboard_server.shutdown()
+            self.dashboard_server.server_close()
+            self.dashboard_server = None
+        
         print("🔍 Professional monitoring stopped")
     
     def cleanup_old_data(self):
         """Limpiar datos antiguos según política de retención"""
         retention_days = self.config['retention_days']
-        cutoff_date = datetime.now() - timedelta(days=retention_days)
+        cutoff = time.time() - retention_days * 86400
         
         # Limpiar historial en memoria
-        self.system_history = [
-            m for m in self.system_history 
-            if datetime.fromisoformat(m.timestamp) > cutoff_date
-        ]
-        
-        self.development_history = [
-            m for m in self.development_history 
-            if datetime.fromisoformat(m.timestamp) > cutoff_date
-        ]
-        
-        self.performance_history = [
-            m for m in self.performance_history 
-            if datetime.fromisoformat(m.timestamp) > cutoff_date
-        ]
+        self.system_history.evict_before(cutoff)
+        self.development_history.evict_before(cutoff)
+        self.performance_history.evict_before(cutoff)
+    
+    def start_dashboard_server(self, port: int = 0) -> int:
+        """Servir el dashboard por HTTP local (fetch no funciona sobre file://)"""
+        if self.dashboard_server is None:
+            handler = partial(
+                DashboardRequestHandler,
+                directory=str(self.base_dir),
+                allowed_files=(self.dashboard_file.name, self.snapshot_file.name)
+            )
+            self.dashboard_server = socketserver.ThreadingTCPServer(('127.0.0.1', port), handler)
+            self.dashboard_server.daemon_threads = True
+            threading.Thread(target=self.dashboard_server.serve_forever, daemon=True).start()
+        return self.dashboard_server.server_address[1]
     
     def open_dashboard(self):
         """Abrir dashboard en navegador"""
         dashboard_path = self.generate_dashboard()
-        webbrowser.open(f'file://{dashboard_path}')
+        port = self.start_dashboard_server()
+        webbrowser.open(f'http://127.0.0.1:{port}/{self.dashboard_file.name}')
         print(f"📊 Dashboard opened: {dashboard_path}")
     
-    def get_summary(self) -> Dict[str, Any]:
+    def get_summary(self, window_minutes: int = 15) -> Dict[str, Any]:
         """Obtener resumen del estado actual"""
-        if not self.system_history:
+        if not self.latest_system:
             return {"status": "No data available"}
         
-        latest_system = self.system_history[-1]
-        latest_dev = self.development_history[-1] if self.development_history else None
-        latest_perf = self.performance_history[-1] if self.performance_history else None
+        latest_system = self.latest_system
+        latest_dev = self.latest_development
+        latest_perf = self.latest_performance
+        window_seconds = window_minutes * 60
         
         return {
             "monitoring_level": self.monitor_level.value,
@@ -970,8 +1809,16 @@ class ProfessionalMonitoringSystem:
                 "error_rate": latest_perf.error_rate if latest_perf else 0,
                 "availability": latest_perf.availability if latest_perf else 0
             } if latest_perf else {},
+            "system_window": self.window_stats(
+                'system_metrics', window_seconds, ['cpu_percent', 'memory_percent', 'disk_usage']),
+            "performance_window": self.window_stats(
+                'performance_metrics', window_seconds, ['response_time', 'error_rate']),
+            "window_minutes": window_minutes,
+            "window_resolution_seconds": self.resolution_for_window(window_seconds),
             "active_alerts": len([a for a in self.alerts if not a.resolved]),
-            "total_metrics_collected": len(self.system_history) + len(self.development_history) + len(self.performance_history)
+            "total_metrics_collected": (self.system_history.total_appended +
+                                        self.development_history.total_appended +
+                                        self.performance_history.total_appended)
         }
 
 def main():
@@ -15,6 +15,7 @@ from typing import Dict, List, Optional
 import psutil
 import webbrowser
 from pathlib import Path
+from ollama_inventory import get_model_inventory
 
 class RAULIBootManager:
     def __init__(self):
@@ -105,10 +106,10 @@ class RAULIBootManager:
         print("🧠 Iniciando Ollama...")
         
         try:
-            # Verificar si Ollama ya está corriendo
-            result = subprocess.run(["ollama", "list"], capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                print("✅ Ollama ya está corriendo")
+            # Verificar si Ollama ya está corriendo (sonda HTTP, sin lanzar procesos)
+            snapshot = get_model_inventory().refresh()
+            if snapshot.available:
+                print(f"✅ Ollama ya está corriendo ({len(snapshot.models)} modelos)")
                 self.services["ollama"]["status"] = "running"
                 return True
             
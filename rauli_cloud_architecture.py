@@ -6,19 +6,25 @@ Infraestructura global de nivel empresarial con auto-scaling
 
 import os
 import json
+import time
 import asyncio
 import aiohttp
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, replace
 from enum import Enum
 import hashlib
+import struct
+from datetime import timedelta
 import jwt
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import redis
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
 import uvicorn
+from verified_token_cache import VerifiedTokenCache, token_digest
+from node_registry import NodeRegistry, NodesSaturated
+from session_store import create_session_store, connect_session_store
+from autoscaler import Autoscaler, GroupSignal, ScalingAction, ScalingTarget, TraceRecorder
 
 class Region(Enum):
     US_EAST = "us-east-1"
@@ -61,6 +67,73 @@ class UserSession:
     requests_count: int
     bandwidth_used_mb: float
 
+# Formato binario de sesión: versión, tier, región, fechas en µs, contadores, y textos con longitud
+SESSION_FORMAT = struct.Struct('!BBBqqId')
+SESSION_VERSION = 1
+TIERS = list(ServiceTier)
+REGIONS = list(Region)
+EPOCH = datetime(1970, 1, 1)
+
+def to_micros(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+def session_to_bytes(session: UserSession) -> bytes:
+    """Serializar sesión para el almacén (binario compacto)"""
+    user_id = session.user_id.encode('utf-8')
+    token = session.session_token.encode('utf-8')
+    return b''.join((
+        SESSION_FORMAT.pack(
+            SESSION_VERSION, TIERS.index(session.tier), REGIONS.index(session.region),
+            to_micros(session.created_at), to_micros(session.last_activity),
+            session.requests_count, session.bandwidth_used_mb
+        ),
+        struct.pack('!H', len(user_id)), user_id,
+        struct.pack('!H', len(token)), token
+    ))
+
+def session_from_bytes(raw: bytes) -> UserSession:
+    """Reconstruir sesión desde el almacén"""
+    if raw[:1] == b'{':
+        return session_from_json(raw)  # sesiones escritas antes del formato binario
+    version, tier, region, created_at, last_activity, requests_count, bandwidth = SESSION_FORMAT.unpack_from(raw)
+    if version != SESSION_VERSION:
+        raise ValueError(f"Versión de sesión desconocida: {version}")
+    offset = SESSION_FORMAT.size
+    texts = []
+    for _ in range(2):
+        (length,) = struct.unpack_from('!H', raw, offset)
+        offset += 2
+        texts.append(raw[offset:offset + length].decode('utf-8'))
+        offset += length
+    return UserSession(
+        user_id=texts[0],
+        session_token=texts[1],
+        tier=TIERS[tier],
+        region=REGIONS[region],
+        created_at=from_micros(created_at),
+        last_activity=from_micros(last_activity),
+        requests_count=requests_count,
+        bandwidth_used_mb=bandwidth
+    )
+
+def session_from_json(raw) -> UserSession:
+    """Reconstruir sesión en el formato JSON anterior"""
+    data = json.loads(raw)
+    data['tier'] = ServiceTier(data['tier'])
+    data['region'] = Region(data['region'])
+    data['created_at'] = datetime.fromisoformat(data['created_at'])
+    data['last_activity'] = datetime.fromisoformat(data['last_activity'])
+    return UserSession(**data)
+
+def merge_activity(session: UserSession, other: UserSession):
+    """Quedarse con la mayor actividad registrada de dos copias de la misma sesión"""
+    session.last_activity = max(session.last_activity, other.last_activity)
+    session.requests_count = max(session.requests_count, other.requests_count)
+    session.bandwidth_used_mb = max(session.bandwidth_used_mb, other.bandwidth_used_mb)
+
 @dataclass
 class APIRequest:
     method: str
@@ -76,16 +149,36 @@ class RAULICloudArchitecture:
         self.app = FastAPI(title="RAULI Cloud API", version="1.0.0")
         self.security = HTTPBearer()
         
-        # Configuración Redis para cache y sesiones
-        self.redis_client = redis.Redis(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379)),
-            db=0,
-            decode_responses=True
+        # Almacén de sesiones: Redis asíncrono, o en proceso si no hay servidor (se comprueba al arrancar)
+        self.session_store = create_session_store()
+        self.background_started = False
+        
+        # Tokens verificados y sesiones en memoria
+        self.jwt_secret = os.getenv('JWT_SECRET', 'rauli-secret-key')
+        self.token_cache = VerifiedTokenCache(
+            max_entries=int(os.getenv('TOKEN_CACHE_SIZE', 10000)),
+            ttl=float(os.getenv('TOKEN_CACHE_TTL', 300))
+        )
+        self.session_ttl = 3600
+        self.sessions = {}  # user_id -> (sesión, última lectura del almacén)
+        self.dirty_sessions = set()
+        self.session_recheck_interval = 30  # segundos antes de releer el almacén
+        self.session_flush_interval = 5  # segundos entre escrituras de actividad
+        
+        # Nodos cloud distribuidos, indexados por (tier, región)
+        self.node_registry = NodeRegistry(
+            self.initialize_cloud_nodes(),
+            policy=os.getenv('NODE_SELECTION_POLICY', 'least_loaded'),
+            max_in_flight=int(os.getenv('NODE_MAX_IN_FLIGHT', 64))
         )
         
-        # Nodos cloud distribuidos
-        self.cloud_nodes = self.initialize_cloud_nodes()
+        # Auto-escalado con objetivos por (tier, región)
+        self.autoscaler = Autoscaler(targets=self.load_scaling_targets(os.getenv('AUTOSCALER_TARGETS')))
+        self.scaling_tick = float(os.getenv('AUTOSCALER_TICK', 10))
+        self.scaling_wakeup = asyncio.Event()
+        self.warming_nodes: Dict[str, CloudNode] = {}
+        trace_path = os.getenv('AUTOSCALER_TRACE')
+        self.scaling_trace = TraceRecorder(trace_path) if trace_path else None
         
         # Métricas Prometheus
         self.setup_metrics()
@@ -98,6 +191,21 @@ class RAULICloudArchitecture:
         print("[LOCK] Sistema de autenticación activo")
         print("[GRAPH] Métricas Prometheus activas")
     
+    @property
+    def cloud_nodes(self) -> List[CloudNode]:
+        return self.node_registry.all()
+    
+    @staticmethod
+    def load_scaling_targets(spec: Optional[str]) -> Dict[Tuple[ServiceTier, Region], ScalingTarget]:
+        """JSON {"tier/región": {campos de ScalingTarget}}"""
+        if not spec:
+            return {}
+        targets = {}
+        for group, values in json.loads(spec).items():
+            tier, region = group.split("/")
+            targets[(ServiceTier(tier), Region(region))] = ScalingTarget(**values)
+        return targets
+    
     def initialize_cloud_nodes(self) -> List[CloudNode]:
         """Inicializar nodos cloud distribuidos globalmente"""
         nodes = []
@@ -134,6 +242,15 @@ class RAULICloudArchitecture:
     def setup_routes(self):
         """Configurar rutas API"""
         
+        @self.app.on_event("startup")
+        async def startup():
+            await self.start_background_tasks()
+        
+        @self.app.on_event("shutdown")
+        async def shutdown():
+            await self.flush_session_activity()
+            await self.session_store.close()
+        
         @self.app.get("/health")
         async def health_check():
             return {"status": "healthy", "timestamp": datetime.now().isoformat()}
@@ -146,6 +263,10 @@ class RAULICloudArchitecture:
         async def login(credentials: dict):
             return await self.authenticate_user(credentials)
         
+        @self.app.post("/api/v1/auth/logout")
+        async def logout(credentials: HTTPAuthorizationCredentials = Depends(self.security)):
+            return await self.revoke_token(credentials)
+        
         @self.app.get("/api/v1/nodes")
         async def get_nodes(credentials: HTTPAuthorizationCredentials = Depends(self.security)):
             return await self.get_cloud_nodes(credentials)
@@ -170,7 +291,7 @@ class RAULICloudArchitecture:
                 'user_id': username,
                 'tier': 'enterprise',
                 'exp': datetime.utcnow().timestamp() + 3600  # 1 hora
-            }, os.getenv('JWT_SECRET', 'rauli-secret-key'), algorithm='HS256')
+            }, self.jwt_secret, algorithm='HS256')
             
             session = UserSession(
                 user_id=username,
@@ -183,9 +304,10 @@ class RAULICloudArchitecture:
                 bandwidth_used_mb=0.0
             )
             
-            # Guardar sesión en Redis
+            # Guardar sesión en el almacén
             session_key = f"session:{username}"
-            self.redis_client.setex(session_key, 3600, json.dumps(asdict(session)))
+            await self.session_store.set(session_key, session_to_bytes(session), self.session_ttl)
+            self.sessions[username] = (session, time.monotonic())
             
             return {
                 "status": "success",
@@ -198,32 +320,99 @@ class RAULICloudArchitecture:
     
     async def verify_token(self, credentials: HTTPAuthorizationCredentials) -> UserSession:
         """Verificar token y obtener sesión"""
-        try:
-            token = credentials.credentials
-            payload = jwt.decode(token, os.getenv('JWT_SECRET', 'rauli-secret-key'), algorithms=['HS256'])
-            user_id = payload['user_id']
-            
-            # Obtener sesión de Redis
-            session_key = f"session:{user_id}"
-            session_data = self.redis_client.get(session_key)
-            
-            if not session_data:
-                raise HTTPException(status_code=401, detail="Session expired")
-            
-            session_dict = json.loads(session_data)
-            session = UserSession(**session_dict)
-            
-            # Actualizar última actividad
-            session.last_activity = datetime.now()
-            session.requests_count += 1
-            self.redis_client.setex(session_key, 3600, json.dumps(asdict(session)))
+        token = credentials.credentials
+        payload = self.token_cache.get(token)
+        
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self.jwt_secret, algorithms=['HS256'])
+            except jwt.ExpiredSignatureError:
+                raise HTTPException(status_code=401, detail="Token expired")
+            except jwt.InvalidTokenError:
+                raise HTTPException(status_code=401, detail="Invalid token")
             
-            return session
+            # Revocación local o desde otra instancia
+            if self.token_cache.is_revoked(token) or await self.session_store.exists(f"revoked:{token_digest(token)}"):
+                raise HTTPException(status_code=401, detail="Token revoked")
             
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(status_code=401, detail="Token expired")
-        except jwt.InvalidTokenError:
-            raise HTTPException(status_code=401, detail="Invalid token")
+            self.token_cache.put(token, payload)
+        
+        session = await self.get_session(payload['user_id'])
+        
+        # Actualizar última actividad en memoria; se escribe en lote
+        session.last_activity = datetime.now()
+        session.requests_count += 1
+        self.dirty_sessions.add(session.user_id)
+        
+        return session
+    
+    async def get_session(self, user_id: str) -> UserSession:
+        """Sesión en memoria, releída del almacén cada session_recheck_interval"""
+        now = time.monotonic()
+        cached = self.sessions.get(user_id)
+        if cached and now - cached[1] < self.session_recheck_interval:
+            return cached[0]
+        
+        session_data = await self.session_store.get(f"session:{user_id}")
+        if not session_data:
+            self.sessions.pop(user_id, None)
+            self.dirty_sessions.discard(user_id)
+            raise HTTPException(status_code=401, detail="Session expired")
+        
+        session = session_from_bytes(session_data)
+        if cached:
+            # Conservar la actividad aún no escrita
+            merge_activity(session, cached[0])
+        
+        self.sessions[user_id] = (session, now)
+        return session
+    
+    async def flush_session_activity(self) -> int:
+        """Escribir en el almacén la actividad acumulada (lectura-modificación-escritura en pipeline)"""
+        if not self.dirty_sessions:
+            return 0
+        
+        dirty, self.dirty_sessions = self.dirty_sessions, set()
+        items = {
+            f"session:{user_id}": session_to_bytes(self.sessions[user_id][0])
+            for user_id in dirty if user_id in self.sessions
+        }
+        
+        def merge(stored: Optional[bytes], local: bytes) -> bytes:
+            # Otra instancia pudo escribir actividad de la misma sesión
+            if stored is None:
+                return local
+            session = session_from_bytes(local)
+            merge_activity(session, session_from_bytes(stored))
+            return session_to_bytes(session)
+        
+        try:
+            await self.session_store.merge_many(items, merge, self.session_ttl)
+        except Exception:
+            self.dirty_sessions |= dirty
+            raise
+        return len(items)
+    
+    async def session_writeback_loop(self):
+        """Escritura periódica de la actividad de sesiones"""
+        while True:
+            try:
+                await asyncio.sleep(self.session_flush_interval)
+                await self.flush_session_activity()
+            except Exception as e:
+                print(f"[ERROR] Error escribiendo sesiones: {e}")
+    
+    async def revoke_token(self, credentials: HTTPAuthorizationCredentials) -> Dict:
+        """Revocar token (logout) en esta instancia y en Redis"""
+        session = await self.verify_token(credentials)
+        token = credentials.credentials
+        payload = self.token_cache.get(token) or {}
+        expires_at = payload.get('exp', time.time() + self.session_ttl)
+        
+        digest = self.token_cache.revoke(token, expires_at)
+        await self.session_store.set(f"revoked:{digest}", b"1", max(1, expires_at - time.time()))
+        
+        return {"status": "success", "user_id": session.user_id}
     
     async def get_cloud_nodes(self, credentials: HTTPAuthorizationCredentials) -> Dict:
         """Obtener estado de todos los nodos cloud"""
@@ -231,10 +420,7 @@ class RAULICloudArchitecture:
         
         nodes_status = []
         for node in self.cloud_nodes:
-            # Simular actualización de métricas
-            node.load_percentage = min(95.0, node.load_percentage + (hash(node.id) % 20))
-            node.active_connections = hash(node.id) % 100
-            
+            # Carga y conexiones medidas por el registro (solicitudes en curso y latencia)
             nodes_status.append({
                 "id": node.id,
                 "region": node.region.value,
@@ -255,19 +441,19 @@ class RAULICloudArchitecture:
     async def select_optimal_node(self, request: APIRequest) -> CloudNode:
         """Seleccionar nodo óptimo basado en carga y región"""
         
-        # Filtrar nodos por tier del usuario
-        eligible_nodes = [node for node in self.cloud_nodes if node.tier == request.user_session.tier]
-        
-        # Priorizar nodos de la misma región
-        same_region_nodes = [node for node in eligible_nodes if node.region == request.user_session.region]
-        
-        if same_region_nodes:
-            candidates = same_region_nodes
-        else:
-            candidates = eligible_nodes
-        
-        # Seleccionar nodo con menor carga
-        optimal_node = min(candidates, key=lambda n: n.load_percentage)
+        # Misma región si hay nodos del tier del usuario, si no cualquier región del tier
+        try:
+            optimal_node = self.node_registry.select(request.user_session.tier, request.user_session.region)
+        except NodesSaturated as e:
+            # Despertar el autoescalado sin esperar al siguiente tick
+            self.scaling_wakeup.set()
+            raise HTTPException(
+                status_code=503,
+                detail="Todos los nodos elegibles están saturados",
+                headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))}
+            )
+        if optimal_node is None:
+            raise HTTPException(status_code=503, detail=f"No hay nodos para el tier {request.user_session.tier.value}")
         
         return optimal_node
     
@@ -296,13 +482,11 @@ class RAULICloudArchitecture:
             status="processing"
         ).inc()
         
-        # Simular procesamiento en nodo seleccionado
-        with self.request_duration.time():
+        # Procesar en el nodo contando la solicitud en curso (la carga sale de lo medido)
+        start = time.perf_counter()
+        with self.node_registry.in_flight(selected_node.id), self.request_duration.time():
             result = await self.execute_on_node(selected_node, api_request)
-        
-        # Actualizar métricas del nodo
-        selected_node.load_percentage = min(95.0, selected_node.load_percentage + 5.0)
-        selected_node.active_connections += 1
+        processing_time_ms = (time.perf_counter() - start) * 1000
         
         return {
             "status": "success",
@@ -310,7 +494,7 @@ class RAULICloudArchitecture:
             "region": selected_node.region.value,
             "tier": selected_node.tier.value,
             "result": result,
-            "processing_time_ms": 150,
+            "processing_time_ms": round(processing_time_ms, 2),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -357,6 +541,8 @@ class RAULICloudArchitecture:
             "active_nodes": active_nodes,
             "average_load_percentage": avg_load,
             "total_connections": total_connections,
+            "warming_nodes": len(self.warming_nodes),
+            "autoscaler": self.autoscaler.to_dict(),
             "regions_covered": len(set(n.region for n in self.cloud_nodes)),
             "uptime_seconds": 86400,  # Simulado
             "version": "1.0.0",
@@ -365,65 +551,96 @@ class RAULICloudArchitecture:
         }
     
     async def auto_scale_nodes(self):
-        """Auto-escalado de nodos basado en carga"""
+        """Auto-escalado por (tier, región): tick periódico o despertar inmediato al saturarse"""
         while True:
             try:
-                # Verificar carga promedio
-                avg_load = sum(n.load_percentage for n in self.cloud_nodes) / len(self.cloud_nodes)
+                try:
+                    await asyncio.wait_for(self.scaling_wakeup.wait(), timeout=self.scaling_tick)
+                except asyncio.TimeoutError:
+                    pass
+                self.scaling_wakeup.clear()
                 
-                if avg_load > 80:
-                    # Escalar horizontalmente - agregar nodos
-                    print("[GRAPH] Alta carga detectada - Escalando nodos...")
-                    await self.scale_up()
-                elif avg_load < 30:
-                    # Reducir nodos
-                    print("📉 Baja carga detectada - Reduciendo nodos...")
-                    await self.scale_down()
+                now = time.monotonic()
+                signals = {
+                    group: GroupSignal(values["requests"], values["in_flight"], values["nodes"])
+                    for group, values in self.node_registry.group_signals().items()
+                }
+                for action in self.autoscaler.evaluate(now, signals):
+                    if action.action == "add":
+                        await self.scale_up(action)
+                    elif action.action == "activate":
+                        self.activate_node(action.node_id)
+                    elif action.action == "remove":
+                        await self.scale_down(action)
                 
-                await asyncio.sleep(60)  # Verificar cada minuto
+                if self.scaling_trace:
+                    self.scaling_trace.record(now, signals, self.autoscaler)
                 
             except Exception as e:
                 print(f"[ERROR] Error en auto-escalado: {e}")
-                await asyncio.sleep(60)
-    
-    async def scale_up(self):
-        """Escalar hacia arriba - agregar nodos"""
-        # Simular agregar nodos
-        new_node = CloudNode(
-            id=f"auto-scale-{datetime.now().strftime('%H%M%S')}",
-            region=Region.US_EAST,
-            tier=ServiceTier.PROFESSIONAL,
-            cpu_cores=8,
-            memory_gb=32,
-            storage_gb=500,
-            bandwidth_mbps=500,
+                await asyncio.sleep(self.scaling_tick)
+    
+    async def scale_up(self, action: ScalingAction):
+        """Escalar hacia arriba - crear nodo que calienta antes de recibir tráfico"""
+        tier, region = action.group
+        template = next((n for n in self.cloud_nodes if n.tier == tier), None)
+        if template is None:
+            self.autoscaler.cancel_warming(action.group, action.node_id)
+            print(f"[WARN] Sin plantilla de nodo para el tier {tier.value}")
+            return
+        
+        new_node = replace(
+            template,
+            id=action.node_id,
+            region=region,
             status="starting",
             load_percentage=0.0,
             active_connections=0,
-            endpoint="https://api-auto.rauli.ai"
+            endpoint=f"https://{action.node_id}.rauli.ai"
         )
-        
-        self.cloud_nodes.append(new_node)
-        print(f"[OK] Nuevo nodo agregado: {new_node.id}")
+        self.warming_nodes[new_node.id] = new_node
+        print(f"[GRAPH] Nuevo nodo en calentamiento: {new_node.id} ({action.reason})")
     
-    async def scale_down(self):
-        """Escalar hacia abajo - remover nodos"""
-        # Encontrar nodos con baja carga para remover
-        low_load_nodes = [n for n in self.cloud_nodes if n.load_percentage < 10 and n.active_connections == 0]
-        
-        if low_load_nodes and len(self.cloud_nodes) > 2:  # Mantener mínimo 2 nodos
-            node_to_remove = low_load_nodes[0]
-            self.cloud_nodes.remove(node_to_remove)
-            print(f"[OK] Nodo removido: {node_to_remove.id}")
+    def activate_node(self, node_id: str):
+        """Calentamiento completo: el nodo entra en la selección"""
+        node = self.warming_nodes.pop(node_id, None)
+        if node is None:
+            return
+        node.status = "active"
+        self.node_registry.add(node)
+        print(f"[OK] Nuevo nodo agregado: {node.id}")
+    
+    async def scale_down(self, action: ScalingAction):
+        """Escalar hacia abajo - retirar el nodo más reciente del grupo sin solicitudes en curso"""
+        tier, region = action.group
+        idle_nodes = [
+            n for n in self.cloud_nodes
+            if n.tier == tier and n.region == region and self.node_registry.outstanding[n.id] == 0
+        ]
+        if idle_nodes:
+            node_to_remove = max(idle_nodes, key=lambda n: self.node_registry.order[n.id])
+            self.node_registry.remove(node_to_remove.id)
+            self.autoscaler.confirm_removal(action.group, time.monotonic())
+            print(f"[OK] Nodo removido: {node_to_remove.id} ({action.reason})")
     
     async def start_background_tasks(self):
         """Iniciar tareas en background"""
+        if self.background_started:
+            return
+        self.background_started = True
+        
+        # Redis si responde; si no, almacén en proceso
+        self.session_store = await connect_session_store(self.session_store)
+        
         # Auto-escalado
         asyncio.create_task(self.auto_scale_nodes())
         
         # Limpieza de sesiones expiradas
         asyncio.create_task(self.cleanup_expired_sessions())
         
+        # Escritura en lote de la actividad de sesiones
+        asyncio.create_task(self.session_writeback_loop())
+        
         # Actualización de métricas
         asyncio.create_task(self.update_metrics())
     
@@ -433,6 +650,13 @@ class RAULICloudArchitecture:
             try:
                 # Redis maneja expiración automáticamente, pero podemos hacer limpieza adicional
                 await asyncio.sleep(300)  # Cada 5 minutos
+                
+                # Sesiones locales inactivas y revocaciones ya expiradas
+                limit = datetime.now().timestamp() - self.session_ttl
+                for user_id, (session, _) in list(self.sessions.items()):
+                    if session.last_activity.timestamp() < limit and user_id not in self.dirty_sessions:
+                        del self.sessions[user_id]
+                self.token_cache.revocations.purge()
             except Exception as e:
                 print(f"[ERROR] Error en limpieza de sesiones: {e}")
                 await asyncio.sleep(300)
@@ -441,7 +665,8 @@ class RAULICloudArchitecture:
         """Actualizar métricas de Prometheus"""
         while True:
             try:
-                # Actualizar métricas de nodos
+                # Actualizar métricas de nodos (la carga media decae en nodos inactivos)
+                self.node_registry.refresh_loads()
                 for node in self.cloud_nodes:
                     self.node_load.labels(node_id=node.id).set(node.load_percentage)
                     self.bandwidth_usage.labels(node_id=node.id).set(node.active_connections * 0.1)
@@ -455,10 +680,7 @@ class RAULICloudArchitecture:
         """Iniciar servidor cloud"""
         print(f"[CLOUD] Iniciando RAULI Cloud en {host}:{port}")
         
-        # Iniciar tareas en background
-        asyncio.create_task(self.start_background_tasks())
-        
-        # Iniciar servidor FastAPI
+        # Iniciar servidor FastAPI (las tareas en background arrancan en el evento startup)
         uvicorn.run(self.app, host=host, port=port)
 
 # Configuración de deployment
@@ -7,12 +7,24 @@ PC Local + Cloud + Ollama IA - Orquestación Profesional
 import os
 import json
 import asyncio
+import time
+import math
+import re
+import hashlib
+import heapq
+import itertools
+import random
+import unicodedata
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 import aiohttp
+from aiohttp import web
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 import subprocess
 import psutil
 from dataclasses import dataclass
+from ollama_inventory import ModelInventory, get_model_inventory
 from enum import Enum
 
 class Layer(Enum):
@@ -45,6 +57,692 @@ class NodeStatus:
     available_models: List[ModelType]
     status: str  # active, busy, offline
 
+class OllamaClient:
+    """Cliente asíncrono de la API HTTP local de Ollama con conexión persistente"""
+    
+    def __init__(self, base_url: Optional[str] = None, keep_alive: str = "10m",
+                 max_connections: int = 8, read_timeout: float = 120.0):
+        self.base_url = (base_url or os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")).rstrip("/")
+        if not self.base_url.startswith("http"):
+            self.base_url = f"http://{self.base_url}"
+        self.keep_alive = keep_alive
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=2, sock_read=read_timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Sesión compartida: reutiliza conexiones keep-alive entre peticiones"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+    
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+    
+    async def is_available(self) -> bool:
+        try:
+            session = await self.get_session()
+            async with session.get(f"{self.base_url}/api/version",
+                                   timeout=aiohttp.ClientTimeout(total=2)) as resp:
+                return resp.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+    
+    async def list_models(self) -> List[str]:
+        """Modelos instalados (/api/tags)"""
+        session = await self.get_session()
+        async with session.get(f"{self.base_url}/api/tags",
+                               timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+        return [model["name"] for model in data.get("models", [])]
+    
+    async def loaded_models(self) -> List[str]:
+        """Modelos cargados en memoria (/api/ps)"""
+        session = await self.get_session()
+        async with session.get(f"{self.base_url}/api/ps",
+                               timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+        return [model["name"] for model in data.get("models", [])]
+    
+    async def stream_generate(self, model: str, prompt: str, keep_alive: Optional[str] = None,
+                              options: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """Genera en streaming: produce cada fragmento NDJSON según llega"""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": keep_alive or self.keep_alive
+        }
+        if options:
+            payload["options"] = options
+        
+        session = await self.get_session()
+        async with session.post(f"{self.base_url}/api/generate", json=payload) as resp:
+            if resp.status != 200:
+                raise Exception(f"Error Ollama {resp.status}: {await resp.text()}")
+            async for line in resp.content:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise Exception(f"Error Ollama: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    break
+    
+    async def generate(self, model: str, prompt: str, keep_alive: Optional[str] = None,
+                       options: Optional[Dict] = None,
+                       on_first_token: Optional[Callable[[], None]] = None) -> Dict:
+        """Genera la respuesta completa midiendo la latencia del primer token"""
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        final = {}
+        
+        async for chunk in self.stream_generate(model, prompt, keep_alive, options):
+            if chunk.get("response"):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    if on_first_token:
+                        on_first_token()
+                parts.append(chunk["response"])
+            if chunk.get("done"):
+                final = chunk
+        
+        return {
+            "response": "".join(parts),
+            "first_token_time": first_token if first_token is not None else time.perf_counter() - start,
+            "total_time": time.perf_counter() - start,
+            "eval_count": final.get("eval_count", len(parts))
+        }
+    
+    async def warm(self, model: str, keep_alive: Optional[str] = None):
+        """Carga el modelo sin generar (prompt vacío) y fija su keep_alive"""
+        session = await self.get_session()
+        payload = {"model": model, "keep_alive": keep_alive or self.keep_alive}
+        async with session.post(f"{self.base_url}/api/generate", json=payload) as resp:
+            resp.raise_for_status()
+            await resp.read()
+
+def installed_model_name(family: str, available: List[str]) -> Optional[str]:
+    """Nombre instalado (con etiqueta) de una familia: Ollama resuelve el nombre sin etiqueta a :latest"""
+    if family in available:
+        return family
+    tagged = [name for name in available if name.split(":")[0] == family]
+    if f"{family}:latest" in tagged:
+        return f"{family}:latest"
+    return tagged[0] if tagged else None
+
+class WarmModelPool:
+    """Mantiene cargados en Ollama los modelos a los que enrutamos"""
+    
+    def __init__(self, client: OllamaClient, models: List[str], keep_alive: str = "10m",
+                 refresh_interval: float = 240.0, inventory: Optional[ModelInventory] = None):
+        self.client = client
+        self.inventory = inventory
+        self.models = list(models)
+        self.keep_alive = keep_alive
+        self.refresh_interval = refresh_interval
+        self.last_warm = {}  # modelo -> monotonic del último uso o precalentamiento
+        self.task: Optional[asyncio.Task] = None
+    
+    def touch(self, model: str):
+        """Una generación también renueva el keep_alive del modelo"""
+        self.last_warm[model] = time.monotonic()
+    
+    async def warm_all(self, available: Optional[List[str]] = None) -> List[str]:
+        """Precalienta los modelos del pool que estén instalados"""
+        if available is None:
+            if self.inventory is not None:
+                available = (await asyncio.to_thread(self.inventory.snapshot)).models
+            else:
+                available = await self.client.list_models()
+        warmed = []
+        now = time.monotonic()
+        for family in self.models:
+            # Se precalienta el nombre instalado, el mismo que usan generate y la admisión
+            model = installed_model_name(family, available)
+            if model is None:
+                continue
+            if now - self.last_warm.get(model, 0) < self.refresh_interval:
+                continue
+            try:
+                await self.client.warm(model, self.keep_alive)
+                self.touch(model)
+                warmed.append(model)
+            except Exception as e:
+                print(f"[WARN] No se pudo precalentar {model}: {e}")
+        return warmed
+    
+    async def run(self):
+        while True:
+            try:
+                await self.warm_all()
+            except Exception as e:
+                print(f"[WARN] Pool de modelos: {e}")
+            await asyncio.sleep(self.refresh_interval / 2)
+    
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+class OllamaStandIn:
+    """Servidor local que imita la API de Ollama para pruebas sin modelos"""
+    
+    def __init__(self, models: Optional[List[str]] = None, token_delay: float = 0.005,
+                 load_delay: float = 0.0):
+        # Como en Ollama, un nombre sin etiqueta es :latest
+        self.models = [m if ":" in m else f"{m}:latest" for m in (models or ["llama2", "codellama", "mistral"])]
+        self.token_delay = token_delay
+        self.load_delay = load_delay
+        self.loaded = set()
+        self.requests = 0
+        self.cancelled = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/api/version", self.handle_version)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_get("/api/ps", self.handle_ps)
+        app.router.add_post("/api/generate", self.handle_generate)
+        
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+    
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+    
+    async def handle_version(self, request):
+        return web.json_response({"version": "stand-in"})
+    
+    async def handle_tags(self, request):
+        return web.json_response({"models": [{"name": m} for m in self.models]})
+    
+    async def handle_ps(self, request):
+        return web.json_response({"models": [{"name": m} for m in sorted(self.loaded)]})
+    
+    async def handle_generate(self, request):
+        self.requests += 1
+        body = await request.json()
+        model = body.get("model", "")
+        if ":" not in model:
+            model = f"{model}:latest"
+        if model not in self.models:
+            return web.json_response({"error": f"model '{model}' not found"}, status=404)
+        
+        if model not in self.loaded:
+            await asyncio.sleep(self.load_delay)
+            self.loaded.add(model)
+        
+        prompt = body.get("prompt")
+        if not prompt:
+            return web.json_response({"model": model, "response": "", "done": True})
+        
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        tokens = f"[{model}] {prompt}".split()
+        try:
+            await resp.prepare(request)
+            for token in tokens:
+                await asyncio.sleep(self.token_delay)
+                chunk = {"model": model, "response": token + " ", "done": False}
+                await resp.write((json.dumps(chunk) + "\n").encode())
+            await resp.write((json.dumps({"model": model, "response": "", "done": True,
+                                          "eval_count": len(tokens)}) + "\n").encode())
+            await resp.write_eof()
+        except ConnectionResetError:
+            self.cancelled += 1  # el cliente canceló (p. ej. petición de cobertura perdedora)
+        return resp
+
+class SemanticResponseCache:
+    """Caché de respuestas: exacta por consulta normalizada y, opcionalmente, por similitud"""
+    
+    # Palabras que invierten el sentido: deben coincidir exactamente para reutilizar por similitud
+    NEGATIONS = frozenset({"no", "ni", "nunca", "jamas", "tampoco", "nada", "nadie", "ningun",
+                           "ninguno", "ninguna", "sin", "not", "never", "nor", "none", "without",
+                           "dont", "doesnt", "isnt", "cant", "wont"})
+    
+    def __init__(self, max_entries: int = 2000, ttl: float = 900.0,
+                 similarity_threshold: Optional[float] = None, ngram: int = 3, dimensions: int = 4096):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.ngram = ngram
+        self.dimensions = dimensions
+        
+        # clave -> (respuesta, expira, partición, vector, guarda)
+        self.entries = OrderedDict()
+        # partición -> cubo -> {clave: peso}  (índice invertido para la similitud)
+        self.postings = {}
+        self.inflight = {}  # clave -> [asyncio.Task compartida, nº de esperas]
+        
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+    
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Minúsculas, sin acentos, sin puntuación y con espacios colapsados"""
+        text = unicodedata.normalize("NFKD", query.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+    
+    def make_key(self, normalized: str, partition: Tuple) -> str:
+        return hashlib.sha1(repr((partition, normalized)).encode("utf-8")).hexdigest()
+    
+    def vectorize(self, normalized: str) -> Dict[int, float]:
+        """Vector de n-gramas de caracteres con hashing, normalizado (norma 1)"""
+        text = f" {normalized} "
+        counts = {}
+        for i in range(max(1, len(text) - self.ngram + 1)):
+            gram = text[i:i + self.ngram]
+            bucket = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little") % self.dimensions
+            counts[bucket] = counts.get(bucket, 0) + 1
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {bucket: v / norm for bucket, v in counts.items()}
+    
+    def guard(self, normalized: str) -> Tuple:
+        """Números y negaciones de la consulta: una similitud alta no basta si cambian"""
+        return tuple(token for token in normalized.split()
+                     if token in self.NEGATIONS or any(c.isdigit() for c in token))
+    
+    def get(self, normalized: str, partition: Tuple) -> Tuple[Optional[Dict], str]:
+        """Devuelve (respuesta, tipo) con tipo 'exact', 'similar' o 'miss'"""
+        now = time.monotonic()
+        key = self.make_key(normalized, partition)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0], "exact"
+            self.remove(key)
+        
+        if self.similarity_threshold is not None:
+            similar = self.find_similar(normalized, partition, now)
+            if similar is not None:
+                self.entries.move_to_end(similar)
+                self.stats["similar_hits"] += 1
+                return self.entries[similar][0], "similar"
+        
+        self.stats["misses"] += 1
+        return None, "miss"
+    
+    def find_similar(self, normalized: str, partition: Tuple, now: float) -> Optional[str]:
+        """Coseno contra las entradas de la misma partición vía índice invertido"""
+        index = self.postings.get(partition)
+        if not index:
+            return None
+        
+        guard = self.guard(normalized)
+        scores = {}
+        for bucket, weight in self.vectorize(normalized).items():
+            for key, other in index.get(bucket, {}).items():
+                scores[key] = scores.get(key, 0.0) + weight * other
+        
+        best_key, best_score = None, self.similarity_threshold
+        for key, score in scores.items():
+            entry = self.entries[key]
+            if score >= best_score and entry[1] > now and entry[4] == guard:
+                best_key, best_score = key, score
+        return best_key
+    
+    def put(self, normalized: str, partition: Tuple, response: Dict):
+        key = self.make_key(normalized, partition)
+        if key in self.entries:
+            self.remove(key)
+        
+        if self.similarity_threshold is not None:
+            vector, guard = self.vectorize(normalized), self.guard(normalized)
+        else:
+            vector, guard = {}, ()
+        self.entries[key] = (response, time.monotonic() + self.ttl, partition, vector, guard)
+        index = self.postings.setdefault(partition, {})
+        for bucket, weight in vector.items():
+            index.setdefault(bucket, {})[key] = weight
+        
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+    
+    def remove(self, key: str):
+        _, _, partition, vector, _ = self.entries.pop(key)
+        index = self.postings.get(partition, {})
+        for bucket in vector:
+            postings = index.get(bucket)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del index[bucket]
+    
+    async def coalesce(self, normalized: str, partition: Tuple, factory) -> Tuple[Dict, bool]:
+        """Singleflight: peticiones idénticas concurrentes comparten una sola ejecución"""
+        key = self.make_key(normalized, partition)
+        flight = self.inflight.get(key)
+        coalesced = flight is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            # Tarea propia: la cancelación de un llamador no aborta el trabajo compartido
+            task = asyncio.ensure_future(factory())
+            flight = self.inflight[key] = [task, 0]
+            task.add_done_callback(lambda done, key=key: self.finish_flight(key, done))
+        
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task), coalesced
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not task.done():
+                # Nadie espera ya el resultado: se cancela y no se ofrece a nuevos llamadores
+                self.finish_flight(key, task)
+                task.cancel()
+    
+    def finish_flight(self, key: str, task: asyncio.Task):
+        flight = self.inflight.get(key)
+        if flight is not None and flight[0] is task:
+            del self.inflight[key]
+        if task.done() and not task.cancelled():
+            task.exception()  # marcada como recuperada aunque nadie más espere
+    
+    def get_metrics(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["similar_hits"] + self.stats["misses"]
+        return {
+            "cache_hits": self.stats["hits"],
+            "cache_similar_hits": self.stats["similar_hits"],
+            "cache_misses": self.stats["misses"],
+            "cache_coalesced": self.stats["coalesced"],
+            "cache_evictions": self.stats["evictions"],
+            "cache_entries": len(self.entries),
+            "cache_hit_rate": (self.stats["hits"] + self.stats["similar_hits"]) / lookups if lookups else 0.0
+        }
+
+class LatencyStats:
+    """EWMA y p95 (ventana acotada) de latencia total y de primer token"""
+    
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.ewma_total: Optional[float] = None
+        self.ewma_first_token: Optional[float] = None
+        self.first_token_samples = deque(maxlen=window)
+        self.total_samples = deque(maxlen=window)
+        self.count = 0
+        self.failures = 0
+        self.last_update = 0.0
+        self.p95_cache = {}
+    
+    def add(self, total: float, first_token: Optional[float] = None):
+        first_token = total if first_token is None else first_token
+        if self.ewma_total is None:
+            self.ewma_total, self.ewma_first_token = total, first_token
+        else:
+            self.ewma_total += self.alpha * (total - self.ewma_total)
+            self.ewma_first_token += self.alpha * (first_token - self.ewma_first_token)
+        self.total_samples.append(total)
+        self.first_token_samples.append(first_token)
+        self.count += 1
+        self.last_update = time.monotonic()
+        self.p95_cache.clear()
+    
+    def p95(self, first_token: bool = False) -> Optional[float]:
+        samples = self.first_token_samples if first_token else self.total_samples
+        if not samples:
+            return None
+        if first_token not in self.p95_cache:
+            ordered = sorted(samples)
+            self.p95_cache[first_token] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return self.p95_cache[first_token]
+    
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "ewma_ms": round(self.ewma_total * 1000, 1) if self.ewma_total is not None else None,
+            "ewma_first_token_ms": round(self.ewma_first_token * 1000, 1) if self.ewma_first_token is not None else None,
+            "p95_ms": round(self.p95() * 1000, 1) if self.count else None,
+            "p95_first_token_ms": round(self.p95(True) * 1000, 1) if self.count else None
+        }
+
+class LatencyRouter:
+    """Predice la latencia por capa y clase de solicitud a partir de mediciones reales"""
+    
+    # Latencias supuestas (s) mientras no hay muestras suficientes: local primero
+    PRIORS = {Layer.LOCAL: 0.4, Layer.CLOUD: 0.6}
+    
+    def __init__(self, min_samples: int = 5, stale_after: float = 120.0, failure_penalty: float = 5.0,
+                 explore_rate: float = 0.05):
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self.stale_after = stale_after
+        self.failure_penalty = failure_penalty
+        self.stats: Dict[Tuple[Layer, str], LatencyStats] = {}
+        self.model_stats: Dict[Tuple[Layer, str], LatencyStats] = {}
+    
+    def get_stats(self, layer: Layer, request_class: str) -> LatencyStats:
+        key = (layer, request_class)
+        if key not in self.stats:
+            self.stats[key] = LatencyStats()
+        return self.stats[key]
+    
+    def record(self, layer: Layer, request_class: str, total: float,
+               first_token: Optional[float] = None, model: Optional[str] = None):
+        self.get_stats(layer, request_class).add(total, first_token)
+        if model:
+            key = (layer, model)
+            if key not in self.model_stats:
+                self.model_stats[key] = LatencyStats()
+            self.model_stats[key].add(total, first_token)
+    
+    def record_failure(self, layer: Layer, request_class: str):
+        stats = self.get_stats(layer, request_class)
+        stats.failures += 1
+        stats.add(self.failure_penalty)
+    
+    def predict(self, layer: Layer, request_class: str, tail: bool = False) -> float:
+        """EWMA total (o p95 de primer token si tail), mezclado con el prior al principio"""
+        prior = self.PRIORS[layer]
+        stats = self.stats.get((layer, request_class))
+        if stats is None or not stats.count:
+            return prior
+        
+        measured = stats.p95(first_token=True) if tail else stats.ewma_total
+        weight = min(1.0, stats.count / self.min_samples)
+        predicted = weight * measured + (1 - weight) * prior
+        
+        # Datos viejos: volver a explorar en lugar de quedar anclados a un mal valor
+        if time.monotonic() - stats.last_update > self.stale_after:
+            predicted = min(predicted, prior)
+        return predicted
+    
+    def choose(self, request: ProcessingRequest, allowed: List[Layer], local_load: float = 0.0) -> Layer:
+        """Capa con menor latencia prevista entre las permitidas"""
+        tail = request.priority == "high"
+        
+        # Exploración ocasional para seguir midiendo la capa que no gana (nunca en prioridad alta)
+        if not tail and len(allowed) > 1 and random.random() < self.explore_rate:
+            return random.choice(allowed)
+        
+        best_layer, best_latency = None, float("inf")
+        for layer in allowed:
+            predicted = self.predict(layer, request.complexity, tail)
+            if layer == Layer.LOCAL and local_load > 70:
+                predicted *= 1 + (local_load - 70) / 30  # CPU/memoria saturadas
+            if predicted < best_latency:
+                best_layer, best_latency = layer, predicted
+        return best_layer
+    
+    def to_dict(self) -> Dict:
+        return {
+            "by_class": {f"{layer.value}:{cls}": st.to_dict() for (layer, cls), st in self.stats.items()},
+            "by_model": {f"{layer.value}:{model}": st.to_dict() for (layer, model), st in self.model_stats.items()}
+        }
+
+class AdmissionRejected(Exception):
+    """El modelo local no puede atender la solicitud a tiempo"""
+    
+    def __init__(self, model: str, retry_after: float, reason: str):
+        super().__init__(f"{model}: {reason} (reintentar en {retry_after:.1f}s)")
+        self.model = model
+        self.retry_after = retry_after
+        self.reason = reason
+
+class ModelAdmission:
+    """Control de admisión por modelo: límite de concurrencia adaptativo y cola por prioridad con plazos"""
+    
+    PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2}
+    # Espera máxima en cola (s) por prioridad
+    DEADLINES = {"high": 2.0, "medium": 5.0, "low": 10.0}
+    
+    def __init__(self, model: str, initial_limit: int = 2, max_limit: int = 8, max_queue: int = 32):
+        self.model = model
+        self.limit = float(initial_limit)
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        
+        self.in_flight = 0
+        self.queue = []  # heap: (rango, plazo, seq, future)
+        self.seq = itertools.count()
+        
+        # Capacidad medida: latencia base (mínima) y EWMA del servicio
+        self.baseline: Optional[float] = None
+        self.ewma_service: Optional[float] = None
+        self.waits = deque(maxlen=200)
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "expired": 0}
+    
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit))
+    
+    def estimated_wait(self, rank: int) -> float:
+        """Espera prevista para entrar detrás de los de igual o mayor prioridad"""
+        ahead = sum(1 for entry in self.queue if entry[0] <= rank and not entry[3].done())
+        service = self.ewma_service or 1.0
+        return (ahead + 1) * service / self.capacity
+    
+    async def acquire(self, priority: str = "medium"):
+        rank = self.PRIORITY_RANK.get(priority, 1)
+        deadline_budget = self.DEADLINES.get(priority, 5.0)
+        start = time.monotonic()
+        
+        if self.in_flight < self.capacity and not self.queue:
+            self.in_flight += 1
+            self.record_admission(0.0)
+            return
+        
+        # Rechazo rápido: cola llena o espera prevista (ya medida) mayor que el plazo
+        if len(self.queue) >= self.max_queue:
+            self.prune()
+        estimated = self.estimated_wait(rank)
+        if len(self.queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(self.model, estimated, "cola llena")
+        if self.ewma_service is not None and estimated > deadline_budget:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(self.model, estimated, "espera prevista excede el plazo")
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (rank, start + deadline_budget, next(self.seq), future))
+        self.stats["queued"] += 1
+        self.dispatch()
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=deadline_budget)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Se concedió justo al vencer el plazo: devolver la plaza
+                self.release_slot()
+            future.cancel()
+            self.stats["expired"] += 1
+            raise AdmissionRejected(self.model, self.estimated_wait(rank), "plazo de cola vencido")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release_slot()
+            future.cancel()
+            raise
+        
+        self.record_admission(time.monotonic() - start)
+    
+    def record_admission(self, waited: float):
+        self.stats["admitted"] += 1
+        self.waits.append(waited)
+    
+    def release(self, service_time: Optional[float] = None):
+        """Libera la plaza y ajusta el límite (AIMD) con la latencia medida"""
+        if service_time is not None:
+            self.baseline = service_time if self.baseline is None else min(self.baseline, service_time)
+            self.ewma_service = service_time if self.ewma_service is None else \
+                self.ewma_service + 0.2 * (service_time - self.ewma_service)
+            if service_time <= 2 * self.baseline:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(1.0, self.limit * 0.9)
+        self.release_slot()
+    
+    def release_slot(self):
+        self.in_flight -= 1
+        self.dispatch()
+    
+    def dispatch(self):
+        """Concede plazas libres a los primeros de la cola que sigan esperando"""
+        now = time.monotonic()
+        while self.queue and self.in_flight < self.capacity:
+            _, deadline, _, future = heapq.heappop(self.queue)
+            if future.done() or deadline <= now:
+                # Abandonado o vencido: su propio timeout lo rechaza
+                continue
+            self.in_flight += 1
+            future.set_result(True)
+    
+    def prune(self):
+        """Quita de la cola a los que ya vencieron o abandonaron (solo se sacan al despachar)"""
+        live = [entry for entry in self.queue if not entry[3].done()]
+        if len(live) < len(self.queue):
+            heapq.heapify(live)
+            self.queue = live
+    
+    @asynccontextmanager
+    async def slot(self, priority: str = "medium"):
+        await self.acquire(priority)
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.release(time.monotonic() - start if ok else None)
+    
+    def to_dict(self) -> Dict:
+        waits = sorted(self.waits)
+        return {
+            "limit": self.capacity,
+            "in_flight": self.in_flight,
+            "queue_depth": sum(1 for entry in self.queue if not entry[3].done()),
+            "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            "ewma_service_ms": round(self.ewma_service * 1000, 1) if self.ewma_service else None,
+            **self.stats
+        }
+
 class RAULIHybridOrchestrator:
     def __init__(self):
         self.local_node = NodeStatus(
@@ -56,71 +754,83 @@ class RAULIHybridOrchestrator:
             status="active"
         )
         
+        # Cliente HTTP persistente de Ollama y pool de modelos precalentados
+        self.ollama = OllamaClient()
+        self.inventory = get_model_inventory()
+        self.inventory.subscribe(self.on_inventory_change)
+        self.warm_pool = WarmModelPool(self.ollama, ["llama2", "codellama", "mistral"],
+                                       inventory=self.inventory)
+        
         self.cloud_nodes = []
         self.routing_table = {}
-        self.cache = {}
+        # Nivel por similitud desactivado salvo que se fije un umbral (p. ej. 0.9)
+        similarity = os.getenv("RAULI_CACHE_SIMILARITY")
+        self.cache = SemanticResponseCache(similarity_threshold=float(similarity) if similarity else None)
+        
+        # Enrutamiento por latencia medida y hedging para prioridad alta
+        self.router = LatencyRouter()
+        self.hedge_delay = float(os.getenv("RAULI_HEDGE_DELAY_MS", 300)) / 1000
+        
+        # Control de admisión por modelo local
+        self.admission: Dict[str, ModelAdmission] = {}
+        self.local_concurrency = int(os.getenv("RAULI_LOCAL_CONCURRENCY", 2))
         self.metrics = {
             "total_requests": 0,
             "local_processed": 0,
             "cloud_processed": 0,
             "avg_response_time": 0.0,
-            "fallback_count": 0
+            "fallback_count": 0,
+            "avg_first_token_time": 0.0,
+            "hedged_requests": 0,
+            "hedge_cloud_wins": 0,
+            "shed_to_cloud": 0,
+            "rejected_overload": 0
         }
+        self.metrics.update(self.cache.get_metrics())
         
         print("[ARCH] RAULI Hybrid Architecture iniciada")
         print("[AI] Ollama IA local activa")
         print("[CLOUD2] Cloud nodes configurados")
         print("[TARGET] Orquestación inteligente operativa")
     
+    async def get_inventory(self):
+        """Inventario compartido; solo la primera sonda sale del event loop"""
+        if self.inventory.current is None:
+            return await asyncio.to_thread(self.inventory.snapshot)
+        return self.inventory.snapshot()
+    
+    def on_inventory_change(self, previous, current):
+        """Evento de cambio publicado por el inventario"""
+        if previous is None or previous.available != current.available:
+            print(f"[AI] Ollama {'disponible' if current.available else 'no disponible'}")
+        if previous is not None and previous.models != current.models:
+            print(f"[AI] Modelos Ollama: {', '.join(current.models) or 'ninguno'}")
+    
     async def check_ollama_status(self) -> bool:
         """Verificar estado de Ollama local"""
-        try:
-            result = subprocess.run(
-                ["ollama", "list"], 
-                capture_output=True, 
-                text=True, 
-                timeout=5
-            )
-            return result.returncode == 0
-        except:
-            return False
+        return (await self.get_inventory()).available
     
     async def get_local_models(self) -> List[str]:
         """Obtener modelos Ollama disponibles"""
-        try:
-            result = subprocess.run(
-                ["ollama", "list"], 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]  # Skip header
-                return [line.split()[0] for line in lines if line.strip()]
-        except:
-            pass
-        return []
+        return (await self.get_inventory()).models
     
     def analyze_request(self, request: ProcessingRequest) -> Layer:
         """Analizar solicitud y decidir capa de procesamiento"""
         
-        # Reglas de enrutamiento inteligente
+        # Restricción de sensibilidad: datos críticos siempre local
         if request.sensitivity == "critical":
-            return Layer.LOCAL  # Datos críticos siempre local
-        
-        if request.complexity == "simple" and request.priority == "high":
-            return Layer.LOCAL  # Respuestas rápidas locales
+            return Layer.LOCAL
         
-        if request.complexity == "complex" and request.sensitivity == "public":
-            return Layer.CLOUD  # Procesamiento pesado en nube
-        
-        # Balanceo de carga
-        if self.local_node.cpu_usage > 80 or self.local_node.memory_usage > 80:
-            return Layer.CLOUD
+        # Carga local actual (lectura no bloqueante)
+        self.local_node.cpu_usage = psutil.cpu_percent(interval=None)
+        self.local_node.memory_usage = psutil.virtual_memory().percent
+        local_load = max(self.local_node.cpu_usage, self.local_node.memory_usage)
         
-        return Layer.HYBRID  # Decisión híbrida por defecto
+        # Menor latencia prevista para esta clase de solicitud
+        return self.router.choose(request, [Layer.LOCAL, Layer.CLOUD], local_load)
     
-    async def process_local(self, request: ProcessingRequest) -> Dict:
+    async def process_local(self, request: ProcessingRequest, on_first_token: Optional[Callable[[], None]] = None,
+                            fallback: bool = True) -> Dict:
         """Procesar solicitud localmente con Ollama"""
         try:
             models = await self.get_local_models()
@@ -130,51 +840,141 @@ class RAULIHybridOrchestrator:
             # Seleccionar modelo adecuado
             model = self.select_best_model(models, request)
             
-            # Ejecutar consulta Ollama
-            cmd = ["ollama", "run", model, request.query]
-            result = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                timeout=30
-            )
+            # Ejecutar consulta contra la API HTTP (sin lanzar procesos), con plaza en el modelo
+            async with self.get_admission(model).slot(request.priority):
+                result = await self.ollama.generate(model, request.query, on_first_token=on_first_token)
+            self.warm_pool.touch(model)
+            self.router.record(Layer.LOCAL, request.complexity, result["total_time"],
+                               result["first_token_time"], model)
             
-            if result.returncode == 0:
-                response = {
-                    "layer": "local",
-                    "model": model,
-                    "response": result.stdout.strip(),
-                    "processing_time": 0.1,  # Simulado
-                    "confidence": 0.95
-                }
-                self.metrics["local_processed"] += 1
-                return response
-            else:
-                raise Exception(f"Error Ollama: {result.stderr}")
+            response = {
+                "layer": "local",
+                "model": model,
+                "response": result["response"].strip(),
+                "processing_time": result["total_time"],
+                "first_token_time": result["first_token_time"],
+                "confidence": 0.95
+            }
+            self.metrics["local_processed"] += 1
+            return response
+        
+        except AdmissionRejected as e:
+            if not fallback:
+                raise
+            return await self.shed_overload(request, e)
                 
         except Exception as e:
             print(f"[ERROR] Error procesamiento local: {e}")
+            self.router.record_failure(Layer.LOCAL, request.complexity)
+            if not fallback:
+                raise
             return await self.process_cloud_fallback(request)
     
+    def get_admission(self, model: str) -> ModelAdmission:
+        if model not in self.admission:
+            self.admission[model] = ModelAdmission(model, initial_limit=self.local_concurrency)
+        return self.admission[model]
+    
+    async def shed_overload(self, request: ProcessingRequest, rejection: AdmissionRejected) -> Dict:
+        """Desbordamiento: a la nube si la sensibilidad lo permite, si no rechazo rápido"""
+        if request.sensitivity != "critical":
+            print(f"[RESTART] Modelo local saturado ({rejection.reason}), derivando a nube")
+            self.metrics["shed_to_cloud"] += 1
+            return await self.process_cloud(request)
+        
+        self.metrics["rejected_overload"] += 1
+        return {
+            "layer": "rejected",
+            "model": rejection.model,
+            "error": "local_overloaded",
+            "reason": rejection.reason,
+            "retry_after": max(1, math.ceil(rejection.retry_after)),
+            "processing_time": 0.0
+        }
+    
+    async def process_hedged(self, request: ProcessingRequest) -> Dict:
+        """Local primero; si no hay primer token en hedge_delay, lanzar nube y quedarse con el primero"""
+        first_token = asyncio.Event()
+        local = asyncio.create_task(self.process_local(request, first_token.set, fallback=False))
+        token_wait = asyncio.create_task(first_token.wait())
+        
+        try:
+            await asyncio.wait({local, token_wait}, timeout=self.hedge_delay,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            token_wait.cancel()
+        
+        if first_token.is_set() or local.done():
+            try:
+                return await local
+            except Exception:
+                return await self.process_cloud_fallback(request)
+        
+        # Local lento: petición de cobertura a la nube
+        self.metrics["hedged_requests"] += 1
+        cloud = asyncio.create_task(self.process_cloud(request))
+        pending = {local, cloud}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().get("layer") != "local_fallback":
+                        if task is cloud:
+                            self.metrics["hedge_cloud_wins"] += 1
+                        return task.result()
+            # Ambas fallaron: respuesta de emergencia
+            return await self.process_local_fallback(request)
+        finally:
+            # Cancelar la perdedora (cierra el stream de Ollama si era la local)
+            for task in pending:
+                task.cancel()
+    
+    async def stream_local(self, query: str, model: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        """Devuelve los tokens de Ollama a medida que se generan"""
+        request = ProcessingRequest(
+            query=query,
+            priority=kwargs.get("priority", "medium"),
+            sensitivity=kwargs.get("sensitivity", "public"),
+            complexity=kwargs.get("complexity", "moderate"),
+            context=kwargs.get("context", {}),
+            timestamp=datetime.now()
+        )
+        if model is None:
+            model = self.select_best_model(await self.get_local_models(), request)
+        
+        self.metrics["total_requests"] += 1
+        async with self.get_admission(model).slot(request.priority):
+            async for chunk in self.ollama.stream_generate(model, query):
+                if chunk.get("response"):
+                    yield chunk["response"]
+        
+        self.warm_pool.touch(model)
+        self.metrics["local_processed"] += 1
+    
     async def process_cloud(self, request: ProcessingRequest) -> Dict:
         """Procesar solicitud en la nube"""
+        start = time.perf_counter()
         try:
             # Simulación de procesamiento cloud
             await asyncio.sleep(0.5)  # Latencia de red
+            elapsed = time.perf_counter() - start
             
             response = {
                 "layer": "cloud",
                 "model": "gpt-4-turbo",
                 "response": f"[CLOUD] Cloud response for: {request.query}",
-                "processing_time": 0.5,
+                "processing_time": elapsed,
+                "first_token_time": elapsed,
                 "confidence": 0.98
             }
             
+            self.router.record(Layer.CLOUD, request.complexity, elapsed, elapsed, response["model"])
             self.metrics["cloud_processed"] += 1
             return response
             
         except Exception as e:
             print(f"[ERROR] Error procesamiento cloud: {e}")
+            self.router.record_failure(Layer.CLOUD, request.complexity)
             return await self.process_local_fallback(request)
     
     async def process_cloud_fallback(self, request: ProcessingRequest) -> Dict:
@@ -200,13 +1000,18 @@ class RAULIHybridOrchestrator:
     def select_best_model(self, models: List[str], request: ProcessingRequest) -> str:
         """Seleccionar mejor modelo disponible"""
         
+        # Ollama devuelve nombres con etiqueta (codellama:7b); se devuelve el nombre instalado
+        codellama = installed_model_name("codellama", models)
+        mistral = installed_model_name("mistral", models)
+        llama2 = installed_model_name("llama2", models)
+        
         # Prioridad de modelos por tipo de solicitud
-        if "code" in request.query.lower() and "codellama" in models:
-            return "codellama"
-        elif "complex" in request.complexity and "mistral" in models:
-            return "mistral"
-        elif "llama" in models:
-            return "llama2"
+        if "code" in request.query.lower() and codellama:
+            return codellama
+        elif "complex" in request.complexity and mistral:
+            return mistral
+        elif llama2:
+            return llama2
         elif models:
             return models[0]  # Primer disponible
         
@@ -232,24 +1037,64 @@ class RAULIHybridOrchestrator:
         
         print(f"[TARGET] Enrutando a capa: {target_layer.value}")
         
-        # Procesar según capa
-        if target_layer == Layer.LOCAL:
-            response = await self.process_local(request)
-        elif target_layer == Layer.CLOUD:
-            response = await self.process_cloud(request)
-        else:  # HYBRID
-            # Intentar local primero, luego cloud si falla
-            response = await self.process_local(request)
+        # Los datos críticos nunca se cachean ni se comparten entre peticiones
+        if request.sensitivity == "critical":
+            response = await self.process_layer(request, target_layer)
+            self.update_performance_metrics(response)
+            return response
+        
+        normalized = self.cache.normalize(query)
+        # La capa elegida cambia con la carga: no forma parte de la clave para no partir la caché
+        # ni el singleflight entre local y nube (cualquiera de las dos respuestas sirve)
+        partition = (kwargs.get("model"), request.sensitivity, request.complexity)
+        
+        cached, kind = self.cache.get(normalized, partition)
+        if cached is not None:
+            self.metrics.update(self.cache.get_metrics())
+            return dict(cached, cached=kind)
+        
+        async def compute():
+            response = await self.process_layer(request, target_layer)
+            # Las respuestas de emergencia y los rechazos no se reutilizan
+            if response.get("layer") not in ("local_fallback", "rejected"):
+                self.cache.put(normalized, partition, response)
+            return response
+        
+        response, coalesced = await self.cache.coalesce(normalized, partition, compute)
+        self.metrics.update(self.cache.get_metrics())
+        if coalesced:
+            return dict(response, cached="coalesced")
         
         # Actualizar métricas de rendimiento
         self.update_performance_metrics(response)
         
         return response
     
+    async def process_layer(self, request: ProcessingRequest, target_layer: Layer) -> Dict:
+        """Procesar según capa"""
+        if target_layer == Layer.LOCAL:
+            if request.priority == "high" and request.sensitivity != "critical":
+                return await self.process_hedged(request)
+            return await self.process_local(request)
+        elif target_layer == Layer.CLOUD:
+            return await self.process_cloud(request)
+        else:  # HYBRID
+            # Intentar local primero, luego cloud si falla
+            return await self.process_local(request)
+    
     def update_performance_metrics(self, response: Dict):
         """Actualizar métricas de rendimiento"""
         processing_time = response.get("processing_time", 0)
         
+        if "first_token_time" in response:
+            first_token = response["first_token_time"]
+            if self.metrics["avg_first_token_time"] == 0:
+                self.metrics["avg_first_token_time"] = first_token
+            else:
+                self.metrics["avg_first_token_time"] = (
+                    self.metrics["avg_first_token_time"] * 0.9 + first_token * 0.1
+                )
+        
         if self.metrics["avg_response_time"] == 0:
             self.metrics["avg_response_time"] = processing_time
         else:
@@ -264,10 +1109,13 @@ class RAULIHybridOrchestrator:
         # Estado local
         self.local_node.cpu_usage = psutil.cpu_percent()
         self.local_node.memory_usage = psutil.virtual_memory().percent
-        self.local_node.status = "active" if await self.check_ollama_status() else "offline"
+        inventory = await self.get_inventory()
+        ollama_active = inventory.available
+        self.local_node.status = "active" if ollama_active else "offline"
         
-        # Modelos disponibles
-        local_models = await self.get_local_models()
+        # Modelos disponibles y cargados (desde el inventario cacheado)
+        local_models = inventory.models
+        loaded_models = inventory.loaded
         
         return {
             "timestamp": datetime.now().isoformat(),
@@ -276,10 +1124,13 @@ class RAULIHybridOrchestrator:
                 "cpu_usage": self.local_node.cpu_usage,
                 "memory_usage": self.local_node.memory_usage,
                 "available_models": local_models,
-                "ollama_active": await self.check_ollama_status()
+                "loaded_models": loaded_models,
+                "ollama_active": ollama_active
             },
             "cloud_nodes": self.cloud_nodes,
             "metrics": self.metrics,
+            "latency": self.router.to_dict(),
+            "admission": {model: adm.to_dict() for model, adm in self.admission.items()},
             "routing_efficiency": self.calculate_routing_efficiency()
         }
     
@@ -309,6 +1160,9 @@ class RAULIHybridOrchestrator:
                 print("[OK] Ollama instalado correctamente")
             except Exception as e:
                 print(f"[ERROR] Error instalando Ollama: {e}")
+            
+            # Sin esperar al TTL: el inventario compartido ve ya el servidor nuevo
+            await asyncio.to_thread(self.inventory.refresh)
     
     async def download_models(self):
         """Descargar modelos básicos"""
@@ -324,6 +1178,9 @@ class RAULIHybridOrchestrator:
                 print(f"[OK] Modelo {model} descargado")
             except Exception as e:
                 print(f"[ERROR] Error descargando {model}: {e}")
+        
+        # Los modelos recién descargados quedan disponibles para selección y precalentamiento
+        await asyncio.to_thread(self.inventory.refresh)
 
 # Sistema principal
 class RAULIHybridSystem:
@@ -341,6 +1198,9 @@ class RAULIHybridSystem:
         # Descargar modelos
         await self.orchestrator.download_models()
         
+        # Mantener cargados los modelos a los que enrutamos
+        self.orchestrator.warm_pool.start()
+        
         self.running = True
         print("[OK] Sistema híbrido operativo")
         
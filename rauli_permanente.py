@@ -11,34 +11,317 @@ import time
 import subprocess
 import threading
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
+import atexit
+import bisect
+import signal
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 
 # Cargar credenciales RAULI
 load_dotenv(r"C:\RAULI_CORE\credenciales.env")
 
+class RegistroConversaciones:
+    """Log append-only de mensajes, segmentado por chat (un JSONL por conversación)"""
+    
+    def __init__(self, directorio, max_mensajes=50, max_chats_cache=256):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.max_mensajes = max_mensajes
+        self.max_chats_cache = max_chats_cache
+        
+        # Últimos mensajes de los chats leídos recientemente (LRU)
+        self.cache = OrderedDict()
+        self.lineas = {}  # líneas por chat desde la última compactación
+        self.pendientes = {}  # líneas aún no escritas, por chat
+        self.en_vuelo = {}  # chat -> (offset previo a la escritura, líneas) del lote en escritura
+        self.lock = threading.RLock()
+        self.lock_escritura = threading.Lock()  # serializa volcados y compactaciones
+    
+    def ruta(self, chat_key):
+        """Archivo de log de un chat"""
+        return self.directorio / f"{chat_key}.jsonl"
+    
+    def tamano(self, chat_key):
+        """Tamaño actual del log (offset para el snapshot)"""
+        try:
+            return self.ruta(chat_key).stat().st_size
+        except FileNotFoundError:
+            return 0
+    
+    def chats_en_disco(self):
+        """Chats con log en disco"""
+        return [ruta.stem for ruta in self.directorio.glob('*.jsonl')]
+    
+    def agregar(self, chat_key, evento):
+        """Encola un evento para el log del chat (se escribe en el próximo volcado)"""
+        linea = json.dumps(evento, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.pendientes.setdefault(chat_key, []).append(linea)
+            
+            if evento.get('op') == 'mensaje' and chat_key in self.cache:
+                self.cache[chat_key].append(evento['mensaje'])
+                self.cache.move_to_end(chat_key)
+    
+    def volcar(self):
+        """Escribe los eventos pendientes: una apertura y una escritura por chat"""
+        with self.lock_escritura:
+            # Offsets previos a la escritura, tomados fuera de self.lock (nadie más escribe ahora)
+            with self.lock:
+                chats = list(self.pendientes)
+            offsets = {chat_key: self.tamano(chat_key) for chat_key in chats}
+            
+            with self.lock:
+                lote, self.pendientes = self.pendientes, {}
+                self.en_vuelo = {
+                    chat_key: (offsets[chat_key] if chat_key in offsets else self.tamano(chat_key), lineas)
+                    for chat_key, lineas in lote.items()
+                }
+            
+            # La E/S se hace fuera de self.lock: agregar() nunca espera al disco
+            por_compactar = []
+            try:
+                for chat_key, lineas in lote.items():
+                    with open(self.ruta(chat_key), 'a', encoding='utf-8') as f:
+                        f.write(''.join(lineas))
+                    
+                    with self.lock:
+                        # Ya está en disco: deja de contarse como no escrito
+                        self.en_vuelo.pop(chat_key, None)
+                        self.lineas[chat_key] = self.lineas.get(chat_key, 0) + len(lineas)
+                        if self.lineas[chat_key] > self.max_mensajes * 2:
+                            por_compactar.append(chat_key)
+            finally:
+                with self.lock:
+                    self.en_vuelo = {}
+            
+            for chat_key in por_compactar:
+                self.compactar(chat_key)
+            return sum(len(lineas) for lineas in lote.values()), por_compactar
+    
+    def leer_eventos(self, chat_key, desde=0, hasta=None):
+        """Lee los eventos del log entre dos offsets en bytes (hasta=None: hasta el final)"""
+        ruta = self.ruta(chat_key)
+        if not ruta.exists():
+            return []
+        
+        eventos = []
+        with open(ruta, 'rb') as f:
+            f.seek(desde)
+            contenido = f if hasta is None else f.read(max(0, hasta - desde)).splitlines(keepends=True)
+            for linea in contenido:
+                try:
+                    eventos.append(json.loads(linea.decode('utf-8')))
+                except (ValueError, UnicodeDecodeError):
+                    # Última línea incompleta tras un corte: se ignora
+                    continue
+        return eventos
+    
+    def mensajes(self, chat_key, cantidad=None):
+        """Últimos mensajes de un chat sin tocar los logs de los demás"""
+        with self.lock:
+            if chat_key not in self.cache:
+                ultimos = deque(maxlen=self.max_mensajes)
+                # Si el chat tiene un lote escribiéndose, el disco se lee solo hasta donde
+                # empezaba ese lote: sus líneas se toman de en_vuelo y no se duplican
+                hasta, en_vuelo = self.en_vuelo.get(chat_key, (None, []))
+                for evento in self.leer_eventos(chat_key, hasta=hasta):
+                    if evento.get('op') == 'mensaje':
+                        ultimos.append(evento['mensaje'])
+                no_escritas = en_vuelo + self.pendientes.get(chat_key, [])
+                for linea in no_escritas:
+                    evento = json.loads(linea)
+                    if evento.get('op') == 'mensaje':
+                        ultimos.append(evento['mensaje'])
+                self.cache[chat_key] = ultimos
+                if len(self.cache) > self.max_chats_cache:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(chat_key)
+            
+            mensajes = list(self.cache[chat_key])
+        return mensajes[-cantidad:] if cantidad else mensajes
+    
+    def compactar(self, chat_key):
+        """Reescribe el log del chat con su estado mínimo (swap atómico)"""
+        # Se llama desde volcar(), con lock_escritura ya tomado: nadie más escribe el archivo,
+        # así que la lectura y la reescritura van fuera de self.lock (agregar() no espera al disco)
+        eventos = self.leer_eventos(chat_key)
+        registro = None
+        preferencias = {}
+        seq_preferencias = 0
+        ultimos = deque(maxlen=self.max_mensajes)
+        for evento in eventos:
+            if evento.get('op') == 'registro':
+                registro = evento
+            elif evento.get('op') == 'preferencias':
+                preferencias.update(evento['preferencias'])
+                seq_preferencias = max(seq_preferencias, evento.get('seq', 0))
+            elif evento.get('op') == 'mensaje':
+                ultimos.append(evento)
+        
+        # Cabecera con la última secuencia: indica al recuperar que el archivo
+        # se reescribió y que los offsets del snapshot ya no son válidos
+        ultima_seq = max((evento.get('seq', 0) for evento in eventos), default=0)
+        compactados = [{'op': 'compactacion', 'seq': ultima_seq}]
+        if registro:
+            compactados.append(registro)
+        if preferencias:
+            # Evento propio con la secuencia más alta plegada: si se cae antes del
+            # snapshot, la recuperación lo reaplica aunque el registro sea anterior
+            compactados.append({'op': 'preferencias', 'seq': seq_preferencias,
+                                'preferencias': preferencias})
+        compactados.extend(ultimos)
+        
+        contenido = ''.join(
+            json.dumps(evento, ensure_ascii=False) + '\n' for evento in compactados
+        )
+        # Swap atómico: un lector concurrente ve el archivo viejo o el nuevo, con los mismos últimos mensajes
+        escribir_atomico(self.ruta(chat_key), contenido)
+        
+        with self.lock:
+            self.lineas[chat_key] = len(compactados)
+            # La caché incluye lo que sigue pendiente de escribir
+            recientes = [e['mensaje'] for e in ultimos]
+            for linea in self.pendientes.get(chat_key, []):
+                evento = json.loads(linea)
+                if evento.get('op') == 'mensaje':
+                    recientes.append(evento['mensaje'])
+            self.cache[chat_key] = deque(recientes, maxlen=self.max_mensajes)
+    
+    def offset_valido(self, chat_key, offset, seq_snapshot):
+        """Offset desde el que reaplicar eventos posteriores a un snapshot"""
+        ruta = self.ruta(chat_key)
+        if not offset or not ruta.exists():
+            return 0
+        with open(ruta, 'rb') as f:
+            primera = f.readline()
+        try:
+            cabecera = json.loads(primera.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            return 0
+        if cabecera.get('op') == 'compactacion' and cabecera.get('seq', 0) > seq_snapshot:
+            # Compactado después del snapshot: hay que releerlo entero
+            return 0
+        return offset if offset <= self.tamano(chat_key) else 0
+    
+    def eliminar(self, chat_key):
+        """Elimina el log de un chat"""
+        with self.lock_escritura, self.lock:
+            self.cache.pop(chat_key, None)
+            self.lineas.pop(chat_key, None)
+            self.pendientes.pop(chat_key, None)
+            try:
+                self.ruta(chat_key).unlink()
+            except FileNotFoundError:
+                pass
+
+class IndiceActividad:
+    """Índice de conversaciones ordenado por última actividad (epoch en segundos)"""
+    
+    def __init__(self):
+        self.orden = []  # lista ordenada de (epoch, chat_key)
+        self.actividad = {}  # chat_key -> epoch
+    
+    def __len__(self):
+        return len(self.orden)
+    
+    def actualizar(self, chat_key, epoch):
+        """Registra nueva actividad de un chat"""
+        self.eliminar(chat_key)
+        bisect.insort(self.orden, (epoch, chat_key))
+        self.actividad[chat_key] = epoch
+    
+    def eliminar(self, chat_key):
+        """Quita un chat del índice"""
+        epoch = self.actividad.pop(chat_key, None)
+        if epoch is not None:
+            posicion = bisect.bisect_left(self.orden, (epoch, chat_key))
+            if posicion < len(self.orden) and self.orden[posicion] == (epoch, chat_key):
+                del self.orden[posicion]
+    
+    def contar_desde(self, epoch):
+        """Chats con actividad posterior a epoch (búsqueda binaria)"""
+        return len(self.orden) - bisect.bisect_right(self.orden, (epoch, '\uffff'))
+    
+    def extraer_anteriores(self, epoch):
+        """Saca y devuelve los chats sin actividad desde epoch"""
+        corte = bisect.bisect_left(self.orden, (epoch, ''))
+        expirados = [chat_key for _, chat_key in self.orden[:corte]]
+        del self.orden[:corte]
+        for chat_key in expirados:
+            del self.actividad[chat_key]
+        return expirados
+
+def escribir_atomico(ruta, contenido):
+    """Escribe un archivo completo vía temporal + fsync + rename"""
+    ruta = Path(ruta)
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
 class RauliPermanente:
     def __init__(self):
         self.core_dir = Path(r"C:\RAULI_CORE")
         self.config_file = self.core_dir / "rauli_permanente.json"
         self.log_file = self.core_dir / "rauli_permanente.log"
         self.state_file = self.core_dir / "rauli_state.json"
+        self.conversaciones_dir = self.core_dir / "conversaciones"
         
         # Crear directorios
         self.core_dir.mkdir(exist_ok=True)
         
+        # Configurar logging permanente
+        self.setup_logging()
+        
+        # Log de mensajes por chat; el snapshot solo guarda metadatos
+        self.registro = RegistroConversaciones(self.conversaciones_dir)
+        self.snapshot_cada = 500  # mutaciones entre snapshots
+        self.mutaciones = 0
+        self.lock_estado = threading.RLock()
+        
+        # Persistencia diferida: se agrupan mutaciones y se vuelcan en segundo plano
+        self.volcar_cada_ms = 200
+        self.volcar_cada_mutaciones = 100
+        self.mutaciones_pendientes = 0
+        self.primera_pendiente = None
+        self.condicion_persistencia = threading.Condition()
+        self.lock_volcado = threading.Lock()
+        self.persistencia_activa = False
+        self.hilo_persistencia = None
+        self.estadisticas_persistencia = {
+            'volcados': 0,
+            'mutaciones_volcadas': 0,
+            'ultimo_lote': 0,
+            'max_lote': 0,
+            'snapshots': 0
+        }
+        
         # Estado permanente
         self.estado = self.cargar_estado()
-        self.conversaciones = self.estado.get('conversaciones', {})
+        self.conversaciones = self.estado.setdefault('conversaciones', {})
         self.configuracion = self.estado.get('configuracion', {})
-        self.sesion_actual = self.estado.get('sesion_actual', {})
+        self.sesion_actual = self.estado.setdefault('sesion_actual', {})
+        self.recuperar_registro()
         
-        # Configurar logging permanente
-        self.setup_logging()
+        # Índice por última actividad: expiración y "recientes" sin recorrer todo
+        self.indice_actividad = IndiceActividad()
+        for chat_key, conv in self.conversaciones.items():
+            self.indice_actividad.actualizar(chat_key, self.a_epoch(conv['ultimo_mensaje']))
+        
+        self.iniciar_persistencia()
         
         logger.info("👑 RAULI-PERMANENTE inicializado")
     
+    @staticmethod
+    def a_epoch(marca):
+        """Timestamp ISO a segundos epoch"""
+        return datetime.fromisoformat(marca).timestamp()
+    
     def setup_logging(self):
         """Configura logging permanente"""
         logging.basicConfig(
@@ -64,6 +347,202 @@ class RauliPermanente:
             logger.error(f"❌ Error cargando estado: {e}")
             return self.crear_estado_inicial()
     
+    def recuperar_registro(self):
+        """Reaplica los eventos escritos en los logs después del último snapshot"""
+        # Migración: snapshots antiguos con los mensajes embebidos
+        migradas = 0
+        for chat_key, conv in self.conversaciones.items():
+            if 'mensajes' in conv:
+                migradas += 1
+                mensajes = conv.pop('mensajes')
+                if not self.registro.ruta(chat_key).exists():
+                    self.registro.agregar(chat_key, self.evento_registro(conv))
+                    for mensaje in mensajes:
+                        self.registro.agregar(chat_key, {'op': 'mensaje', 'mensaje': mensaje})
+                    self.registro.volcar()
+                conv['log_offset'] = self.registro.tamano(chat_key)
+        
+        seq_snapshot = self.estado.get('seq', 0)
+        pendientes = []
+        for chat_key in self.registro.chats_en_disco():
+            conv = self.conversaciones.get(chat_key)
+            offset = conv.get('log_offset', 0) if conv else 0
+            offset = self.registro.offset_valido(chat_key, offset, seq_snapshot)
+            if self.registro.tamano(chat_key) > offset:
+                for evento in self.registro.leer_eventos(chat_key, offset):
+                    # Solo lo escrito después del snapshot
+                    if evento.get('seq', 0) > seq_snapshot and evento.get('op') != 'compactacion':
+                        pendientes.append((evento['seq'], chat_key, evento))
+        
+        # Orden global por secuencia para reconstruir la sesión actual correctamente
+        pendientes.sort(key=lambda item: item[0])
+        for seq, chat_key, evento in pendientes:
+            self.aplicar_evento(chat_key, evento)
+            self.estado['seq'] = max(self.estado.get('seq', 0), seq)
+        
+        if pendientes or migradas:
+            logger.info(f"♻️ Eventos recuperados del registro: {len(pendientes)}")
+            self.guardar_estado()
+    
+    def aplicar_evento(self, chat_key, evento):
+        """Aplica un evento del log al índice en memoria"""
+        op = evento.get('op')
+        if op == 'registro':
+            conv = self.conversaciones.setdefault(chat_key, {
+                'chat_id': evento.get('chat_id', chat_key),
+                'usuario': evento.get('usuario'),
+                'inicio': evento.get('inicio'),
+                'ultimo_mensaje': evento.get('inicio'),
+                'contexto': [],
+                'preferencias': evento.get('preferencias', {})
+            })
+            conv['usuario'] = evento.get('usuario', conv.get('usuario'))
+            conv.setdefault('preferencias', {}).update(evento.get('preferencias', {}))
+            self.sesion_actual['chat_actual'] = chat_key
+            self.sesion_actual['usuario_actual'] = conv['usuario']
+            self.sesion_actual['ultimo_cambio'] = evento.get('timestamp')
+        elif op == 'mensaje':
+            conv = self.conversaciones.get(chat_key)
+            if conv is None:
+                return
+            mensaje = evento['mensaje']
+            conv['ultimo_mensaje'] = mensaje['timestamp']
+            self.estado['estadisticas']['mensajes_totales'] += 1
+            if mensaje.get('tipo') == 'rauli_voz':
+                self.estado['estadisticas']['respuestas_audio'] += 1
+        elif op == 'preferencias':
+            conv = self.conversaciones.get(chat_key)
+            if conv is not None:
+                conv.setdefault('preferencias', {}).update(evento['preferencias'])
+    
+    def evento_registro(self, conv):
+        """Evento de alta de conversación"""
+        return {
+            'op': 'registro',
+            'chat_id': conv['chat_id'],
+            'usuario': conv['usuario'],
+            'inicio': conv['inicio'],
+            'preferencias': conv.get('preferencias', {}),
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def encolar_evento(self, chat_key, evento):
+        """Asigna secuencia y encola el evento (llamar con lock_estado tomado)"""
+        self.estado['seq'] = self.estado.get('seq', 0) + 1
+        evento['seq'] = self.estado['seq']
+        self.registro.agregar(chat_key, evento)
+        self.mutaciones += 1
+    
+    def persistir(self, sync=False):
+        """Tras una mutación: volcado inmediato o diferido"""
+        if sync:
+            self.flush()
+        else:
+            self.marcar_sucio()
+    
+    def marcar_sucio(self):
+        """Cuenta una mutación pendiente y despierta al hilo de persistencia"""
+        with self.condicion_persistencia:
+            if self.mutaciones_pendientes == 0:
+                self.primera_pendiente = time.monotonic()
+            self.mutaciones_pendientes += 1
+            if self.mutaciones_pendientes >= self.volcar_cada_mutaciones:
+                self.condicion_persistencia.notify()
+    
+    def flush(self):
+        """Vuelca ahora las mutaciones pendientes (para quien necesite durabilidad)"""
+        with self.lock_volcado:
+            with self.condicion_persistencia:
+                coalescidas = self.mutaciones_pendientes
+                self.mutaciones_pendientes = 0
+                self.primera_pendiente = None
+            
+            lineas, compactados = self.registro.volcar()
+            
+            # Snapshot periódico, o tras compactar (los offsets guardados ya no valen)
+            if compactados or self.mutaciones >= self.snapshot_cada:
+                self.guardar_estado()
+            
+            if coalescidas:
+                stats = self.estadisticas_persistencia
+                stats['volcados'] += 1
+                stats['mutaciones_volcadas'] += coalescidas
+                stats['ultimo_lote'] = coalescidas
+                stats['max_lote'] = max(stats['max_lote'], coalescidas)
+            return coalescidas
+    
+    def bucle_persistencia(self):
+        """Vuelca como mucho cada volcar_cada_ms o cada volcar_cada_mutaciones"""
+        while True:
+            with self.condicion_persistencia:
+                while self.persistencia_activa:
+                    if self.mutaciones_pendientes >= self.volcar_cada_mutaciones:
+                        break
+                    if self.primera_pendiente is None:
+                        self.condicion_persistencia.wait()
+                        continue
+                    restante = self.volcar_cada_ms / 1000 - (time.monotonic() - self.primera_pendiente)
+                    if restante <= 0:
+                        break
+                    self.condicion_persistencia.wait(restante)
+                activa = self.persistencia_activa
+            
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error volcando estado: {e}")
+            
+            if not activa:
+                break
+    
+    def iniciar_persistencia(self):
+        """Arranca el hilo de persistencia y los volcados de cierre"""
+        if self.persistencia_activa:
+            return
+        self.persistencia_activa = True
+        self.hilo_persistencia = threading.Thread(target=self.bucle_persistencia, daemon=True)
+        self.hilo_persistencia.start()
+        
+        atexit.register(self.cerrar)
+        
+        # Señales solo pueden instalarse desde el hilo principal
+        if threading.current_thread() is threading.main_thread():
+            for nombre in ('SIGTERM', 'SIGBREAK'):
+                if hasattr(signal, nombre):
+                    senal = getattr(signal, nombre)
+                    anterior = signal.getsignal(senal)
+                    signal.signal(senal, lambda signum, frame, anterior=anterior:
+                                  self.al_recibir_senal(signum, frame, anterior))
+    
+    def al_recibir_senal(self, signum, frame, anterior):
+        """Termina por señal; el volcado final lo hace cerrar() vía atexit"""
+        # Sin E/S ni locks aquí: el manejador corre en el hilo principal, que puede estar
+        # dentro de flush() con lock_volcado tomado. SystemExit deshace la pila y los libera
+        self.persistencia_activa = False
+        if callable(anterior):
+            anterior(signum, frame)
+        else:
+            raise SystemExit(128 + signum)
+    
+    def cerrar(self):
+        """Detiene el hilo de persistencia y deja todo en disco"""
+        if self.persistencia_activa:
+            with self.condicion_persistencia:
+                self.persistencia_activa = False
+                self.condicion_persistencia.notify_all()
+            if self.hilo_persistencia and self.hilo_persistencia is not threading.current_thread():
+                self.hilo_persistencia.join(timeout=5)
+        self.flush()
+        self.guardar_estado()
+    
+    def obtener_estadisticas_persistencia(self):
+        """Contadores de mutaciones agrupadas por volcado"""
+        stats = dict(self.estadisticas_persistencia)
+        stats['promedio_lote'] = (stats['mutaciones_volcadas'] / stats['volcados']
+                                  if stats['volcados'] else 0)
+        stats['pendientes'] = self.mutaciones_pendientes
+        return stats
+    
     def crear_estado_inicial(self):
         """Crea estado inicial"""
         return {
@@ -87,26 +566,45 @@ class RauliPermanente:
         }
     
     def guardar_estado(self):
-        """Guarda estado permanente"""
+        """Guarda snapshot del estado permanente (sin mensajes)"""
         try:
-            self.estado['ultima_actualizacion'] = datetime.now().isoformat()
-            with open(self.state_file, 'w', encoding='utf-8') as f:
-                json.dump(self.estado, f, indent=2, ensure_ascii=False)
+            self.registro.volcar()
+            
+            # seq, contadores y offsets se leen juntos para que el snapshot sea coherente
+            with self.lock_estado:
+                self.estado['ultima_actualizacion'] = datetime.now().isoformat()
+                
+                # Offsets de cada log: al recuperar solo se reaplica lo posterior
+                for chat_key, conv in self.conversaciones.items():
+                    conv['log_offset'] = self.registro.tamano(chat_key)
+                
+                contenido = json.dumps(self.estado, indent=2, ensure_ascii=False)
+                self.mutaciones = 0
+            
+            escribir_atomico(self.state_file, contenido)
+            self.estadisticas_persistencia['snapshots'] += 1
             logger.info("✅ Estado guardado")
         except Exception as e:
             logger.error(f"❌ Error guardando estado: {e}")
     
-    def registrar_conversacion(self, chat_id, usuario_info):
+    def registrar_conversacion(self, chat_id, usuario_info, sync=False):
         """Registra nueva conversación"""
         chat_key = str(chat_id)
         
+        with self.lock_estado:
+            conversacion = self.actualizar_conversacion(chat_key, chat_id, usuario_info)
+            self.encolar_evento(chat_key, self.evento_registro(conversacion))
+        self.persistir(sync)
+        return conversacion
+    
+    def actualizar_conversacion(self, chat_key, chat_id, usuario_info):
+        """Alta o actualización de la conversación y de la sesión actual"""
         if chat_key not in self.conversaciones:
             self.conversaciones[chat_key] = {
                 'chat_id': chat_id,
                 'usuario': usuario_info,
                 'inicio': datetime.now().isoformat(),
                 'ultimo_mensaje': datetime.now().isoformat(),
-                'mensajes': [],
                 'contexto': [],
                 'preferencias': {
                     'voz_activa': True,
@@ -120,10 +618,13 @@ class RauliPermanente:
         self.sesion_actual['usuario_actual'] = usuario_info
         self.sesion_actual['ultimo_cambio'] = datetime.now().isoformat()
         
-        self.guardar_estado()
+        self.conversaciones[chat_key]['usuario'] = usuario_info
+        if chat_key not in self.indice_actividad.actividad:
+            self.indice_actividad.actualizar(
+                chat_key, self.a_epoch(self.conversaciones[chat_key]['ultimo_mensaje']))
         return self.conversaciones[chat_key]
     
-    def agregar_mensaje(self, chat_id, tipo, contenido, metadata=None):
+    def agregar_mensaje(self, chat_id, tipo, contenido, metadata=None, sync=False):
         """Agrega mensaje a la conversación"""
         chat_key = str(chat_id)
         
@@ -135,19 +636,18 @@ class RauliPermanente:
                 'metadata': metadata or {}
             }
             
-            self.conversaciones[chat_key]['mensajes'].append(mensaje)
-            self.conversaciones[chat_key]['ultimo_mensaje'] = datetime.now().isoformat()
-            
-            # Mantener solo últimos 50 mensajes
-            if len(self.conversaciones[chat_key]['mensajes']) > 50:
-                self.conversaciones[chat_key]['mensajes'] = self.conversaciones[chat_key]['mensajes'][-50:]
-            
-            # Actualizar estadísticas
-            self.estado['estadisticas']['mensajes_totales'] += 1
-            if tipo == 'rauli_voz':
-                self.estado['estadisticas']['respuestas_audio'] += 1
-            
-            self.guardar_estado()
+            with self.lock_estado:
+                self.conversaciones[chat_key]['ultimo_mensaje'] = mensaje['timestamp']
+                self.indice_actividad.actualizar(chat_key, time.time())
+                
+                # Actualizar estadísticas
+                self.estado['estadisticas']['mensajes_totales'] += 1
+                if tipo == 'rauli_voz':
+                    self.estado['estadisticas']['respuestas_audio'] += 1
+                
+                # El log conserva los últimos 50 mensajes tras cada compactación
+                self.encolar_evento(chat_key, {'op': 'mensaje', 'mensaje': mensaje})
+            self.persistir(sync)
             logger.info(f"💬 Mensaje agregado: {chat_key} - {tipo}")
     
     def obtener_contexto(self, chat_id, cantidad=10):
@@ -155,49 +655,44 @@ class RauliPermanente:
         chat_key = str(chat_id)
         
         if chat_key in self.conversaciones:
-            mensajes = self.conversaciones[chat_key]['mensajes']
-            return mensajes[-cantidad:] if len(mensajes) > cantidad else mensajes
+            return self.registro.mensajes(chat_key, cantidad)
         return []
     
-    def actualizar_preferencias(self, chat_id, preferencias):
+    def actualizar_preferencias(self, chat_id, preferencias, sync=False):
         """Actualiza preferencias de usuario"""
         chat_key = str(chat_id)
         
         if chat_key in self.conversaciones:
-            self.conversaciones[chat_key]['preferencias'].update(preferencias)
-            self.guardar_estado()
+            with self.lock_estado:
+                self.conversaciones[chat_key]['preferencias'].update(preferencias)
+                self.encolar_evento(chat_key, {'op': 'preferencias', 'preferencias': dict(preferencias)})
+            self.persistir(sync)
             logger.info(f"⚙️ Preferencias actualizadas: {chat_key}")
     
     def obtener_estadisticas(self):
         """Obtiene estadísticas completas"""
-        stats = self.estado['estadisticas'].copy()
-        stats['conversaciones_activas'] = len(self.conversaciones)
-        stats['sesion_actual'] = self.sesion_actual
-        
-        # Conversaciones recientes (últimas 24 horas)
-        ahora = datetime.now()
-        recientes = 0
-        for conv in self.conversaciones.values():
-            ultimo = datetime.fromisoformat(conv['ultimo_mensaje'])
-            if ahora - ultimo < timedelta(hours=24):
-                recientes += 1
-        stats['conversaciones_recientes'] = recientes
+        with self.lock_estado:
+            stats = self.estado['estadisticas'].copy()
+            stats['conversaciones_activas'] = len(self.conversaciones)
+            stats['sesion_actual'] = dict(self.sesion_actual)
+            
+            # Conversaciones recientes (últimas 24 horas)
+            stats['conversaciones_recientes'] = self.indice_actividad.contar_desde(
+                time.time() - 24 * 3600)
         
         return stats
     
     def limpiar_conversaciones_antiguas(self, dias=7):
         """Limpia conversaciones antiguas"""
-        ahora = datetime.now()
-        limite = ahora - timedelta(days=dias)
+        limite = time.time() - dias * 86400
         
-        antiguas = []
-        for chat_key, conv in self.conversaciones.items():
-            ultimo = datetime.fromisoformat(conv['ultimo_mensaje'])
-            if ultimo < limite:
-                antiguas.append(chat_key)
+        with self.lock_estado:
+            antiguas = self.indice_actividad.extraer_anteriores(limite)
+            for chat_key in antiguas:
+                del self.conversaciones[chat_key]
         
         for chat_key in antiguas:
-            del self.conversaciones[chat_key]
+            self.registro.eliminar(chat_key)
             logger.info(f"🗑️ Conversación eliminada: {chat_key}")
         
         if antiguas:
@@ -9,16 +9,30 @@ import re
 import hashlib
 import hmac
 import secrets
+import math
+import threading
+import time
+import atexit
+import glob
+import queue
 import jwt
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Union
 from functools import wraps
+from collections import deque
 import logging
 from dataclasses import dataclass
 from enum import Enum
 import json
 import bleach
 from dotenv import load_dotenv
+from verified_token_cache import VerifiedTokenCache
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 # Cargar variables de entorno
 load_dotenv(os.path.join(os.path.dirname(__file__), 'credenciales.env'))
@@ -42,6 +56,70 @@ class SecurityPolicy:
     description: str
     enabled: bool = True
 
+class ThreatScanner:
+    """Escáner de amenazas compilado una vez sobre todas las listas negras"""
+    
+    CATEGORY_LABELS = {
+        'sql_injection': 'SQL Injection',
+        'xss': 'XSS',
+        'path_traversal': 'Path Traversal'
+    }
+    
+    # Caracteres de compuerta, del menos al más frecuente en texto normal
+    GATE_CHARS = '\\<%*_=/(:-.'
+    
+    def __init__(self, blacklists: Dict[str, List[str]], level: ThreatLevel = ThreatLevel.DANGER):
+        self.level = level
+        # patrón en minúsculas -> [(categoría, patrón original)]
+        self.hits = {}
+        for category, patterns in blacklists.items():
+            for pattern in patterns:
+                self.hits.setdefault(pattern.lower(), []).append((category, pattern))
+        
+        # Agrupar por su carácter más raro: si no aparece en el texto, el grupo se salta
+        self.ungated = []
+        gates = {}
+        for pattern in self.hits:
+            gate = min((c for c in pattern if c in self.GATE_CHARS),
+                       key=self.GATE_CHARS.index, default=None)
+            if gate is None:
+                self.ungated.append(pattern)
+            else:
+                gates.setdefault(gate, []).append(pattern)
+        self.gated = list(gates.items())
+    
+    def scan(self, input_data: str) -> Dict[str, List[str]]:
+        """Devuelve {categoría: [patrones]} recorriendo la tabla una sola vez"""
+        text = input_data.lower()
+        matched = [pattern for pattern in self.ungated if pattern in text]
+        for gate, patterns in self.gated:
+            if gate in text:
+                matched.extend(pattern for pattern in patterns if pattern in text)
+        
+        found = {}
+        for pattern in matched:
+            for category, original in self.hits[pattern]:
+                found.setdefault(category, []).append(original)
+        return found
+    
+    def check(self, input_data: str) -> Optional[Dict[str, Any]]:
+        """Resultado en el formato de InputValidator._check_threats"""
+        found = self.scan(input_data)
+        if not found:
+            return None
+        
+        threats = [
+            f"Posible {self.CATEGORY_LABELS.get(category, category)} detectado: {pattern}"
+            for category in self.CATEGORY_LABELS if category in found
+            for pattern in found[category]
+        ]
+        
+        return {
+            'level': self.level,
+            'errors': threats,
+            'categories': list(found)
+        }
+
 class InputValidator:
     """Validador de entrada robusto"""
     
@@ -76,6 +154,7 @@ class InputValidator:
                 '../', '..\\', '%2e%2e%2f', '%2e%2e\\', '..%2f', '..%5c'
             ]
         }
+        self.threat_scanner = ThreatScanner(self.blacklisted_inputs)
         
         # Límites de entrada
         self.limits = {
@@ -122,8 +201,11 @@ class InputValidator:
             result['errors'].append(f"Longitud mínima requerida: {min_len} caracteres")
             result['threat_level'] = ThreatLevel.WARNING
         
-        # Sanitización básica
-        sanitized = bleach.clean(input_data, tags=[], strip=True)
+        # Sanitización básica (ASCII alfanumérico no puede contener HTML)
+        if input_data.isascii() and input_data.isalnum():
+            sanitized = input_data
+        else:
+            sanitized = bleach.clean(input_data, tags=[], strip=True)
         result['sanitized'] = sanitized.strip()
         
         # Verificar patrones maliciosos
@@ -158,36 +240,7 @@ class InputValidator:
     
     def _check_threats(self, input_data: str) -> Optional[Dict[str, Any]]:
         """Verificar patrones maliciosos"""
-        threats = []
-        max_threat = ThreatLevel.SAFE
-        
-        input_lower = input_data.lower()
-        
-        # SQL Injection
-        for pattern in self.blacklisted_inputs['sql_injection']:
-            if pattern.lower() in input_lower:
-                threats.append(f"Posible SQL Injection detectado: {pattern}")
-                max_threat = max(max_threat, ThreatLevel.DANGER, key=lambda x: list(ThreatLevel).index(x))
-        
-        # XSS
-        for pattern in self.blacklisted_inputs['xss']:
-            if pattern.lower() in input_lower:
-                threats.append(f"Posible XSS detectado: {pattern}")
-                max_threat = max(max_threat, ThreatLevel.DANGER, key=lambda x: list(ThreatLevel).index(x))
-        
-        # Path Traversal
-        for pattern in self.blacklisted_inputs['path_traversal']:
-            if pattern.lower() in input_lower:
-                threats.append(f"Posible Path Traversal detectado: {pattern}")
-                max_threat = max(max_threat, ThreatLevel.DANGER, key=lambda x: list(ThreatLevel).index(x))
-        
-        if threats:
-            return {
-                'level': max_threat,
-                'errors': threats
-            }
-        
-        return None
+        return self.threat_scanner.check(input_data)
     
     def _high_security_validation(self, sanitized: str, input_type: str) -> bool:
         """Validación de alta seguridad"""
@@ -225,6 +278,13 @@ class AuthenticationManager:
         
         # Usuarios bloqueados (en producción usar BD)
         self.locked_users = {}
+        self.locked_users_lock = threading.Lock()
+        
+        # Tokens ya verificados (evita decodificar y recalcular el HMAC en cada petición)
+        self.token_cache = VerifiedTokenCache(
+            max_entries=int(os.getenv('TOKEN_CACHE_SIZE', 10000)),
+            ttl=float(os.getenv('TOKEN_CACHE_TTL', 300))
+        )
     
     def hash_password(self, password: str, salt: Optional[str] = None) -> Dict[str, str]:
         """Hash de contraseña seguro"""
@@ -282,13 +342,22 @@ class AuthenticationManager:
     
     def verify_token(self, token: str, token_type: str = 'access') -> Optional[Dict[str, Any]]:
         """Verificar token JWT"""
+        payload = self.token_cache.get(token)
+        if payload is not None:
+            return dict(payload) if payload.get('type') == token_type else None
+        
+        if self.token_cache.is_revoked(token):
+            self.logger.warning("Token revocado")
+            return None
+        
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            self.token_cache.put(token, payload)
             
             if payload.get('type') != token_type:
                 return None
             
-            return payload
+            return dict(payload)
         except jwt.ExpiredSignatureError:
             self.logger.warning("Token expirado")
             return None
@@ -296,29 +365,252 @@ class AuthenticationManager:
             self.logger.warning("Token inválido")
             return None
     
+    def revoke_token(self, token: str):
+        """Revocar un token antes de su expiración"""
+        expires_at = None
+        try:
+            expires_at = jwt.decode(token, self.secret_key, algorithms=[self.algorithm]).get('exp')
+        except jwt.InvalidTokenError:
+            pass
+        self.token_cache.revoke(token, expires_at)
+    
     def is_user_locked(self, user_id: str) -> bool:
         """Verificar si usuario está bloqueado"""
-        if user_id in self.locked_users:
-            lock_time = self.locked_users[user_id]
+        with self.locked_users_lock:
+            lock_time = self.locked_users.get(user_id)
+            if lock_time is None:
+                return False
             if datetime.utcnow() < lock_time:
                 return True
-            else:
-                # Desbloquear automáticamente
-                del self.locked_users[user_id]
-        return False
+            # Desbloquear automáticamente
+            del self.locked_users[user_id]
+            return False
     
     def lock_user(self, user_id: str):
         """Bloquear usuario temporalmente"""
         lock_time = datetime.utcnow() + self.lockout_duration
-        self.locked_users[user_id] = lock_time
+        with self.locked_users_lock:
+            self.locked_users[user_id] = lock_time
         self.logger.warning(f"Usuario {user_id} bloqueado hasta {lock_time}")
 
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float = 0.0
+
+def gcra_step(tat: Optional[float], now: float, limit: int, window: float):
+    """Paso GCRA: devuelve (resultado, nuevo TAT o None si se rechaza)"""
+    emission = window / limit
+    # Trabajar con diferencias relativas a now para no perder precisión
+    delay = max((tat or now) - now, 0.0) + emission
+    
+    if delay > window:
+        return RateLimitResult(False, 0, delay - window), None
+    
+    remaining = int((window - delay) / emission + 1e-6)
+    return RateLimitResult(True, min(remaining, limit - 1)), now + delay
+
+def sliding_window_step(state: Optional[List[float]], now: float, limit: int, window: float):
+    """Ventana deslizante con dos cubos fijos: estado [cubo, actual, anterior]"""
+    bucket = math.floor(now / window)
+    current, previous = 0, 0
+    
+    if state:
+        if state[0] == bucket:
+            current, previous = state[1], state[2]
+        elif state[0] == bucket - 1:
+            previous = state[1]
+    
+    elapsed = now - bucket * window
+    estimate = previous * (1 - elapsed / window) + current
+    
+    if estimate >= limit:
+        if current < limit and previous:
+            retry_after = window * (1 - (limit - current) / previous) - elapsed
+        else:
+            retry_after = window - elapsed
+        return RateLimitResult(False, 0, max(retry_after, 0.0)), None
+    
+    current += 1
+    return RateLimitResult(True, max(int(limit - estimate - 1), 0)), [bucket, current, previous]
+
+RATE_LIMIT_ALGORITHMS = {
+    'gcra': gcra_step,
+    'sliding_window': sliding_window_step
+}
+
+class MemoryRateLimitStore:
+    """Almacén en proceso para rate limiting, con expulsión de claves inactivas"""
+    
+    def __init__(self, sweep_interval: float = 60.0):
+        self.entries = {}  # key -> [estado, expira]
+        self.lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        self.sweeper = None
+    
+    def apply(self, algorithm: str, key: str, now: float, limit: int, window: float) -> RateLimitResult:
+        """Aplica el algoritmo de forma atómica sobre la clave"""
+        step = RATE_LIMIT_ALGORITHMS[algorithm]
+        store_key = f"{algorithm}:{key}"
+        
+        with self.lock:
+            entry = self.entries.get(store_key)
+            state = entry[0] if entry and entry[1] > now else None
+            
+            result, new_state = step(state, now, limit, window)
+            if new_state is not None:
+                expires = new_state if algorithm == 'gcra' else now + 2 * window
+                self.entries[store_key] = [new_state, expires]
+        
+        self.start_sweeper()
+        return result
+    
+    def start_sweeper(self):
+        """Arranca la expulsión en segundo plano al primer uso"""
+        if self.sweeper is None:
+            with self.lock:
+                if self.sweeper is None:
+                    self.sweeper = threading.Thread(target=self.sweep_loop, daemon=True)
+                    self.sweeper.start()
+    
+    def sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+    
+    def sweep(self, batch_size: int = 1000) -> int:
+        """Elimina claves expiradas por lotes para no retener el lock"""
+        now = time.time()
+        with self.lock:
+            keys = list(self.entries.keys())
+        
+        removed = 0
+        for start in range(0, len(keys), batch_size):
+            with self.lock:
+                for key in keys[start:start + batch_size]:
+                    entry = self.entries.get(key)
+                    if entry and entry[1] <= now:
+                        del self.entries[key]
+                        removed += 1
+        
+        self.evicted += removed
+        return removed
+    
+    def reset(self, key: str):
+        with self.lock:
+            for algorithm in RATE_LIMIT_ALGORITHMS:
+                self.entries.pop(f"{algorithm}:{key}", None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': 'memory', 'keys': len(self.entries), 'evicted': self.evicted}
+
+class RedisRateLimitStore:
+    """Almacén compartido entre procesos sobre un cliente compatible con Redis"""
+    
+    GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local emission = window / limit
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local delay = math.max(tat - now, 0) + emission
+if delay > window then
+    return {0, 0, tostring(delay - window)}
+end
+redis.call('SET', KEYS[1], string.format('%.6f', now + delay), 'PX', math.ceil(delay * 1000))
+return {1, math.min(math.floor((window - delay) / emission + 1e-6), limit - 1), '0'}
+"""
+    
+    SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local bucket = math.floor(now / window)
+local current = tonumber(redis.call('GET', KEYS[1] .. ':' .. bucket) or 0)
+local previous = tonumber(redis.call('GET', KEYS[1] .. ':' .. (bucket - 1)) or 0)
+local elapsed = now - bucket * window
+local estimate = previous * (1 - elapsed / window) + current
+if estimate >= limit then
+    local retry_after = window - elapsed
+    if current < limit and previous > 0 then
+        retry_after = window * (1 - (limit - current) / previous) - elapsed
+    end
+    return {0, 0, tostring(math.max(retry_after, 0))}
+end
+redis.call('INCR', KEYS[1] .. ':' .. bucket)
+redis.call('PEXPIRE', KEYS[1] .. ':' .. bucket, math.ceil(window * 2000))
+return {1, math.max(math.floor(limit - estimate - 1), 0), '0'}
+"""
+    
+    def __init__(self, client, prefix: str = 'rauli:ratelimit'):
+        self.client = client
+        self.prefix = prefix
+        self.scripts = {
+            'gcra': client.register_script(self.GCRA_SCRIPT),
+            'sliding_window': client.register_script(self.SLIDING_WINDOW_SCRIPT)
+        }
+    
+    def apply(self, algorithm: str, key: str, now: float, limit: int, window: float) -> RateLimitResult:
+        allowed, remaining, retry_after = self.scripts[algorithm](
+            keys=[f"{self.prefix}:{algorithm}:{key}"], args=[now, limit, window]
+        )
+        return RateLimitResult(bool(allowed), int(remaining), float(retry_after))
+    
+    def reset(self, key: str):
+        for algorithm in RATE_LIMIT_ALGORITHMS:
+            for stored_key in self.client.scan_iter(f"{self.prefix}:{algorithm}:{key}*"):
+                self.client.delete(stored_key)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        # Redis expira las claves por sí mismo (PX/PEXPIRE)
+        return {'backend': 'redis', 'prefix': self.prefix}
+
+_rate_limit_store = None
+_rate_limit_store_lock = threading.Lock()
+
+def get_rate_limit_store():
+    """Almacén de rate limiting compartido por todo el proceso"""
+    global _rate_limit_store
+    if _rate_limit_store is None:
+        with _rate_limit_store_lock:
+            if _rate_limit_store is None:
+                redis_url = os.getenv('RATE_LIMIT_REDIS_URL')
+                if redis_url and REDIS_AVAILABLE:
+                    _rate_limit_store = RedisRateLimitStore(redis.Redis.from_url(redis_url))
+                else:
+                    _rate_limit_store = MemoryRateLimitStore()
+    return _rate_limit_store
+
+def set_rate_limit_store(store):
+    """Reemplaza el almacén compartido (p. ej. por un sustituto local en pruebas)"""
+    global _rate_limit_store
+    with _rate_limit_store_lock:
+        _rate_limit_store = store
+
+class RateLimiter:
+    """Rate limiter O(1) por petición sobre un almacén intercambiable"""
+    
+    def __init__(self, store=None, algorithm: str = 'gcra'):
+        if algorithm not in RATE_LIMIT_ALGORITHMS:
+            raise ValueError(f"Algoritmo de rate limiting desconocido: {algorithm}")
+        self.store = store
+        self.algorithm = algorithm
+    
+    def check(self, key: str, limit: int, window: float, store=None) -> RateLimitResult:
+        store = store or self.store or get_rate_limit_store()
+        return store.apply(self.algorithm, key, time.time(), limit, window)
+
 class SecurityMiddleware:
     """Middleware de seguridad para aplicaciones web"""
     
-    def __init__(self):
-        self.input_validator = InputValidator()
-        self.auth_manager = AuthenticationManager()
+    def __init__(self, rate_limit_store=None, rate_limit_algorithm: str = 'gcra',
+                 input_validator: Optional[InputValidator] = None,
+                 auth_manager: Optional[AuthenticationManager] = None):
+        self.input_validator = input_validator or InputValidator()
+        self.auth_manager = auth_manager or AuthenticationManager()
+        self.rate_limiter = RateLimiter(rate_limit_store, rate_limit_algorithm)
         self.logger = logging.getLogger(__name__)
         
         # Políticas de seguridad
@@ -333,31 +625,17 @@ class SecurityMiddleware:
     
     def rate_limit_check(self, user_id: str, endpoint: str, limit: int = 100, window: int = 3600) -> bool:
         """Verificar límite de peticiones"""
-        # En producción usar Redis o BD
-        # Aquí simulamos con diccionario
-        if not hasattr(self, '_rate_limits'):
-            self._rate_limits = {}
-        
-        key = f"{user_id}:{endpoint}"
-        now = datetime.utcnow()
-        
-        if key not in self._rate_limits:
-            self._rate_limits[key] = []
-        
-        # Limpiar peticiones antiguas
-        self._rate_limits[key] = [
-            req_time for req_time in self._rate_limits[key]
-            if (now - req_time).seconds < window
-        ]
+        return self.rate_limit_status(user_id, endpoint, limit, window).allowed
+    
+    def rate_limit_status(self, user_id: str, endpoint: str, limit: int = 100,
+                          window: int = 3600) -> RateLimitResult:
+        """Verificar límite de peticiones con restantes y tiempo de espera"""
+        result = self.rate_limiter.check(f"{user_id}:{endpoint}", limit, window)
         
-        # Verificar límite
-        if len(self._rate_limits[key]) >= limit:
+        if not result.allowed:
             self.logger.warning(f"Rate limit excedido para {user_id} en {endpoint}")
-            return False
         
-        # Registrar petición actual
-        self._rate_limits[key].append(now)
-        return True
+        return result
     
     def add_security_headers(self, headers: Dict[str, str]) -> Dict[str, str]:
         """Agregar headers de seguridad"""
@@ -382,67 +660,148 @@ class SecurityMiddleware:
         """Verificar token CSRF"""
         return hmac.compare_digest(token, session_token)
 
-def require_auth(f):
-    """Decorador para requerir autenticación"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        # Aquí iría la lógica de verificación de token
-        # Por ahora simulamos
-        token = kwargs.get('token') or args[0] if args else None
-        
-        if not token:
-            return {'error': 'Token requerido'}, 401
-        
-        auth_manager = AuthenticationManager()
-        payload = auth_manager.verify_token(token)
-        
-        if not payload:
-            return {'error': 'Token inválido'}, 401
+class SecurityContext:
+    """Componentes de seguridad compartidos por todo el proceso"""
+    
+    def __init__(self, rate_limit_store=None):
+        self.input_validator = InputValidator()
+        self.auth_manager = AuthenticationManager()
+        self.middleware = SecurityMiddleware(
+            rate_limit_store,
+            input_validator=self.input_validator,
+            auth_manager=self.auth_manager
+        )
         
-        # Agregar payload del usuario a kwargs
-        kwargs['user_payload'] = payload
-        return f(*args, **kwargs)
+        # Coste por etapa: nombre -> [llamadas, total_s, max_s]
+        self.costs = {}
+        self.costs_lock = threading.Lock()
+    
+    def record_cost(self, stage: str, elapsed: float):
+        """Registrar el coste de una etapa de seguridad"""
+        with self.costs_lock:
+            cost = self.costs.get(stage)
+            if cost is None:
+                self.costs[stage] = [1, elapsed, elapsed]
+            else:
+                cost[0] += 1
+                cost[1] += elapsed
+                if elapsed > cost[2]:
+                    cost[2] = elapsed
+    
+    def get_cost_report(self) -> Dict[str, Dict[str, float]]:
+        """Coste medio y máximo por petición en µs para cada etapa"""
+        with self.costs_lock:
+            return {
+                stage: {
+                    'calls': calls,
+                    'avg_us': round(total / calls * 1e6, 2),
+                    'max_us': round(maximum * 1e6, 2),
+                    'total_ms': round(total * 1000, 3)
+                }
+                for stage, (calls, total, maximum) in self.costs.items()
+            }
+    
+    def reset_costs(self):
+        with self.costs_lock:
+            self.costs.clear()
+
+_security_context = None
+_security_context_lock = threading.Lock()
+
+def get_security_context() -> SecurityContext:
+    """Contexto de seguridad construido una sola vez por proceso"""
+    global _security_context
+    if _security_context is None:
+        with _security_context_lock:
+            if _security_context is None:
+                _security_context = SecurityContext()
+    return _security_context
+
+def set_security_context(context: Optional[SecurityContext]):
+    """Reemplaza el contexto compartido (None lo reconstruye en el próximo uso)"""
+    global _security_context
+    with _security_context_lock:
+        _security_context = context
+
+def require_auth(f=None, *, context: Optional[SecurityContext] = None):
+    """Decorador para requerir autenticación"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            security = context or get_security_context()
+            token = kwargs.get('token') or (args[0] if args else None)
+            
+            if not token:
+                return {'error': 'Token requerido'}, 401
+            
+            start = time.perf_counter()
+            payload = security.auth_manager.verify_token(token)
+            security.record_cost('auth', time.perf_counter() - start)
+            
+            if not payload:
+                return {'error': 'Token inválido'}, 401
+            
+            # Agregar payload del usuario a kwargs
+            kwargs['user_payload'] = payload
+            return f(*args, **kwargs)
+        return decorated_function
     
-    return decorated_function
+    # Permite usar @require_auth y @require_auth(context=...)
+    return decorator(f) if f is not None else decorator
 
-def rate_limit(limit: int = 100, window: int = 3600):
+def rate_limit(limit: int = 100, window: int = 3600, algorithm: str = 'gcra',
+               context: Optional[SecurityContext] = None):
     """Decorador para rate limiting"""
     def decorator(f):
+        # Un limitador por endpoint sobre el almacén compartido del proceso
+        limiter = RateLimiter(algorithm=algorithm)
+        endpoint = f.__name__
+        
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            middleware = SecurityMiddleware()
+            security = context or get_security_context()
             user_id = kwargs.get('user_id', 'anonymous')
-            endpoint = f.__name__
             
-            if not middleware.rate_limit_check(user_id, endpoint, limit, window):
-                return {'error': 'Rate limit excedido'}, 429
+            start = time.perf_counter()
+            result = limiter.check(f"{user_id}:{endpoint}", limit, window,
+                                   security.middleware.rate_limiter.store)
+            security.record_cost('rate_limit', time.perf_counter() - start)
+            
+            if not result.allowed:
+                return {'error': 'Rate limit excedido', 'retry_after': math.ceil(result.retry_after)}, 429
             
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
-def validate_input(input_type: str, security_level: SecurityLevel = SecurityLevel.MEDIUM):
+def validate_input(input_type: str, security_level: SecurityLevel = SecurityLevel.MEDIUM,
+                   context: Optional[SecurityContext] = None):
     """Decorador para validación de entrada"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            validator = InputValidator()
+            security = context or get_security_context()
+            validator = security.input_validator
+            start = time.perf_counter()
             
-            # Validar cada argumento string
-            for arg_name, arg_value in kwargs.items():
-                if isinstance(arg_value, str):
-                    validation_result = validator.validate_input(
-                        arg_value, input_type, security_level
-                    )
-                    
-                    if not validation_result['valid']:
-                        return {
-                            'error': 'Entrada inválida',
-                            'details': validation_result['errors']
-                        }, 400
-                    
-                    # Reemplazar con valor sanitizado
-                    kwargs[arg_name] = validation_result['sanitized']
+            try:
+                # Validar cada argumento string
+                for arg_name, arg_value in kwargs.items():
+                    if isinstance(arg_value, str):
+                        validation_result = validator.validate_input(
+                            arg_value, input_type, security_level
+                        )
+                        
+                        if not validation_result['valid']:
+                            return {
+                                'error': 'Entrada inválida',
+                                'details': validation_result['errors']
+                            }, 400
+                        
+                        # Reemplazar con valor sanitizado
+                        kwargs[arg_name] = validation_result['sanitized']
+            finally:
+                security.record_cost('validation', time.perf_counter() - start)
             
             return f(*args, **kwargs)
         return decorated_function
@@ -451,21 +810,61 @@ def validate_input(input_type: str, security_level: SecurityLevel = SecurityLeve
 class SecurityAuditor:
     """Auditor de seguridad"""
     
-    def __init__(self):
+    def __init__(self, log_dir: Optional[str] = None, segment_max_bytes: int = 5 * 1024 * 1024,
+                 max_segments: int = 20, recent_window: int = 3600, recent_capacity: int = 10000,
+                 queue_size: int = 10000):
         self.logger = logging.getLogger(__name__)
-        self.audit_log = []
+        self.log_dir = log_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'security_audit')
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.recent_window = recent_window
+        
+        # Contadores incrementales y ventana reciente acotada: (epoch, evento)
+        self.lock = threading.Lock()
+        self.total_events = 0
+        self.events_by_type = {}
+        self.events_by_severity = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0}
+        self.audit_log = deque(maxlen=recent_capacity)
+        # La ventana acotada pierde eventos con ráfagas: el recuento sale de cubetas por tiempo
+        self.recent_bucket_seconds = max(1, recent_window // 60)
+        self.recent_buckets = deque()  # [inicio de la cubeta, eventos]
+        
+        # Escritura en segundo plano: el camino de la petición nunca toca disco
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped_events = 0
+        self.written_events = 0
+        self.segment_file = None
+        self.segment_seq = 0
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
     
     def log_security_event(self, event_type: str, user_id: str, details: Dict[str, Any]):
         """Registrar evento de seguridad"""
+        now = time.time()
         event = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcfromtimestamp(now).isoformat(),
             'event_type': event_type,
             'user_id': user_id,
             'details': details,
             'severity': self._determine_severity(event_type)
         }
         
-        self.audit_log.append(event)
+        with self.lock:
+            self.total_events += 1
+            self.events_by_type[event_type] = self.events_by_type.get(event_type, 0) + 1
+            self.events_by_severity[event['severity']] += 1
+            self.audit_log.append((now, event))
+            bucket = now - now % self.recent_bucket_seconds
+            if self.recent_buckets and self.recent_buckets[-1][0] == bucket:
+                self.recent_buckets[-1][1] += 1
+            else:
+                self.recent_buckets.append([bucket, 1])
+            
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                self.dropped_events += 1
         
         # Log al sistema de logging
         log_message = f"Security Event: {event_type} - User: {user_id} - {details}"
@@ -476,6 +875,112 @@ class SecurityAuditor:
         else:
             self.logger.info(log_message)
     
+    def _writer_loop(self):
+        """Vacía la cola por lotes en el segmento JSONL actual"""
+        while True:
+            event = self.queue.get()
+            batch = [event]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            stop = None in batch
+            events = [e for e in batch if e is not None]
+            if events:
+                try:
+                    self._write_batch(events)
+                except Exception as e:
+                    self.logger.error(f"Error escribiendo auditoría: {e}")
+            
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                break
+    
+    def _write_batch(self, events: List[Dict[str, Any]]):
+        if self.segment_file is None:
+            self._open_segment()
+        
+        data = ''.join(json.dumps(event, ensure_ascii=False, default=str) + '\n' for event in events)
+        self.segment_file.write(data)
+        self.segment_file.flush()
+        self.written_events += len(events)
+        
+        if self.segment_file.tell() >= self.segment_max_bytes:
+            self._rotate()
+    
+    def _open_segment(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        segments = self.list_segments()
+        if segments:
+            self.segment_seq = int(os.path.basename(segments[-1])[6:-6])
+            if os.path.getsize(segments[-1]) >= self.segment_max_bytes:
+                self.segment_seq += 1
+        path = os.path.join(self.log_dir, f"audit-{self.segment_seq:06d}.jsonl")
+        self.segment_file = open(path, 'a', encoding='utf-8')
+    
+    def _rotate(self):
+        self.segment_file.close()
+        self.segment_seq += 1
+        path = os.path.join(self.log_dir, f"audit-{self.segment_seq:06d}.jsonl")
+        self.segment_file = open(path, 'a', encoding='utf-8')
+        
+        # Conservar solo los últimos max_segments
+        for old in self.list_segments()[:-self.max_segments]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    
+    def list_segments(self) -> List[str]:
+        """Segmentos del log en orden cronológico"""
+        return sorted(glob.glob(os.path.join(self.log_dir, 'audit-*.jsonl')))
+    
+    def iter_events(self, since: Optional[datetime] = None, event_type: Optional[str] = None):
+        """Lee los segmentos en streaming, evento a evento"""
+        since_iso = since.isoformat() if since else None
+        for path in self.list_segments():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue  # línea truncada por un cierre abrupto
+                        if since_iso and event['timestamp'] < since_iso:
+                            continue
+                        if event_type and event['event_type'] != event_type:
+                            continue
+                        yield event
+            except FileNotFoundError:
+                continue  # rotado mientras se leía
+    
+    def flush(self, timeout: float = 5.0):
+        """Espera a que la cola se escriba en disco"""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+    
+    def close(self):
+        """Escribe lo pendiente y cierra el segmento"""
+        if not self.writer.is_alive():
+            return
+        self.queue.put(None)
+        self.writer.join(timeout=5)
+        if self.segment_file:
+            self.segment_file.close()
+            self.segment_file = None
+    
+    def _prune_recent(self, now: float):
+        """Descarta de la ventana reciente lo más antiguo (llamar con el lock)"""
+        limit = now - self.recent_window
+        while self.audit_log and self.audit_log[0][0] < limit:
+            self.audit_log.popleft()
+        while self.recent_buckets and self.recent_buckets[0][0] + self.recent_bucket_seconds <= limit:
+            self.recent_buckets.popleft()
+    
     def _determine_severity(self, event_type: str) -> str:
         """Determinar severidad del evento"""
         high_severity_events = [
@@ -496,35 +1001,26 @@ class SecurityAuditor:
     
     def generate_security_report(self) -> Dict[str, Any]:
         """Generar reporte de seguridad"""
-        if not self.audit_log:
-            return {'message': 'No hay eventos de seguridad registrados'}
-        
-        # Análisis de eventos
-        total_events = len(self.audit_log)
-        events_by_type = {}
-        events_by_severity = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0}
-        
-        for event in self.audit_log:
-            event_type = event['event_type']
-            severity = event['severity']
+        with self.lock:
+            if not self.total_events:
+                return {'message': 'No hay eventos de seguridad registrados'}
             
-            events_by_type[event_type] = events_by_type.get(event_type, 0) + 1
-            events_by_severity[severity] += 1
-        
-        # Eventos recientes (última hora)
-        recent_events = [
-            event for event in self.audit_log
-            if datetime.fromisoformat(event['timestamp']) > datetime.utcnow() - timedelta(hours=1)
-        ]
+            self._prune_recent(time.time())
+            events_by_type = dict(self.events_by_type)
+            events_by_severity = dict(self.events_by_severity)
+            total_events = self.total_events
+            recent_events_count = sum(count for _, count in self.recent_buckets)
+            dropped_events = self.dropped_events
         
         return {
             'total_events': total_events,
             'events_by_type': events_by_type,
             'events_by_severity': events_by_severity,
-            'recent_events_count': len(recent_events),
+            'recent_events_count': recent_events_count,
             'high_risk_events': events_by_severity['HIGH'],
             'security_score': max(0, 100 - (events_by_severity['HIGH'] * 10)),
-            'recommendations': self._generate_recommendations(events_by_type)
+            'recommendations': self._generate_recommendations(events_by_type),
+            'dropped_events': dropped_events
         }
     
     def _generate_recommendations(self, events_by_type: Dict[str, int]) -> List[str]:
@@ -545,6 +1041,33 @@ class SecurityAuditor:
         
         return recommendations
 
+def benchmark_input_validation(sizes: List[int] = [16, 64, 256, 1000], iterations: int = 2000):
+    """Benchmark del escáner de amenazas y de validate_input por tamaño de mensaje"""
+    validator = InputValidator()
+    base = "Hola Rauli, necesito revisar el despliegue del servidor y los logs de ayer. "
+    
+    print("\n⏱️ Benchmark de validación:")
+    for size in sizes:
+        message = (base * (size // len(base) + 1))[:size]
+        samples = {
+            'texto': message,
+            'amenaza': (message[:-30] + "<script>alert('x')</script>")[-size:],
+            'alfanumérico': ('a1' * size)[:size]
+        }
+        
+        for name, sample in samples.items():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                validator._check_threats(sample)
+            scan_us = (time.perf_counter() - start) / iterations * 1e6
+            
+            start = time.perf_counter()
+            for _ in range(iterations):
+                validator.validate_input(sample, 'message')
+            validate_us = (time.perf_counter() - start) / iterations * 1e6
+            
+            print(f"{size:>5} chars {name:<13} scan: {scan_us:7.1f} µs  validate_input: {validate_us:7.1f} µs")
+
 def main():
     """Función principal para testing"""
     print("🔐 RAULI Security Hardening Test")
@@ -583,6 +1106,23 @@ def main():
     payload = auth.verify_token(tokens['access_token'])
     print(f"Token válido: {payload is not None}")
     
+    # Test de decoradores sobre el contexto compartido
+    context = get_security_context()
+    
+    @rate_limit(limit=10, window=60)
+    @validate_input('message')
+    @require_auth
+    def endpoint_protegido(token, user_id=None, message=None, user_payload=None):
+        return {'ok': True}
+    
+    context_tokens = context.auth_manager.generate_tokens(user_data)
+    for _ in range(5):
+        endpoint_protegido(context_tokens['access_token'], user_id="123", message="Hola Rauli")
+    
+    print("\n⏱️ Coste por petición:")
+    for stage, cost in context.get_cost_report().items():
+        print(f"{stage}: {cost['avg_us']} µs medio, {cost['max_us']} µs máx ({cost['calls']} llamadas)")
+    
     # Test de auditoría
     auditor = SecurityAuditor()
     auditor.log_security_event("LOGIN_SUCCESS", "testuser", {"ip": "127.0.0.1"})
@@ -592,6 +1132,8 @@ def main():
     print(f"\n📊 Reporte de Seguridad:")
     print(f"Total eventos: {report.get('total_events', 0)}")
     print(f"Score seguridad: {report.get('security_score', 0)}")
+    
+    benchmark_input_validation()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+[CLOUD] RAULI Session Store - Almacén asíncrono de sesiones
+Redis asíncrono con pool de conexiones y pipelines, o almacén en proceso con la misma interfaz
+"""
+
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# merge(guardado, local) -> valor a escribir; guardado es None si la clave no existe
+MergeFunction = Callable[[Optional[bytes], bytes], bytes]
+
+class MemorySessionStore:
+    """Almacén en proceso con TTL perezoso (sin servidor Redis)"""
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.entries: Dict[str, tuple] = {}  # clave -> (valor, expira)
+
+    async def ping(self) -> bool:
+        return True
+
+    def lookup(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.entries[key]
+            return None
+        return entry[0]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.lookup(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.lookup(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if key not in self.entries and len(self.entries) >= self.max_entries:
+            self.purge()
+        self.entries[key] = (value, time.monotonic() + ttl)
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+
+    async def merge_many(self, items: Dict[str, bytes], merge: MergeFunction, ttl: float) -> Dict[str, bytes]:
+        merged = {key: merge(self.lookup(key), value) for key, value in items.items()}
+        await self.set_many(merged, ttl)
+        return merged
+
+    async def exists(self, key: str) -> bool:
+        return self.lookup(key) is not None
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    def purge(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self.entries.items() if expires_at <= now]
+        for key in expired:
+            del self.entries[key]
+        return len(expired)
+
+    async def close(self):
+        pass
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.backend, "entries": len(self.entries)}
+
+class RedisSessionStore:
+    """Redis asíncrono: pool de conexiones compartido y pipelines sin transacción"""
+
+    backend = "redis"
+
+    def __init__(self, url: Optional[str] = None, max_connections: int = 50):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis.asyncio no disponible")
+        url = url or "redis://{}:{}/0".format(os.getenv('REDIS_HOST', 'localhost'), os.getenv('REDIS_PORT', 6379))
+        self.pool = aioredis.ConnectionPool.from_url(url, max_connections=max_connections)
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self.url = url
+
+    async def ping(self) -> bool:
+        return bool(await self.client.ping())
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self.client.mget(keys) if keys else []
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.setex(key, max(1, int(ttl)), value)
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        if not items:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(key, max(1, int(ttl)), value)
+            await pipe.execute()
+
+    async def merge_many(self, items: Dict[str, bytes], merge: MergeFunction, ttl: float) -> Dict[str, bytes]:
+        """Lectura-modificación-escritura en dos viajes: MGET de todo y un pipeline de SETEX"""
+        keys = list(items)
+        stored = await self.get_many(keys)
+        merged = {key: merge(previous, items[key]) for key, previous in zip(keys, stored)}
+        await self.set_many(merged, ttl)
+        return merged
+
+    async def exists(self, key: str) -> bool:
+        return bool(await self.client.exists(key))
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def close(self):
+        if hasattr(self.client, "aclose"):
+            await self.client.aclose()
+        else:
+            await self.client.close()  # redis < 5.0.1
+        await self.pool.disconnect()
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.backend, "url": self.url, "max_connections": self.pool.max_connections}
+
+def create_session_store():
+    """Redis si está disponible y no se pidió SESSION_STORE=memory"""
+    if os.getenv('SESSION_STORE', 'redis') == 'memory' or not REDIS_AVAILABLE:
+        return MemorySessionStore()
+    return RedisSessionStore(os.getenv('REDIS_URL'), int(os.getenv('REDIS_MAX_CONNECTIONS', 50)))
+
+async def connect_session_store(store):
+    """Comprueba el almacén; sin servidor Redis se usa el almacén en proceso"""
+    try:
+        await store.ping()
+        return store
+    except Exception as e:
+        print(f"[WARN] Redis no disponible ({e}), sesiones en memoria del proceso")
+        try:
+            await store.close()
+        except Exception:
+            pass
+        return MemorySessionStore()
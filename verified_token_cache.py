@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+🔐 RAULI VERIFIED TOKEN CACHE
+Caché de tokens JWT ya verificados y lista de revocación
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+def token_digest(token: str) -> str:
+    """Clave de caché: nunca se guarda el token en claro"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+class TokenRevocationList:
+    """Tokens revocados hasta su expiración natural"""
+
+    def __init__(self):
+        self.revoked = {}  # digest -> expira
+        self.lock = threading.Lock()
+
+    def revoke(self, digest: str, expires_at: Optional[float] = None, ttl: float = 86400):
+        with self.lock:
+            self.revoked[digest] = expires_at or time.time() + ttl
+
+    def is_revoked(self, digest: str) -> bool:
+        with self.lock:
+            expires_at = self.revoked.get(digest)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                # Ya expiró el token, la entrada sobra
+                del self.revoked[digest]
+                return False
+            return True
+
+    def purge(self) -> int:
+        now = time.time()
+        with self.lock:
+            expired = [digest for digest, expires_at in self.revoked.items() if expires_at <= now]
+            for digest in expired:
+                del self.revoked[digest]
+        return len(expired)
+
+    def __len__(self):
+        return len(self.revoked)
+
+class VerifiedTokenCache:
+    """LRU acotada de payloads verificados; cada entrada vive min(exp, ttl)"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300,
+                 revocations: Optional[TokenRevocationList] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.revocations = revocations or TokenRevocationList()
+        self.entries = OrderedDict()  # digest -> (payload, expira)
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Payload verificado o None si hay que verificar de nuevo"""
+        digest = token_digest(token)
+
+        if self.revocations.is_revoked(digest):
+            self.invalidate_digest(digest)
+            return None
+
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[digest]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(digest)
+            self.hits += 1
+            return payload
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        """Guarda un payload recién verificado"""
+        now = time.time()
+        expires_at = now + self.ttl
+        if payload.get('exp') is not None:
+            expires_at = min(expires_at, float(payload['exp']))
+        if expires_at <= now:
+            return
+
+        digest = token_digest(token)
+        if self.revocations.is_revoked(digest):
+            return
+        with self.lock:
+            self.entries[digest] = (payload, expires_at)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def is_revoked(self, token: str) -> bool:
+        return self.revocations.is_revoked(token_digest(token))
+
+    def revoke(self, token: str, expires_at: Optional[float] = None):
+        """Revoca el token y lo saca de la caché"""
+        digest = token_digest(token)
+        self.revocations.revoke(digest, expires_at)
+        self.invalidate_digest(digest)
+        return digest
+
+    def invalidate_digest(self, digest: str):
+        with self.lock:
+            self.entries.pop(digest, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'revoked': len(self.revocations),
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }